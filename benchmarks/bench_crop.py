@@ -0,0 +1,76 @@
+""" Benchmarks of the cost of a segmentation iteration of a small region in
+a 3D volume (e.g., a lesion in a CT volume), over the full arrays and over
+the crop box of the narrow band
+"""
+import numpy as np
+
+from lsml.core.inference import InferenceModel
+from lsml.feature import get_basic_image_features, get_basic_shape_features
+from lsml.feature.feature_map import FeatureMap
+from lsml.initializer.provided.ball import BallInitializer
+from lsml.util.distance_transform import Reinitializer
+
+from benchmarks import common
+
+
+#: The crop margins compared (None computes over the full arrays)
+CROP_MARGINS = [None, 4.0]
+
+#: The narrow band width (in units of the spacing)
+BAND = 3.0
+
+#: The radius of the initial region
+RADIUS = 6
+
+#: The number of iterations timed
+N_ITERS = 2
+
+
+class _LinearRegressor:
+    """ Predicts (mostly positive) velocities that depend on the features
+    """
+    def __init__(self, n_features, random_state=1234):
+        rs = np.random.RandomState(random_state)
+        self.coefficients = 0.01 * rs.randn(n_features)
+
+    def predict(self, features):
+        return np.tanh(features @ self.coefficients) + 0.5
+
+
+class SegmentIteration:
+    """ Segmentation iterations (the features, the level set update, and
+    the reinitialization of the narrow band) of a small region, with the
+    basic image and shape features
+    """
+    params = [
+        common.SHAPES_3D,
+        CROP_MARGINS,
+    ]
+    param_names = ['shape', 'crop_margin']
+
+    def setup(self, shape, crop_margin):
+        ndim = len(shape)
+        feature_map = FeatureMap(
+            get_basic_image_features(ndim=ndim) +
+            get_basic_shape_features(ndim=ndim))
+
+        self.model = InferenceModel(
+            feature_map=feature_map,
+            initializer=BallInitializer(radius=RADIUS),
+            reinitializer=Reinitializer(), scorer=None, band=BAND,
+            normalize_imgs=True, steps=[0.8] * N_ITERS,
+            regression_models=[
+                _LinearRegressor(feature_map.n_features)] * N_ITERS,
+            crop_margin=crop_margin)
+
+        self.img = common.velocity(shape)
+        self.session = self.model.inference_session(shape)
+
+        # Exclude one-time costs (e.g., loading libraries) from the timings
+        self.time_session(shape, crop_margin)
+
+    def time_segment(self, shape, crop_margin):
+        self.model.segment(self.img, verbose=False, keep='final')
+
+    def time_session(self, shape, crop_margin):
+        self.session.segment(self.img)
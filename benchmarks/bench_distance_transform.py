@@ -0,0 +1,111 @@
+""" Benchmarks for :func:`lsml.util.distance_transform.distance_transform`
+for each signed distance engine, and comparisons of the accuracy of the
+fast sweeping engine against skfmm. The fast sweeping engine is first order,
+so it is compared against both the (second order) skfmm engine and the
+first order skfmm distances.
+"""
+import numpy as np
+
+from lsml.data.dim2 import hamburger as hamburger2d
+from lsml.data.dim3 import hamburger as hamburger3d
+from lsml.util.distance_transform import ENGINES, distance_transform
+
+from benchmarks import common
+
+
+def skfmm_first_order(arr, band, dx):
+    """ The first order skfmm distance and narrow band, as returned by
+    :func:`distance_transform` (for `arr` with both signs)
+    """
+    import skfmm
+
+    dist = skfmm.distance(arr, narrow=band, dx=dx, order=1)
+
+    if hasattr(dist, 'mask'):
+        return dist.data, ~dist.mask
+    return dist, np.ones(arr.shape, dtype=bool)
+
+
+class DistanceTransform:
+
+    params = [
+        common.SHAPES_2D + common.SHAPES_3D,
+        common.BAND_WIDTHS,
+        common.SPACINGS,
+        list(ENGINES),
+    ]
+    param_names = ['shape', 'band', 'dx', 'engine']
+
+    def setup(self, shape, band, dx, engine):
+        self.dx = common.spacing(dx, len(shape))
+        # The level set function is not itself a distance function, as is
+        # the case for the level sets evolved during fitting
+        self.arr = common.ball(shape, self.dx)**3
+        self.band = band * self.dx.min()
+
+        # Exclude one-time costs (e.g., loading libraries) from the timings
+        self.time_distance_transform(shape, band, dx, engine)
+
+    def time_distance_transform(self, shape, band, dx, engine):
+        distance_transform(
+            self.arr, band=self.band, dx=self.dx, engine=engine)
+
+
+class Hamburger:
+    """ The distance transforms of the ground truth segmentations of the
+    hamburger datasets, with the band of zero indicating the full domain
+    (as when the datasets are converted to hdf5 for fitting)
+    """
+    params = [
+        [2, 3],
+        [0.0, 3.0],
+        common.SPACINGS,
+        list(ENGINES),
+    ]
+    param_names = ['ndim', 'band', 'dx', 'engine']
+
+    def setup(self, ndim, band, dx, engine):
+        random_state = np.random.RandomState(1234)
+
+        if ndim == 2:
+            _, seg, _ = hamburger2d.make(n=301, r=100, rs=random_state)
+        else:
+            _, seg = hamburger3d.make(n=101, r=30, rs=random_state)
+
+        self.arr = 2 * seg.astype(np.float64) - 1
+        self.dx = common.spacing(dx, ndim)
+        self.band = band
+
+        self.dist, self.mask = distance_transform(
+            self.arr, band=self.band, dx=self.dx, engine=engine)
+        self.reference_dist, self.reference_mask = distance_transform(
+            self.arr, band=self.band, dx=self.dx, engine='skfmm')
+        self.first_order_dist, self.first_order_mask = skfmm_first_order(
+            self.arr, band=self.band, dx=self.dx)
+
+    def time_distance_transform(self, ndim, band, dx, engine):
+        distance_transform(
+            self.arr, band=self.band, dx=self.dx, engine=engine)
+
+    def track_max_abs_difference_to_skfmm(self, ndim, band, dx, engine):
+        both = self.mask & self.reference_mask
+        return float(np.abs(self.dist - self.reference_dist)[both].max())
+
+    def track_mean_abs_difference_to_skfmm(self, ndim, band, dx, engine):
+        both = self.mask & self.reference_mask
+        return float(np.abs(self.dist - self.reference_dist)[both].mean())
+
+    def track_band_disagreement_with_skfmm(self, ndim, band, dx, engine):
+        # The fraction of points in either band that are not in both
+        either = self.mask | self.reference_mask
+        return float((self.mask != self.reference_mask).sum() / either.sum())
+
+    def track_max_abs_difference_to_skfmm_first_order(self, ndim, band, dx,
+                                                      engine):
+        both = self.mask & self.first_order_mask
+        return float(np.abs(self.dist - self.first_order_dist)[both].max())
+
+    def track_mean_abs_difference_to_skfmm_first_order(self, ndim, band, dx,
+                                                       engine):
+        both = self.mask & self.first_order_mask
+        return float(np.abs(self.dist - self.first_order_dist)[both].mean())
@@ -0,0 +1,47 @@
+""" Benchmarks for the time to import lsml (and its public names) in a fresh
+interpreter, which dominates the startup of short-lived worker processes
+and command line calls
+"""
+import json
+import subprocess
+import sys
+
+
+#: The import statements timed
+STATEMENTS = [
+    'import lsml',
+    'from lsml import LevelSetMachineLearning',
+    'from lsml import InferenceModel',
+    'import lsml.segment',
+    'from lsml.feature import get_basic_image_features',
+    'from lsml.core.fit_job_handler import FitJobHandler',
+]
+
+# Times the statement in a fresh interpreter, excluding interpreter startup
+_SCRIPT = """
+import json, time
+start = time.perf_counter()
+exec({statement!r})
+print(json.dumps(time.perf_counter() - start))
+"""
+
+
+def import_time(statement):
+    """ Returns the time (in seconds) to execute the import `statement` in a
+    fresh interpreter
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-c', _SCRIPT.format(statement=statement)])
+    return json.loads(output.decode())
+
+
+class ImportTime:
+
+    params = [STATEMENTS]
+    param_names = ['statement']
+
+    unit = 'seconds'
+
+    def track_import_time(self, statement):
+        # The minimum over a few runs is less sensitive to disk caching
+        return min(import_time(statement) for _ in range(3))
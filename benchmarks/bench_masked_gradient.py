@@ -0,0 +1,43 @@
+""" Benchmarks for the routines of :mod:`lsml.gradient.masked_gradient`
+over the narrow band of a ball, for each available backend
+"""
+import numpy as np
+
+from lsml.gradient import backend as gradient_backend
+from lsml.gradient import masked_gradient
+
+from benchmarks import common
+
+
+class MaskedGradient:
+
+    params = [
+        common.SHAPES_2D + common.SHAPES_3D,
+        common.BAND_WIDTHS,
+        common.SPACINGS,
+        gradient_backend.available_backends(),
+    ]
+    param_names = ['shape', 'band', 'dx', 'backend']
+
+    def setup(self, shape, band, dx, backend):
+        self.dx = common.spacing(dx, len(shape))
+        self.arr = common.ball(shape, self.dx)
+        self.mask = np.abs(self.arr) <= band * self.dx.min()
+        self.nu = common.velocity(shape)
+        self.out = np.zeros(shape)
+        self.gradients = [np.zeros(shape) for _ in shape]
+
+        # Exclude one-time costs (e.g., JIT compilation) from the timings
+        self.time_gradient_centered(shape, band, dx, backend)
+        self.time_gradient_magnitude_osher_sethian(shape, band, dx, backend)
+
+    def time_gradient_centered(self, shape, band, dx, backend):
+        masked_gradient.gradient_centered(
+            self.arr, mask=self.mask, dx=self.dx,
+            out=(self.gradients, self.out), backend=backend)
+
+    def time_gradient_magnitude_osher_sethian(self, shape, band, dx,
+                                              backend):
+        masked_gradient.gradient_magnitude_osher_sethian(
+            self.arr, self.nu, mask=self.mask, dx=self.dx, out=self.out,
+            backend=backend)
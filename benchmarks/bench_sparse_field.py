@@ -0,0 +1,100 @@
+""" Benchmarks of the per-iteration cost of evolving a level set on 3D
+volumes with each evolution engine: the (incremental) distance transform
+reinitializers and the sparse-field reinitializer, and comparisons of the
+accuracy of the sparse-field narrow band against skfmm
+"""
+import numpy as np
+
+from lsml.gradient import masked_gradient as mg
+from lsml.util.distance_transform import (
+    FAST_SWEEPING_ENGINE, SKFMM_ENGINE, Reinitializer, distance_transform)
+from lsml.util.sparse_field import SparseFieldReinitializer
+
+from benchmarks import common
+
+
+#: The evolution engines compared
+EVOLUTION_ENGINES = [SKFMM_ENGINE, FAST_SWEEPING_ENGINE, 'sparse_field']
+
+#: The narrow band width (in units of the spacing)
+BAND = 3.0
+
+#: The level set update step
+STEP = 0.5
+
+
+def make_reinitializer(engine):
+    if engine == 'sparse_field':
+        return SparseFieldReinitializer()
+    return Reinitializer(engine=engine)
+
+
+class EvolutionIteration:
+    """ One level set iteration (the upwind gradient, the update at the band
+    points, and the reinitialization of the narrow band) with a constant
+    outward velocity, starting from the narrow band of a ball
+    """
+    params = [
+        common.SHAPES_3D,
+        common.SPACINGS,
+        EVOLUTION_ENGINES,
+    ]
+    param_names = ['shape', 'dx', 'engine']
+
+    def setup(self, shape, dx, engine):
+        self.dx = common.spacing(dx, len(shape))
+        self.band = BAND * self.dx.min()
+        self.reinitializer = make_reinitializer(engine)
+
+        self.u = common.ball(shape, self.dx)
+        self.narrow_band = distance_transform(
+            self.u, band=self.band, dx=self.dx, return_band=True)
+        self.velocity = self.narrow_band.to_dense(
+            np.ones(self.narrow_band.size))
+
+        # The updated level set, for timing the reinitialization alone
+        self.u_next = self.update(self.u.copy())
+
+        # Exclude one-time costs (e.g., loading libraries) from the timings
+        self.time_iteration(shape, dx, engine)
+
+    def update(self, u):
+        gmag = mg.gradient_magnitude_osher_sethian(
+            arr=u, nu=self.velocity, mask=self.narrow_band.mask, dx=self.dx)
+        self.narrow_band.scatter(
+            u, self.narrow_band.gather(u + STEP * self.velocity * gmag))
+        return u
+
+    def reinitialize(self, u):
+        return self.reinitializer(
+            arr=u, band=self.band, dx=self.dx, narrow_band=self.narrow_band,
+            iteration=1)
+
+    def time_iteration(self, shape, dx, engine):
+        self.reinitialize(self.update(self.u.copy()))
+
+    def time_reinitialize(self, shape, dx, engine):
+        self.reinitialize(self.u_next)
+
+    def track_max_abs_difference_to_skfmm(self, shape, dx, engine):
+        dist, mask, reference_dist, reference_mask = self._compare()
+        both = mask & reference_mask
+        return float(np.abs(dist - reference_dist)[both].max())
+
+    def track_mean_abs_difference_to_skfmm(self, shape, dx, engine):
+        dist, mask, reference_dist, reference_mask = self._compare()
+        both = mask & reference_mask
+        return float(np.abs(dist - reference_dist)[both].mean())
+
+    def track_band_disagreement_with_skfmm(self, shape, dx, engine):
+        # The fraction of points in either band that are not in both
+        _, mask, _, reference_mask = self._compare()
+        either = mask | reference_mask
+        return float((mask != reference_mask).sum() / either.sum())
+
+    def _compare(self):
+        narrow_band = self.reinitialize(self.u_next)
+        reference_dist, reference_mask = distance_transform(
+            self.u_next, band=self.band, dx=self.dx, engine=SKFMM_ENGINE)
+        return (narrow_band.dist, narrow_band.mask,
+                reference_dist, reference_mask)
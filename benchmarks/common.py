@@ -0,0 +1,48 @@
+""" Synthetic inputs shared by the benchmarks
+"""
+import numpy as np
+
+
+#: Array shapes swept over by the benchmarks
+SHAPES_2D = [(128, 128), (512, 512)]
+SHAPES_3D = [(64, 64, 64), (128, 128, 128)]
+
+#: Narrow band widths (in units of the spacing) swept over
+BAND_WIDTHS = [1.0, 3.0, 6.0]
+
+#: Named spacing vectors: isotropic, or anisotropic (e.g., thick slices
+#: along the last axis of a CT volume)
+SPACINGS = ['isotropic', 'anisotropic']
+
+
+def spacing(name, ndim):
+    """ Returns the delta terms for the named spacing
+    """
+    dx = np.ones(ndim, dtype=np.float64)
+    if name == 'anisotropic':
+        dx[-1] = 2.5
+    elif name != 'isotropic':
+        raise ValueError("Unknown spacing `{}`".format(name))
+    return dx
+
+
+def ball(shape, dx):
+    """ The signed distance (positive inside) to a ball centered in the
+    array of `shape` with spacing `dx`, whose radius is one third of the
+    smallest physical extent of the array
+    """
+    dx = np.asarray(dx, dtype=np.float64)
+    indices = np.indices(shape, dtype=np.float64)
+    center = (np.array(shape, dtype=np.float64) - 1) / 2
+    slices = (slice(None),) + (None,) * len(shape)
+    coords = (indices - center[slices]) * dx[slices]
+
+    radius = (np.array(shape) * dx).min() / 3
+    return radius - np.sqrt((coords**2).sum(axis=0))
+
+
+def velocity(shape, random_state=1234):
+    """ A smooth-ish velocity field with mixed signs
+    """
+    rs = np.random.RandomState(random_state)
+    return rs.randn(*shape)
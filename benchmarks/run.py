@@ -0,0 +1,225 @@
+""" A standalone runner for the benchmarks in this directory, which writes
+machine-readable results that can be compared across commits.
+
+Methods prefixed with `time_` are timed, and methods prefixed with
+`track_` return a value (e.g., an accuracy measure) that is recorded.
+The benchmark classes follow the conventions of airspeed velocity (asv),
+so they can also be run with `asv run` using the `asv.conf.json` at the
+root of the repository. This runner only requires the package itself.
+
+Examples
+--------
+Run all benchmarks and write the results::
+
+    python -m benchmarks.run --output results-new.json
+
+Run only the 2D distance transform benchmarks::
+
+    python -m benchmarks.run --filter "DistanceTransform.*\\(\\d+, \\d+\\)"
+
+Compare two result files, flagging benchmarks more than 10% slower::
+
+    python -m benchmarks.run --compare results-old.json results-new.json
+"""
+import argparse
+import importlib
+import inspect
+import itertools
+import json
+import pathlib
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy
+
+
+BENCHMARK_MODULES = [
+    'benchmarks.bench_masked_gradient',
+    'benchmarks.bench_distance_transform',
+    'benchmarks.bench_import',
+    'benchmarks.bench_sparse_field',
+    'benchmarks.bench_crop',
+]
+
+#: Each timing sample runs the benchmark enough times to last this long
+MIN_SAMPLE_TIME = 0.05
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=str(pathlib.Path(__file__).parent)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _benchmark_classes():
+    for module_name in BENCHMARK_MODULES:
+        module = importlib.import_module(module_name)
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ == module_name and not name.startswith('_'):
+                yield cls
+
+
+def _benchmark_id(cls, method_name, params):
+    return '{}.{}({})'.format(
+        cls.__name__, method_name, ', '.join(repr(p) for p in params))
+
+
+def _time(func, repeat):
+    """ Returns the per-call times (in seconds) of `repeat` samples
+    """
+    timer = timeit.Timer(func)
+
+    number = 1
+    while True:
+        if timer.timeit(number) >= MIN_SAMPLE_TIME or number >= 1000:
+            break
+        number *= 2
+
+    return number, [t / number for t in timer.repeat(repeat, number)]
+
+
+def run(pattern=None, repeat=5, verbose=True):
+    """ Runs the benchmarks whose ids match the regular expression
+    `pattern` (default: all) and returns the list of results
+    """
+    results = []
+
+    for cls in _benchmark_classes():
+        methods = [name for name in dir(cls)
+                   if name.startswith(('time_', 'track_'))]
+        param_names = getattr(cls, 'param_names', [])
+
+        for params in itertools.product(*getattr(cls, 'params', [])):
+            ids = {name: _benchmark_id(cls, name, params)
+                   for name in methods}
+            selected = [name for name in methods
+                        if pattern is None or re.search(pattern, ids[name])]
+
+            if not selected:
+                continue
+
+            benchmark = cls()
+            try:
+                if hasattr(benchmark, 'setup'):
+                    benchmark.setup(*params)
+            except NotImplementedError:
+                # The asv convention for skipping parameter combinations
+                continue
+
+            for name in selected:
+                method = getattr(benchmark, name)
+
+                result = {
+                    'benchmark': ids[name],
+                    'name': '{}.{}'.format(cls.__name__, name),
+                    'params': dict(zip(param_names, map(repr, params))),
+                }
+
+                if name.startswith('track_'):
+                    result['value'] = method(*params)
+                    summary = "{:.3e}".format(result['value'])
+                else:
+                    number, times = _time(lambda: method(*params), repeat)
+                    result.update({
+                        'number': number,
+                        'repeat': repeat,
+                        'min': min(times),
+                        'median': statistics.median(times),
+                    })
+                    summary = "{:.3e}s".format(result['median'])
+
+                results.append(result)
+
+                if verbose:
+                    print("{:<100} {}".format(result['benchmark'], summary))
+
+            if hasattr(benchmark, 'teardown'):
+                benchmark.teardown(*params)
+
+    return results
+
+
+def compare(old_path, new_path, threshold=1.1):
+    """ Prints the ratio of new to old median times (and the old and new
+    tracked values) for benchmarks found in both result files. Returns the
+    number of benchmarks whose ratio exceeds `threshold`.
+    """
+    with open(old_path) as f:
+        old = {r['benchmark']: r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {r['benchmark']: r for r in json.load(f)['results']}
+
+    n_regressions = 0
+
+    for benchmark in sorted(set(old) & set(new)):
+        if 'median' not in new[benchmark]:
+            # Tracked values are reported, but not flagged
+            print("{:<100} {:.3e} -> {:.3e}".format(
+                benchmark, old[benchmark]['value'], new[benchmark]['value']))
+            continue
+
+        ratio = new[benchmark]['median'] / old[benchmark]['median']
+        flag = ''
+        if ratio > threshold:
+            flag = '  <-- slower'
+            n_regressions += 1
+        elif ratio < 1 / threshold:
+            flag = '  <-- faster'
+        print("{:<100} {:6.2f}{}".format(benchmark, ratio, flag))
+
+    return n_regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the lsml kernel benchmarks")
+    parser.add_argument('--output', '-o', default='benchmark-results.json',
+                        help="Path of the JSON results file to write")
+    parser.add_argument('--filter', '-f', default=None,
+                        help="Only run benchmarks whose ids match this "
+                             "regular expression")
+    parser.add_argument('--repeat', '-r', type=int, default=5,
+                        help="Number of timing samples per benchmark")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help="Compare two results files rather than run")
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help="Slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        n_regressions = compare(*args.compare, threshold=args.threshold)
+        return 1 if n_regressions else 0
+
+    start = time.time()
+    results = run(pattern=args.filter, repeat=args.repeat)
+
+    output = {
+        'commit': _git_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(start)),
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+        },
+        'results': results,
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+
+    print("Wrote {} results to {}".format(len(results), args.output))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,19 @@
-# flake8: noqa
-from .core.model import LevelSetMachineLearning
-from ._version import version as __version__
+""" Level set machine learning for image segmentation
+
+The public names are imported on first access, so that `import lsml` does
+not load the fitting and feature dependencies (e.g., h5py, scikit-image and
+scipy) until they are used.
+"""
+from ._version import version as __version__  # noqa: F401
+from .util.lazy import lazy_names
+
+
+# Maps the public names to the modules defining them
+_lazy_names = {
+    'LevelSetMachineLearning': 'lsml.core.model',
+    'InferenceModel': 'lsml.core.inference',
+}
+
+__all__ = ['__version__'] + list(_lazy_names)
+
+__getattr__, __dir__ = lazy_names(__name__, _lazy_names)
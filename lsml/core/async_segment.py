@@ -0,0 +1,155 @@
+""" asyncio-friendly segmentation, which runs the level set iterations on
+an executor so that the event loop is not blocked
+
+Example
+-------
+::
+
+    segmenter = AsyncSegmenter(model, max_concurrency=4)
+
+    async for i, u in segmenter.iterate(img):
+        print(i, (u > 0).sum())
+
+    us = await segmenter.segment(img, keep='final')
+
+"""
+import asyncio
+import concurrent.futures
+import inspect
+
+from lsml.core.segmentation import KeptIterates
+
+
+# Returned by `next` when the iterates are exhausted
+_DONE = object()
+
+
+class AsyncSegmenter:
+    """ Runs segmentations with a fitted model on an executor, yielding the
+    iterates through async iterators and capping the number of concurrent
+    segmentations
+    """
+    def __init__(self, model, max_concurrency=None, executor=None):
+        """
+        Parameters
+        ----------
+        model: LevelSetMachineLearning or InferenceModel
+            The fitted (or exported) model
+
+        max_concurrency: int, default=None
+            The maximum number of concurrent segmentations; the default
+            (None) does not limit them beyond the executor's workers
+
+        executor: concurrent.futures.Executor, default=None
+            The executor that runs the iterations. It must be a thread
+            pool (or similar), since the iterations share the state of the
+            segmentation generator. The default creates a thread pool with
+            `max_concurrency` workers, which is shut down by :meth:`close`.
+        """
+        self.model = model
+        self.max_concurrency = max_concurrency
+
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_concurrency)
+        self.executor = executor
+
+        # Created on first use, within the running event loop
+        self._semaphore = None
+
+    def _get_semaphore(self):
+        if self._semaphore is None and self.max_concurrency is not None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def iterate(self, img, dx=None, **kwargs):
+        """ Asynchronously yields `(i, u)` for the iterates of segmenting
+        `img`, as from :meth:`lsml.LevelSetMachineLearning.segment_iter`
+        (which also describes the keyword arguments). Each iteration runs
+        on the executor. Cancelling the consuming task (or closing the
+        iterator) stops the segmentation between iterations.
+        """
+        semaphore = self._get_semaphore()
+        if semaphore is not None:
+            await semaphore.acquire()
+
+        iterates = self.model.segment_iter(img, dx=dx, **kwargs)
+        future = None
+
+        try:
+            while True:
+                future = self.executor.submit(next, iterates, _DONE)
+                item = await asyncio.wrap_future(future)
+
+                if item is _DONE:
+                    return
+
+                yield item
+        finally:
+            if future is not None and not future.done():
+                # Close the generator once the current iteration finishes
+                future.add_done_callback(lambda _: iterates.close())
+            else:
+                iterates.close()
+
+            if semaphore is not None:
+                semaphore.release()
+
+    async def segment(self, img, dx=None, on_iterate=None, keep='all',
+                      **kwargs):
+        """ Segment `img` without blocking the event loop, returning the
+        kept iterates as :meth:`lsml.LevelSetMachineLearning.segment` does
+        (which also describes the keyword arguments)
+
+        Parameters
+        ----------
+        on_iterate: callable or list of callables, default=None
+            As in :meth:`lsml.LevelSetMachineLearning.segment`, called as
+            :code:`on_iterate(i, u)` for each iterate. Callables may also
+            be coroutine functions (or otherwise return awaitables), which
+            are awaited before the next iterate is processed.
+        """
+        if on_iterate is None:
+            on_iterate = []
+        elif not isinstance(on_iterate, list):
+            on_iterate = [on_iterate]
+
+        if not all([callable(func) for func in on_iterate]):
+            msg = "All on_iterate items must be callable"
+            raise TypeError(msg)
+
+        n_iters = self.model._n_segment_iters(
+            kwargs.get('iterate_until_validation_max', True))
+        kept = self.model._kept_iterations(keep, n_iters)
+
+        # For keep='final', only the last iterate is held
+        if keep != 'final':
+            us = KeptIterates(kept, img.shape)
+
+        async for i, u in self.iterate(img, dx=dx, **kwargs):
+
+            if keep != 'final':
+                us.add(i, u)
+
+            for func in on_iterate:
+                result = func(i, u)
+                if inspect.isawaitable(result):
+                    await result
+
+        if keep == 'final':
+            return u
+
+        return us.fill(u)
+
+    def close(self):
+        """ Shut down the executor, if it was created by this instance
+        """
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
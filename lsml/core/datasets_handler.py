@@ -5,7 +5,8 @@ import os
 
 import h5py
 import numpy
-import skfmm
+
+from lsml.util.distance_transform import SKFMM_ENGINE, distance_transform
 
 
 _logger_name = __name__.rsplit('.', 1)[-1]
@@ -36,7 +37,8 @@ class DatasetsHandler:
     """ Handles internal dataset operations during model fitting
     """
 
-    def __init__(self, h5_file, imgs=None, segs=None, dx=None, compress=True):
+    def __init__(self, h5_file, imgs=None, segs=None, dx=None, compress=True,
+                 distance_engine=SKFMM_ENGINE):
         """ Initialize a dataset manager
 
         Parameters
@@ -60,6 +62,11 @@ class DatasetsHandler:
             When the image and segmentation data are stored in the hdf5 file
             this flag indicates whether or not to use compression.
 
+        distance_engine: str, default='skfmm'
+            The signed distance engine used for the ground truth distance
+            transforms when the hdf5 file is created (see
+            :func:`lsml.util.distance_transform.distance_transform`)
+
         Note
         ----
         Either :code:`h5_file` should be the name of an existing h5 file with
@@ -81,12 +88,14 @@ class DatasetsHandler:
 
             # Perform the conversion to hdf5
             self.convert_to_hdf5(
-                imgs=imgs, segs=segs, dx=dx, compress=compress)
+                imgs=imgs, segs=segs, dx=dx, compress=compress,
+                distance_engine=distance_engine)
 
         with h5py.File(self.h5_file, mode='r') as hf:
             self.n_examples = len(hf.keys())
 
-    def convert_to_hdf5(self, imgs, segs, dx=None, compress=True):
+    def convert_to_hdf5(self, imgs, segs, dx=None, compress=True,
+                        distance_engine=SKFMM_ENGINE):
         """ Convert a dataset of images and boolean segmentations
         to hdf5 format, which is required for the level set routine.
 
@@ -116,6 +125,10 @@ class DatasetsHandler:
             If True, :code:`gzip` compression with default compression
             options (level=4) is used for the images and segmentations.
 
+        distance_engine: str, default='skfmm'
+            The signed distance engine used for the ground truth distance
+            transforms
+
         """
         # Check if the file already exists and abort if so.
         if os.path.exists(self.h5_file):
@@ -160,6 +173,12 @@ class DatasetsHandler:
                 msg = "imgs[{}] shape {} does not match segs[{}] shape {}"
                 raise ValueError(msg.format(i, img.shape, i, seg.shape))
 
+            # The signed distance transform (i.e., the regression targets)
+            # is infinite without a boundary
+            if not seg.any() or seg.all():
+                msg = "segs[{}] is all {}, so it has no boundary"
+                raise ValueError(msg.format(i, bool(seg.all())))
+
         # Check dx if provided and is correct shape.
         if dx is None:
             dx = numpy.ones((n_examples, ndim), dtype=numpy.float)
@@ -191,7 +210,9 @@ class DatasetsHandler:
 
             # Compute the signed distance transform of the ground-truth
             # segmentation and store it.
-            dist = skfmm.distance(2*segs[i].astype(numpy.float)-1, dx=dx[i])
+            dist, _ = distance_transform(
+                arr=2*segs[i].astype(numpy.float)-1, band=0, dx=dx[i],
+                engine=distance_engine)
             g.create_dataset(DISTANCE_TRANSFORM_KEY,
                              data=dist, compression=compress_method)
 
@@ -9,11 +9,12 @@ import numpy
 from .datasets_handler import DatasetsHandler
 from .exception import ModelAlreadyFit
 from .temporary_data_handler import (
-    LEVEL_SET_KEY, MASK_KEY, SIGNED_DIST_KEY, TemporaryDataHandler,)
-from lsml.gradient import masked_gradient
+    BAND_INDICES_KEY, FEATURES_KEY, LEVEL_SET_KEY, TemporaryDataHandler,
+    load_crop_box, load_narrow_band, store_crop_box, store_narrow_band)
 from lsml.util.balance_mask import balance_mask
-from lsml.util.distance_transform import (
-    distance_transform)
+from lsml.util.crop import origin
+from lsml.util.narrow_band import NarrowBand
+from lsml.util.semi_implicit import EXPLICIT_INTEGRATOR
 
 
 _logger_name = __name__.rsplit('.', 1)[-1]
@@ -81,10 +82,14 @@ class FitJobHandler:
                  seeds,
                  segs,
                  step,
+                 adaptive_step,
+                 substeps,
                  subset_size,
                  temp_data_dir,
                  validation_history_len,
                  validation_history_tol,
+                 convergence_tol,
+                 convergence_patience,
                  redirect_stdout_to_logfile,
                  ):
         """
@@ -117,7 +122,8 @@ class FitJobHandler:
         # The LevelSetMachineLearning instance
         self.model = model
 
-        # Initialize the regression models to empty list
+        # The regression models are stored on disk during fit; this list
+        # only holds them once loaded into memory
         self.regression_models = []
 
         # Initialize the iteration number
@@ -143,9 +149,20 @@ class FitJobHandler:
                 msg = "`step` must be numeric or None (latter implies auto)"
                 raise ValueError(msg)
 
+        # The step used at each iteration (recomputed from the predicted
+        # velocities at each iteration if `adaptive_step` is True)
+        self.adaptive_step = bool(adaptive_step)
+        self.steps = []
+
+        if not isinstance(substeps, int) or substeps < 1:
+            msg = "`substeps` ({}) must be a positive int"
+            raise ValueError(msg.format(substeps))
+        self.substeps = substeps
+
         # Create the manager for the datasets
         self.datasets_handler = DatasetsHandler(
-            h5_file=data_filename, imgs=imgs, segs=segs, dx=dx)
+            h5_file=data_filename, imgs=imgs, segs=segs, dx=dx,
+            distance_engine=model.reinitializer.engine)
 
         # Split the examples into corresponding datasets
         self.datasets_handler.assign_examples_to_datasets(
@@ -161,6 +178,18 @@ class FitJobHandler:
             for example in self.datasets_handler.iterate_examples()
         }
 
+        # Examples whose level sets have stopped moving are frozen, i.e.,
+        # their level sets, features, and scores are carried forward. This
+        # maps the keys of frozen examples to the iteration of their last
+        # update.
+        self.convergence_tol = convergence_tol
+        self.convergence_patience = int(convergence_patience)
+        self.convergence_counts = {
+            example.key: 0
+            for example in self.datasets_handler.iterate_examples()
+        }
+        self.converged = {}
+
         # Initialize temp data handler for managing per-iteration level set
         # values, etc.
         self.temp_data_handler = TemporaryDataHandler(tmp_dir=temp_data_dir)
@@ -221,7 +250,8 @@ class FitJobHandler:
                 # Compute the initializer for this example and seed value
                 u0, dist, mask = self.model.initializer(
                     img=img_, band=self.model.band,
-                    dx=example.dx, seed=seed)
+                    dx=example.dx, seed=seed,
+                    engine=self.model.reinitializer.engine)
 
                 # Auto step should only use training and validation datasets
                 in_train = self.datasets_handler.in_training_dataset(
@@ -233,20 +263,25 @@ class FitJobHandler:
                     mx = numpy.abs(example.dist[mask]).max()
 
                     # Create the candidate step size for this example.
-                    tmp = numpy.min(example.dx) / mx
+                    tmp = self.model._auto_step(mx, example.dx)
 
                     # Assign tmp to step if it is the smallest observed so far.
                     step = tmp if tmp < step else step
 
-                # The group consists of the current "level set field" u, the
-                # signed distance transform of u (only in the narrow band), and
-                # the boolean mask indicating the narrow band region.
+                # The group consists of the current "level set field" u and
+                # the sparse narrow band, i.e., the flat indices of the band
+                # points and the signed distance transform of u at them.
+                narrow_band = NarrowBand.from_dense(dist, mask)
                 group.create_dataset(
                     LEVEL_SET_KEY, data=u0, compression='gzip')
-                group.create_dataset(
-                    SIGNED_DIST_KEY, data=dist, compression='gzip')
-                group.create_dataset(
-                    MASK_KEY, data=mask, compression='gzip')
+                store_narrow_band(group, narrow_band)
+
+                # The crop box of the per-iteration computations, if enabled
+                if narrow_band.any():
+                    box = self.model._crop_box(
+                        u0, narrow_band, None, example.dx)
+                    if box is not None:
+                        store_crop_box(group, box)
 
             if self.step is None:
                 # Assign the computed step value to class attribute and log it
@@ -254,7 +289,8 @@ class FitJobHandler:
 
                 msg = "Computed auto step is {:.7f}"
                 logger.info(msg.format(self.step))
-            elif step is not None and self.step > step:
+            elif (step is not None and self.step > step and
+                  self.model.integrator == EXPLICIT_INTEGRATOR):
                 # Warn the user that the provided step argument may be too big
                 msg = "Computed step is {:.7f} but given step is {:.7f}"
                 logger.warning(msg.format(step, self.step))
@@ -267,9 +303,16 @@ class FitJobHandler:
         with self.temp_data_handler.open_h5_file(lock=False, mode='r') as tf:
             for example in self.datasets_handler.iterate_examples():
 
-                u = tf[example.key][LEVEL_SET_KEY][...]
-                seg = example.seg
-                score = self.model.scorer(u, seg)
+                last_update = self.converged.get(
+                    example.key, self.iteration)
+
+                if last_update < self.iteration:
+                    # The level set is unchanged since the last iteration
+                    score = self.scores[example.key][-1]
+                else:
+                    u = tf[example.key][LEVEL_SET_KEY][...]
+                    seg = example.seg
+                    score = self.model.scorer(u, seg)
 
                 self.scores[example.key].append(score)
 
@@ -290,6 +333,20 @@ class FitJobHandler:
             msg = "Average score over {:s} = {:.7f}"
             self._log_with_iter(msg.format(dataset_key, mean))
 
+    @staticmethod
+    def _load_level_set(group):
+        """ Returns the level set and narrow band stored in the hdf5
+        `group`, restricted to its crop box (see `_crop_box` of the model),
+        if any, and the crop box (or None)
+        """
+        box = load_crop_box(group)
+        narrow_band = load_narrow_band(group)
+
+        if box is None:
+            return group[LEVEL_SET_KEY][...], narrow_band, None
+
+        return group[LEVEL_SET_KEY][box], narrow_band.crop(box), box
+
     def _featurize_all_images(self, dataset_key):
         """ Featurize all the images in the dataset given by the argument
 
@@ -322,17 +379,24 @@ class FitJobHandler:
         for example in examples:
 
             with self.temp_data_handler.open_h5_file(lock=False, mode='r') as tf:  # noqa
-                mask = tf[example.key][MASK_KEY][...]
+                if (self.balance_regression_targets or
+                        self.model.velocity_shell is not None):
+                    narrow_band = load_narrow_band(tf[example.key])
+                    feature_band, _ = self.model._feature_band(narrow_band)
+                    band_size = feature_band.size
+                else:
+                    # Only the number of band points is needed
+                    band_size = tf[example.key][BAND_INDICES_KEY].shape[0]
 
             if self.balance_regression_targets:
 
-                bal_mask = balance_mask(
-                    example.dist[mask], random_state=self.random_state)
+                bal_mask = balance_mask(feature_band.gather(example.dist),
+                                        random_state=self.random_state)
                 count += bal_mask.sum()
                 bal_masks.append(bal_mask)
 
             else:
-                count += mask.sum()
+                count += band_size
 
         features = numpy.zeros((count, self.model.feature_map.n_features))
         targets = numpy.zeros((count,))
@@ -353,26 +417,49 @@ class FitJobHandler:
                 img_ = example.img
 
             with self.temp_data_handler.open_h5_file(lock=False, mode='r') as tf:  # noqa
-                u = tf[example.key][LEVEL_SET_KEY][...]
-                dist = tf[example.key][SIGNED_DIST_KEY][...]
-                mask = tf[example.key][MASK_KEY][...]
+                u, narrow_band, box = self._load_level_set(tf[example.key])
+
+                features_current = None
+                if FEATURES_KEY in tf[example.key]:
+                    # Features cached when the example converged
+                    features_current = tf[example.key][FEATURES_KEY][...]
+
+            if not narrow_band.any():
+                continue  # Otherwise, repeat the loop until a non-empty band
 
-            if not mask.any():
-                continue  # Otherwise, repeat the loop until a non-empty mask
+            dist, box_origin = example.dist, None
+            if box is not None:
+                # Restrict the computations to the crop box
+                img_, dist = img_[box], dist[box]
+                box_origin = origin(box, example.dx)
 
-            # Compute features.
-            features_current = self.model.feature_map(
-                u=u, img=img_, dist=dist, mask=mask, dx=example.dx)
+            # The band points at which the features are computed
+            feature_band, _ = self.model._feature_band(narrow_band)
+
+            if features_current is None:
+                # Compute features (only at the band points).
+                features_current = self.model.feature_map(
+                    u=u, img=img_, dist=feature_band.dist,
+                    mask=feature_band.mask, dx=example.dx, band=feature_band,
+                    origin=box_origin)
+
+                if example.key in self.converged:
+                    # The features will not change in later iterations
+                    with self.temp_data_handler.open_h5_file(lock=True, mode='a') as tf:  # noqa
+                        tf[example.key].create_dataset(
+                            FEATURES_KEY, data=features_current)
+
+            targets_current = feature_band.gather(dist)
 
             if self.balance_regression_targets:
                 bmask = bal_masks[i]
-                next_index = index + example.dist[mask][bmask].shape[0]
-                features[index:next_index] = features_current[mask][bmask]
-                targets[index:next_index] = example.dist[mask][bmask]
+                next_index = index + bmask.sum()
+                features[index:next_index] = features_current[bmask]
+                targets[index:next_index] = targets_current[bmask]
             else:
-                next_index = index + mask.sum()
-                features[index:next_index] = features_current[mask]
-                targets[index:next_index] = example.dist[mask]
+                next_index = index + feature_band.size
+                features[index:next_index] = features_current
+                targets[index:next_index] = targets_current
 
             index = next_index
 
@@ -453,18 +540,25 @@ class FitJobHandler:
         with open(regression_model_path, 'wb') as f:
             pickle.dump(regression_model, f)
 
-    def _load_regression_model(self, iteration=None):
+    def _load_regression_model(self, iteration=None, dirname=None):
         """ Load the regression model for the given iteration from disk. The
-        default of None uses `self.iteration`.
+        default of None uses `self.iteration`. The regression models are
+        read from the directory written by `fit` in `dirname` (default: the
+        working directory).
         """
         if iteration is None:
             iter = self.iteration
         else:
             iter = iteration
 
+        if len(self.regression_models) >= iter:
+            # The regression models were loaded into memory
+            return self.regression_models[iter-1]
+
         # Build the regression model path from defaults and current iteration
         regression_model_filename = REGRESSION_MODEL_FILENAME.format(iter)
-        regression_model_path = os.path.join(REGRESSION_MODEL_DIRNAME,
+        regression_model_path = os.path.join(dirname or os.path.curdir,
+                                             REGRESSION_MODEL_DIRNAME,
                                              regression_model_filename)
 
         # Un-pickle it!
@@ -473,6 +567,43 @@ class FitJobHandler:
 
         return regression_model
 
+    def load_regression_models(self, dirname=None):
+        """ Load the regression models for all iterations from disk and
+        keep them in memory (e.g., to be pickled with the model). See
+        :meth:`_load_regression_model` for `dirname`.
+        """
+        self.regression_models = [
+            self._load_regression_model(iteration=iteration, dirname=dirname)
+            for iteration in range(1, self.iteration+1)
+        ]
+
+    def _compute_adaptive_step(self, velocities):
+        """ Returns the step for the current iteration such that the CFL
+        condition (or for the semi-implicit scheme, the narrow band limit)
+        holds for the predicted band `velocities` (a dict keyed by example
+        key) over the training and validation datasets, or None if the
+        predicted velocities are all zero
+        """
+        step = numpy.inf
+
+        for example in self.datasets_handler.iterate_examples():
+
+            if example.key not in velocities:
+                continue
+
+            # Only use training and validation datasets, as for auto step
+            in_train = self.datasets_handler.in_training_dataset(example.key)
+            in_valid = self.datasets_handler.in_validation_dataset(
+                example.key)
+            if not (in_train or in_valid):
+                continue
+
+            mx = numpy.abs(velocities[example.key]).max()
+            if mx > 0:
+                step = min(step, self.model._auto_step(mx, example.dx))
+
+        return step if numpy.isfinite(step) else None
+
     def update_level_sets(self):
         """ Update all the level sets using the learned regression model
         """
@@ -480,45 +611,112 @@ class FitJobHandler:
 
         regression_model = self._load_regression_model()
 
+        # The predicted velocities at the band points of each example
+        velocities = {}
+
         for example in self.datasets_handler.iterate_examples():
 
+            if example.key in self.converged:
+                continue
+
             if self.model.normalize_imgs:
                 img_ = (example.img - example.img.mean()) / example.img.std()
             else:
                 img_ = example.img
 
-            with self.temp_data_handler.open_h5_file(lock=True, mode='a') as tf:  # noqa
-                mask = tf[example.key][MASK_KEY][...]
-
-                # Only update if the mask is not empty
-                if mask.any():
-                    u = tf[example.key][LEVEL_SET_KEY][...]
-                    dist = tf[example.key][SIGNED_DIST_KEY][...]
+            with self.temp_data_handler.open_h5_file(lock=False, mode='r') as tf:  # noqa
+                u, narrow_band, box = self._load_level_set(tf[example.key])
+
+            # Only update if the band is not empty
+            if not narrow_band.any():
+                continue
+
+            box_origin = None
+            if box is not None:
+                # Restrict the computations to the crop box
+                img_ = img_[box]
+                box_origin = origin(box, example.dx)
+
+            # Compute features (only at the band points).
+            feature_band, selection = self.model._feature_band(narrow_band)
+            features = self.model.feature_map(
+                u=u, img=img_, dist=feature_band.dist, mask=feature_band.mask,
+                dx=example.dx, band=feature_band, origin=box_origin)
+
+            # Compute approximate velocity from features
+            velocities[example.key] = self.model._extend_velocity(
+                narrow_band, selection, regression_model.predict(features),
+                example.dx)
+
+        # Determine the step for this iteration
+        step = None
+        if self.adaptive_step:
+            step = self._compute_adaptive_step(velocities)
+        if step is None:
+            step = self.steps[-1] if self.steps else self.step
+        self.steps.append(step)
 
-                    # Compute features.
-                    features = self.model.feature_map(
-                        u=u, img=img_, dist=dist, mask=mask, dx=example.dx)
+        self._log_with_iter("Level set step is {:.7f}".format(step))
 
-                    # Compute approximate velocity from features
-                    velocity = numpy.zeros_like(u)
-                    velocity[mask] = regression_model.predict(features[mask])
+        for example in self.datasets_handler.iterate_examples():
 
-                    # Compute gradient magnitude using upwind method
-                    gmag = masked_gradient.gradient_magnitude_osher_sethian(
-                        arr=u, nu=velocity, mask=mask, dx=example.dx)
+            if example.key not in velocities:
+                continue
 
-                    # Here's the actual level set update.
-                    u[mask] += self.step*velocity[mask]*gmag[mask]
+            with self.temp_data_handler.open_h5_file(lock=True, mode='a') as tf:  # noqa
+                group = tf[example.key]
+                u, narrow_band, box = self._load_level_set(group)
+
+                # Here's the actual level set update.
+                u, update = self.model._advance_level_set(
+                    u=u, narrow_band=narrow_band,
+                    velocity=velocities.pop(example.key), step=step,
+                    dx=example.dx, substeps=self.substeps)
+
+                self._check_convergence(example.key, numpy.abs(update).max())
+
+                # Update the narrow band after the
+                # level set field has been updated
+                narrow_band = self.model.reinitializer(
+                    arr=u, band=self.model.band, dx=example.dx,
+                    narrow_band=narrow_band, iteration=self.iteration)
+
+                # Update the data in the temp file
+                if box is None:
+                    group[LEVEL_SET_KEY][...] = u
+                else:
+                    # The level set only changed inside of the crop box,
+                    # which grows as the band moves
+                    group[LEVEL_SET_KEY][box] = u
+                    narrow_band = narrow_band.uncrop(
+                        box, group[LEVEL_SET_KEY].shape)
+
+                    if narrow_band.any():
+                        store_crop_box(group, self.model._crop_box(
+                            None, narrow_band, box, example.dx))
+
+                store_narrow_band(group, narrow_band)
+
+        if self.convergence_tol is not None:
+            msg = "{:d} / {:d} examples converged"
+            self._log_with_iter(msg.format(
+                len(self.converged), self.datasets_handler.n_examples))
+
+    def _check_convergence(self, example_key, max_update):
+        """ Freeze the example if the maximum absolute level set update
+        over its narrow band has been below `convergence_tol` for
+        `convergence_patience` consecutive iterations
+        """
+        if self.convergence_tol is None:
+            return
 
-                    # Update the distance transform and mask
-                    # after the level set field has been updated
-                    dist, mask = distance_transform(
-                        arr=u, band=self.model.band, dx=example.dx)
+        if max_update < self.convergence_tol:
+            self.convergence_counts[example_key] += 1
+        else:
+            self.convergence_counts[example_key] = 0
 
-                    # Update the data in the temp file
-                    tf[example.key][LEVEL_SET_KEY][...] = u
-                    tf[example.key][SIGNED_DIST_KEY][...] = dist
-                    tf[example.key][MASK_KEY][...] = mask
+        if self.convergence_counts[example_key] >= self.convergence_patience:
+            self.converged[example_key] = self.iteration
 
     def can_exit_early(self):
         """ Returns True when the early exit condition is satisfied
@@ -0,0 +1,104 @@
+import pickle
+
+from lsml.core.segmentation import SegmentationMixin
+from lsml.util.semi_implicit import EXPLICIT_INTEGRATOR
+
+
+class InferenceModel(SegmentationMixin):
+    """ The parts of a fitted
+    :class:`lsml.core.model.LevelSetMachineLearning` that are needed to
+    segment images: the feature map, initializer, reinitializer, scorer,
+    band, velocity shell, update scheme, crop margin, per-iteration steps
+    (and substeps) and the regression models.
+
+    Unlike the fitted model, it holds the regression models in memory and
+    does not refer to the training data, temporary data or the working
+    directory. Create one with
+    :meth:`lsml.core.model.LevelSetMachineLearning.export_for_inference`.
+    """
+    def __init__(self, feature_map, initializer, reinitializer, scorer, band,
+                 normalize_imgs, steps, regression_models,
+                 velocity_shell=None, substeps=1,
+                 integrator=EXPLICIT_INTEGRATOR, curvature=0.0,
+                 crop_margin=None):
+        """
+        Parameters
+        ----------
+        feature_map: FeatureMap
+            The feature map of the fitted model
+
+        initializer, reinitializer, scorer, band, normalize_imgs
+            See :class:`lsml.core.model.LevelSetMachineLearning`
+
+        steps: list of float
+            The step for each iteration, where `steps[i]` updates the level
+            set from iteration `i` to `i+1`
+
+        regression_models: list
+            The regression model for each iteration, where
+            `regression_models[i]` predicts the velocities for `steps[i]`
+
+        velocity_shell: float, default=None
+            See :class:`lsml.core.model.LevelSetMachineLearning`
+
+        substeps: int, default=1
+            The number of level set updates per velocity prediction used
+            by default; see :meth:`lsml.LevelSetMachineLearning.fit`
+
+        integrator: str, default='explicit'
+            See :class:`lsml.core.model.LevelSetMachineLearning`
+
+        curvature: float, default=0.0
+            See :class:`lsml.core.model.LevelSetMachineLearning`
+
+        crop_margin: float, default=None
+            See :class:`lsml.core.model.LevelSetMachineLearning`
+        """
+        if len(steps) != len(regression_models):
+            msg = "`steps` and `regression_models` have different lengths"
+            raise ValueError(msg)
+
+        self.feature_map = feature_map
+        self.initializer = initializer
+        self.reinitializer = reinitializer
+        self.scorer = scorer
+        self.band = band
+        self.normalize_imgs = normalize_imgs
+        self.velocity_shell = velocity_shell
+        self.substeps = substeps
+        self.integrator = integrator
+        self.curvature = curvature
+        self.crop_margin = crop_margin
+        self.steps = list(steps)
+        self.regression_models = list(regression_models)
+
+    @property
+    def n_iters(self):
+        """ The number of iterations used to segment an image
+        """
+        return len(self.regression_models)
+
+    def _n_segment_iters(self, iterate_until_validation_max):
+        # The iteration count was chosen on export
+        return self.n_iters
+
+    def _get_regression_model(self, iteration):
+        return self.regression_models[iteration-1]
+
+    def regression_model(self, iteration):
+        return self._get_regression_model(iteration)
+
+    def save(self, filename):
+        """ Write the InferenceModel to disk
+        """
+        with open(filename, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(filename):
+        """ Load an InferenceModel from disk
+        """
+        with open(filename, 'rb') as f:
+            model = pickle.load(f)
+
+        return model
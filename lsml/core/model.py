@@ -5,16 +5,17 @@ import pickle
 
 import numpy
 
-from lsml.core.fit_job_handler import FitJobHandler
 from lsml.core.exception import ModelNotFit
+from lsml.core.segmentation import SegmentationMixin
 from lsml.feature.feature_map import FeatureMap
-from lsml.gradient import masked_gradient as mg
 from lsml.initializer.initializer_base import (
     InitializerBase)
 from lsml.initializer.seed import center_of_mass_seeder
 from lsml.score_functions import jaccard
 from lsml.util.distance_transform import (
-    distance_transform)
+    Reinitializer)
+from lsml.util.semi_implicit import (
+    EXPLICIT_INTEGRATOR, INTEGRATORS)
 
 
 _logger_name = __name__.rsplit('.', 1)[-1]
@@ -23,10 +24,12 @@ logger = logging.getLogger(_logger_name)
 DEFAULT_MODEL_FILENAME = 'LSML-model.pkl'
 
 
-class LevelSetMachineLearning:
+class LevelSetMachineLearning(SegmentationMixin):
 
     def __init__(self, features, initializer, scorer=jaccard, band=3,
-                 normalize_imgs=True):
+                 normalize_imgs=True, reinitializer=None,
+                 velocity_shell=None, integrator=EXPLICIT_INTEGRATOR,
+                 curvature=0.0, crop_margin=None):
         """
         Initialize a level set machine learning object
 
@@ -62,6 +65,53 @@ class LevelSetMachineLearning:
             If True, then the provided images are individually normalized
             by their means and standard deviations
 
+        reinitializer: Reinitializer, default=None
+            The policy for recomputing the narrow band after each level
+            set update; see
+            :class:`lsml.util.distance_transform.Reinitializer`. The
+            default (None) incrementally recomputes the narrow band at
+            every iteration. For large 3D volumes, the sparse-field engine
+            :class:`lsml.util.sparse_field.SparseFieldReinitializer`
+            updates the band layers from the previous band instead.
+
+        velocity_shell: float, default=None
+            If provided, then the features are computed and the velocities
+            predicted (both when fitting and segmenting) only at the band
+            points within this distance of the zero level set, and the
+            velocities at the remaining band points are extended from the
+            nearest of those points. This reduces the featurization and
+            prediction cost when `band` is wide. A value of about the
+            largest grid spacing (i.e., the interface neighborhood) is
+            suggested. The default (None) uses all band points.
+
+        integrator: str, default='explicit'
+            The level set update scheme (both when fitting and segmenting).
+            The 'explicit' upwind scheme is limited to (CFL-bounded) steps
+            that move the front by at most a grid cell per update. The
+            semi-implicit 'aos' scheme (see :mod:`lsml.util.semi_implicit`)
+            is stable for larger steps, so that the automatic step (see
+            :meth:`fit`) moves the front up to a grid cell short of the
+            narrow band edge, and fewer iterations (and regression models)
+            are needed. Its benefit grows with `band`.
+
+        curvature: float, default=0.0
+            The weight of the mean curvature regularizer, which smooths
+            the front; requires the 'aos' integrator, since with the
+            explicit scheme the curvature term restricts the step to the
+            order of the squared grid spacing
+
+        crop_margin: float, default=None
+            If provided, then the per-iteration computations (features,
+            level set updates and reinitialization, both when fitting and
+            segmenting) run over a crop box of the arrays rather than the
+            full arrays (see :mod:`lsml.util.crop`). The box holds the
+            narrow band, padded by the reach of the features (e.g., their
+            gaussian smoothing) and of the reinitialization, and the region
+            where the level set is positive; it grows by this distance
+            whenever the band no longer fits. This reduces the cost per
+            iteration when the segmentation is small relative to the image,
+            and gives the same results. All features must support it (see
+            :meth:`lsml.feature.base_feature.BaseFeature.crop_padding`).
 
         """
         # Create the feature map comprising the given features
@@ -78,6 +128,45 @@ class LevelSetMachineLearning:
         self.band = band
         self.normalize_imgs = normalize_imgs
 
+        if reinitializer is None:
+            reinitializer = Reinitializer()
+        elif not isinstance(reinitializer, Reinitializer):
+            msg = ("`reinitializer` should be an instance of "
+                   "`lsml.util.distance_transform.Reinitializer`")
+            raise ValueError(msg)
+        self.reinitializer = reinitializer
+
+        if velocity_shell is not None and velocity_shell <= 0:
+            msg = "`velocity_shell` ({}) must be positive"
+            raise ValueError(msg.format(velocity_shell))
+        self.velocity_shell = velocity_shell
+
+        if integrator not in INTEGRATORS:
+            msg = "Unknown integrator `{}`; should be one of {}"
+            raise ValueError(msg.format(integrator, INTEGRATORS))
+
+        if curvature < 0:
+            msg = "`curvature` ({}) must be nonnegative"
+            raise ValueError(msg.format(curvature))
+
+        if curvature and integrator == EXPLICIT_INTEGRATOR:
+            msg = "The curvature regularizer requires the 'aos' integrator"
+            raise ValueError(msg)
+
+        self.integrator = integrator
+        self.curvature = float(curvature)
+
+        if crop_margin is not None:
+            if crop_margin < 0:
+                msg = "`crop_margin` ({}) must be nonnegative"
+                raise ValueError(msg.format(crop_margin))
+
+            for feature in self.feature_map.features:
+                if feature.crop_padding(numpy.ones(feature.ndim)) is None:
+                    msg = "Feature `{}` does not support `crop_margin`"
+                    raise ValueError(msg.format(feature.name))
+        self.crop_margin = crop_margin
+
         # These are filled in with `DatasetProxy` post fit
         self.training_data = None
         self.validation_data = None
@@ -104,10 +193,14 @@ class LevelSetMachineLearning:
             seeds=center_of_mass_seeder,
             segs=None,
             step=None,
+            adaptive_step=False,
+            substeps=1,
             subset_size=None,
             temp_data_dir=os.path.curdir,
             validation_history_len=5,
             validation_history_tol=0.0,
+            convergence_tol=None,
+            convergence_patience=3,
             redirect_stdout_to_logfile=True):
         """ Fit a level set machine learning segmentation model
 
@@ -188,7 +281,33 @@ class LevelSetMachineLearning:
             coordinates, but we attempt to avoid this prohibitively
             small step size by assuming that the maximum speed observed
             will be in the first iteration (i.e., that u0 is farthest
-            from the ground-truth).
+            from the ground-truth). With the 'aos' integrator, the step
+            instead moves the front by up to a grid cell short of the narrow
+            band edge at that speed (if larger), and larger given steps are
+            also stable.
+
+        adaptive_step: bool, default=False
+            If True, then the step is recomputed at each iteration from the
+            velocities predicted by that iteration's regression model, as
+            the reciprocal of their maximum absolute value over the narrow
+            bands of the training and validation data (scaled as for the
+            automatic `step`). This satisfies the CFL condition (or the
+            narrow band limit) at each iteration while allowing larger
+            steps as the velocities shrink.
+            The per-iteration steps are stored (see :attr:`steps`) so that
+            :meth:`segment` reproduces them. The `step` computed or given
+            at initialization is used for the first iteration if the
+            predicted velocities are all zero.
+
+        substeps: int, default=1
+            The number of explicit level set updates applied with each
+            iteration's predicted velocities before the narrow band is
+            recomputed, so that the front moves further per (costly)
+            featurization and prediction. Each update uses the full
+            (CFL-bounded) step, and the count is reduced at an iteration
+            if the front could otherwise leave the narrow band before it is
+            recomputed. The value is recorded (see :attr:`substeps`) and
+            used by :meth:`segment` by default.
 
         temp_data_dir: str, default=os.path.curdir
             Where to store the temporary data that is created during the
@@ -204,6 +323,18 @@ class LevelSetMachineLearning:
             :code:`validation_history_len` iterations is less than this
             value, then we exit early.
 
+        convergence_tol: float, default=None
+            If provided, then an example is considered converged once the
+            maximum absolute update of its level set over the narrow band
+            is below this value for :code:`convergence_patience`
+            consecutive iterations. Converged examples are frozen: their
+            level set updates are skipped, and their features (for the
+            regression fits) and scores are carried forward. The default
+            None never freezes examples.
+
+        convergence_patience: int, default=3
+            See :code:`convergence_tol`
+
         max_iters: int, default=100
             The fixed maximum number of iterations
 
@@ -215,9 +346,15 @@ class LevelSetMachineLearning:
             NOTE: disable this to use [i]pdb.set_trace
 
         """
-        # Dirty tricks to initialize the fit handler...
-        kwargs = locals()
+        # Dirty tricks to initialize the fit handler... (the copy keeps the
+        # names bound below out of the arguments)
+        kwargs = dict(locals())
         kwargs['model'] = kwargs.pop('self')
+
+        # Imported here since the fit machinery (and h5py) is not needed to
+        # segment with a fitted model
+        from lsml.core.fit_job_handler import FitJobHandler
+
         self.fit_job_handler = FitJobHandler(**kwargs)
 
         # Set up the level sets according the initializer functions
@@ -267,6 +404,50 @@ class LevelSetMachineLearning:
     # Attributes / methods available after model fit
     #################################################################
 
+    def export_for_inference(self, filename=None,
+                             iterate_until_validation_max=True):
+        """ Returns a :class:`lsml.core.inference.InferenceModel` holding
+        only what is needed to segment images, which is faster to load and
+        smaller than the fitted model, and does not depend on the training
+        data or the working directory
+
+        Parameters
+        ----------
+        filename: str, default=None
+            If provided, the inference model is also written to this file
+
+        iterate_until_validation_max: bool, default=True
+            If True, then only the regression models up to the global max
+            over the validation data are exported, as used by
+            :meth:`segment` by default; otherwise, all are exported
+        """
+        from lsml.core.inference import InferenceModel
+
+        n_iters = self._n_segment_iters(iterate_until_validation_max)
+
+        inference_model = InferenceModel(
+            feature_map=self.feature_map,
+            initializer=self.initializer,
+            reinitializer=self.reinitializer,
+            scorer=self.scorer,
+            band=self.band,
+            normalize_imgs=self.normalize_imgs,
+            velocity_shell=self.velocity_shell,
+            substeps=self.substeps,
+            integrator=self.integrator,
+            curvature=self.curvature,
+            crop_margin=self.crop_margin,
+            steps=self.steps[:n_iters],
+            regression_models=[
+                self._get_regression_model(iteration)
+                for iteration in range(1, n_iters+1)
+            ])
+
+        if filename is not None:
+            inference_model.save(filename)
+
+        return inference_model
+
     def _requires_fit(method):
         """ Decorator for methods that require a fitted model
         """
@@ -280,141 +461,46 @@ class LevelSetMachineLearning:
         return method_wrapped
 
     @_requires_fit
-    def segment(self, img, dx=None, verbose=True, on_iterate=None,
-                return_scores=False, seg=None,
-                iterate_until_validation_max=True):
+    def _n_segment_iters(self, iterate_until_validation_max):
+        """ The number of iterations to segment an image
         """
-        Segment `img`
-
-        Parameters
-        ----------
-        img: ndarray
-            The image
-
-        dx: ndarray or list, default=None
-            List of the spatial delta terms along each axis; default is ones
-
-        verbose: bool, default=True
-            Print progress
-
-        on_iterate: callable or list of callables, default=None
-            Supply a callable to be performed prior to each level set iteration
-            The expected signature is :code:`on_iterate(i, u)`
-            where :code:`u` is level set function at iteration :code:`i`
-
-        return_scores: bool, default=False,
-            Flag to return the scores per iteration
-
-        seg: ndarray, default=None
-            The segmentation mask. Only required when `return_scores=True`
-
-        iterate_until_validation_max: bool, default=True
-            If True, then the iteration will stop at the index corresponding
-            to the global max over the validation data; otherwise, iterations
-            continue for all possible, i.e., for the number regression models
-            that exist
-
-        Returns
-        -------
-        us[, scores]: ndarray[, ndarray]
-            `us` is shape `(len(self.models)+1,) + img.shape`, where `us[i]`
-            is the i'th iterate of the level set function and `us[i] > 0`
-            yields an approximate boolean-mask segmentation of `img` at
-            the i'th iteration
-
-        """
-        ############################################################
-        # Input validation
-        if self.normalize_imgs:
-            img_ = (img - img.mean()) / img.std()
-        else:
-            img_ = img
-
         if iterate_until_validation_max:
-            n_iters = self.validation_scores.mean(axis=1).argmax()
+            return self.validation_scores.mean(axis=1).argmax()
         else:
-            n_iters = self.fit_job_handler.iteration
-
-        dx = numpy.ones(img_.ndim) if dx is None else dx
-
-        if dx.shape[0] != img_.ndim:
-            raise ValueError("`dx` has incorrect number of elements.")
-
-        if on_iterate:
-            if not isinstance(on_iterate, list):
-                on_iterate = [on_iterate]
-
-            if not all([callable(func) for func in on_iterate]):
-                msg = "All on_iterate items must be callable"
-                raise TypeError(msg)
-        if return_scores:
-            if seg is None:
-                msg = "`seg` must be provided to when `return_scores` is True"
-                raise ValueError(msg)
-            from lsml.util.on_iterate import (
-                collect_scores)
-
-            if on_iterate is None:
-                on_iterate = []
-            the_score_collector = collect_scores(seg, self.scorer)
-            on_iterate.append(the_score_collector)
-        # End Input validation
-        ############################################################
-
-        us = numpy.zeros((n_iters+1,) + img.shape)
-        us[0], dist, mask = self.initializer(img_, self.band, dx=dx)
-
-        # Call all of the `on_iterate` callbacks
-        if on_iterate:
-            for func in on_iterate:
-                func(0, us[0])
-
-        velocity = numpy.zeros(img.shape)
-
-        print_string = "Iter: {:02d}"
-        if verbose:
-            print(print_string.format(0))
-
-        for i in range(n_iters):
-            us[i+1] = us[i].copy()
-
-            if mask.any():
-                # Compute the features, and use the model to predict velocity
-                features = self.feature_map(
-                    u=us[i], img=img_, dist=dist, mask=mask, dx=dx)
+            return self.fit_job_handler.iteration
 
-                regression_model = self.fit_job_handler._load_regression_model(
-                    iteration=i+1)
-                velocity[mask] = regression_model.predict(features[mask])
-
-                gmag = mg.gradient_magnitude_osher_sethian(
-                    arr=us[i], nu=velocity, mask=mask, dx=dx)
-
-                # Update the level set.
-                us[i+1][mask] += self.step*velocity[mask]*gmag[mask]
-
-                # Check for level set vanishing.
-                dist, mask = distance_transform(
-                    arr=us[i+1], band=self.band, dx=dx)
-
-            if verbose:
-                print(print_string.format(i+1))
-
-            # Call all of the `on_iterate` callbacks
-            if on_iterate:
-                for func in on_iterate:
-                    func(i+1, us[i+1])
+    def _get_regression_model(self, iteration):
+        return self.fit_job_handler._load_regression_model(iteration=iteration)
 
-        if return_scores:
-            return us, numpy.array(the_score_collector.scores)
-        else:
-            return us
+    def _check_fitted(self):
+        if not self._is_fitted:
+            raise ModelNotFit("This model has not been fit yet")
 
     @property
     @_requires_fit
     def step(self):
         return self.fit_job_handler.step
 
+    @property
+    @_requires_fit
+    def substeps(self):
+        """ The number of level set updates per iteration used in fitting
+        """
+        # Models fit before substeps were introduced used one
+        return getattr(self.fit_job_handler, 'substeps', 1)
+
+    @property
+    @_requires_fit
+    def steps(self):
+        """ The list of steps, where `steps[i]` was used to update the
+        level sets from iteration `i` to `i+1`
+        """
+        steps = getattr(self.fit_job_handler, 'steps', None)
+        if steps is None:
+            # Models fit before per-iteration steps were stored
+            steps = [self.step] * self.fit_job_handler.iteration
+        return steps
+
     @_requires_fit
     def _get_scores_for_dataset(self, dataset_key):
         """ Get an array of scores, shape `(n_iterations, n_examples)`
@@ -0,0 +1,191 @@
+""" Parallel segmentation of many images with a fitted model across
+worker processes
+"""
+import collections
+import concurrent.futures
+import itertools
+import os
+import shutil
+import tempfile
+
+import joblib
+
+
+# The model loaded by each worker process
+_worker_model = None
+
+
+def save_model_archive(model, filename, dirname=None):
+    """ Write a fitted LevelSetMachineLearning model, including all of its
+    regression models, to an (uncompressed) archive that can be memory
+    mapped by :func:`load_model_archive`
+
+    Parameters
+    ----------
+    model: LevelSetMachineLearning or InferenceModel
+        The fitted (or exported) model
+
+    filename: str
+        The filename of the archive
+
+    dirname: str, default=None
+        The directory in which `fit` wrote the regression models of a
+        saved model, from which they are read if not already loaded; the
+        default is the working directory
+    """
+    handler = getattr(model, 'fit_job_handler', None)
+
+    if handler is None:
+        # An InferenceModel holds its regression models
+        joblib.dump(model, filename)
+        return
+
+    regression_models = handler.regression_models
+
+    try:
+        handler.load_regression_models(dirname=dirname)
+        joblib.dump(model, filename)
+    finally:
+        handler.regression_models = regression_models
+
+
+def load_model_archive(filename, mmap_mode='r'):
+    """ Load a model archive written by :func:`save_model_archive`. By
+    default, the numpy arrays of the regression models are memory mapped,
+    so that processes loading the same archive share them in memory rather
+    than holding copies.
+    """
+    return joblib.load(filename, mmap_mode=mmap_mode)
+
+
+def _initialize_worker(archive_filename):
+    global _worker_model
+    _worker_model = load_model_archive(archive_filename)
+
+
+def _segment_worker(index, img, dx, return_mask, segment_kwargs):
+    u = _worker_model.segment(img, dx=dx, verbose=False, keep='final',
+                              **segment_kwargs)
+    return index, (u > 0) if return_mask else u
+
+
+def segment_many(model, imgs, dx=None, n_workers=None, max_in_flight=None,
+                 ordered=True, return_mask=False, **segment_kwargs):
+    """ Segment many images with a fitted model across worker processes,
+    yielding the results as they complete
+
+    Each worker loads the model once from a memory-mapped archive (see
+    :func:`save_model_archive`), so the regression models are shared
+    between the workers rather than copied into each one.
+
+    Parameters
+    ----------
+    model: LevelSetMachineLearning, InferenceModel, or str
+        The fitted (or exported) model, or the filename of a model archive
+        written by :func:`save_model_archive`. For a model, a temporary
+        archive is written and removed when the generator is exhausted or
+        closed.
+
+    imgs: iterable of ndarray
+        The images, which are consumed lazily
+
+    dx: iterable of ndarray, default=None
+        The respective delta terms for the images; the default of None
+        assumes isotropicity with a value of 1
+
+    n_workers: int, default=None
+        The number of worker processes; the default uses the number of CPUs
+
+    max_in_flight: int, default=None
+        The maximum number of images submitted to the workers or completed
+        but not yet yielded, which bounds the memory in use. The default
+        is twice the number of workers.
+
+    ordered: bool, default=True
+        If True, then results are yielded in the order of `imgs`;
+        otherwise, they are yielded as soon as they complete
+
+    return_mask: bool, default=False
+        If True, then the boolean segmentation mask (i.e., `u > 0`) is
+        returned for each image in place of the final level set `u`
+
+    segment_kwargs:
+        Additional keyword arguments to
+        :meth:`lsml.LevelSetMachineLearning.segment` (e.g.,
+        `convergence_tol`)
+
+    Yields
+    ------
+    index, result: int, ndarray
+        The index of the image in `imgs` and its final level set (or mask)
+
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * n_workers
+
+    if max_in_flight < 1:
+        raise ValueError("`max_in_flight` must be positive")
+
+    tmp_dir = None
+
+    if isinstance(model, str):
+        archive_filename = model
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        archive_filename = os.path.join(tmp_dir, 'model.joblib')
+        save_model_archive(model, archive_filename)
+
+    if dx is None:
+        dx = itertools.repeat(None)
+    tasks = enumerate(zip(imgs, dx))
+
+    # Futures submitted to the workers, and completed results that are
+    # waiting for their turn when results are ordered
+    pending = set()
+    completed = collections.OrderedDict()
+    next_index = 0
+    exhausted = False
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_initialize_worker,
+        initargs=(archive_filename,))
+
+    try:
+        while True:
+            # Keep the workers busy, within the in-flight bound
+            while (not exhausted and
+                   len(pending) + len(completed) < max_in_flight):
+                try:
+                    index, (img, dx_) = next(tasks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(
+                    _segment_worker, index, img, dx_, return_mask,
+                    segment_kwargs))
+
+            if not pending and not completed:
+                break
+
+            if pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    index, result = future.result()
+                    completed[index] = result
+
+            if ordered:
+                while next_index in completed:
+                    yield next_index, completed.pop(next_index)
+                    next_index += 1
+            else:
+                while completed:
+                    yield completed.popitem(last=False)
+    finally:
+        # Don't start the remaining work if the generator is closed early
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
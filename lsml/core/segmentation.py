@@ -0,0 +1,736 @@
+""" Segmentation with the regression models of a fitted model, shared by
+:class:`lsml.core.model.LevelSetMachineLearning` and
+:class:`lsml.core.inference.InferenceModel`
+"""
+import numpy
+
+from lsml.gradient import masked_gradient as mg
+from lsml.util.crop import grow_crop_box, origin
+from lsml.util.distance_transform import Reinitializer
+from lsml.util.narrow_band import NarrowBand
+from lsml.util.semi_implicit import (
+    AOS_INTEGRATOR, EXPLICIT_INTEGRATOR, aos_update, reset_stale_values)
+from lsml.util.velocity_extension import extend_velocity, interface_shell
+
+
+class KeptIterates:
+    """ The array of the kept iterates of a level set (see
+    :meth:`SegmentationMixin._kept_iterations`), which is allocated once
+    and to which the kept iterates are copied as they are computed
+    """
+    def __init__(self, kept, shape):
+        self.rows = {iteration: row for row, iteration in enumerate(kept)}
+        self.array = numpy.empty((len(kept),) + tuple(shape))
+        self.n_rows = 0
+
+    def add(self, iteration, u):
+        """ Copy the iterate `u` to its row, if `iteration` is kept
+        """
+        if iteration in self.rows:
+            self.array[self.rows[iteration]] = u
+            self.n_rows += 1
+
+    def fill(self, u):
+        """ Returns the array, with the rows of the iterates after an early
+        stop filled with copies of the last computed iterate `u`
+        """
+        self.array[self.n_rows:] = u
+        return self.array
+
+
+class SegmentationMixin:
+    """ Provides the segmentation methods. Classes using the mixin provide
+    the attributes `feature_map`, `initializer`, `band`, `normalize_imgs`,
+    `scorer` and `steps`, and the methods below that raise
+    NotImplementedError.
+
+    The attributes added since the first release have class-level defaults
+    here, which models pickled before then fall back to.
+    """
+    # The narrow band reinitialization policy; models pickled before it was
+    # configurable recomputed the full distance transform at every iteration
+    reinitializer = Reinitializer(incremental=False)
+
+    # The width of the shell about the zero level set in which velocities
+    # are predicted, or None for the whole narrow band
+    velocity_shell = None
+
+    # The number of level set updates per velocity prediction
+    substeps = 1
+
+    # The level set update scheme, and the weight of the curvature
+    # regularizer (only used by the semi-implicit scheme)
+    integrator = EXPLICIT_INTEGRATOR
+    curvature = 0.0
+
+    # The margin by which the crop box of the per-iteration computations
+    # grows, or None to compute over the full arrays
+    crop_margin = None
+
+    def _n_segment_iters(self, iterate_until_validation_max):
+        """ The number of iterations to segment an image
+        """
+        raise NotImplementedError
+
+    def _get_regression_model(self, iteration):
+        """ The regression model that predicts the velocities used to update
+        the level set to `iteration` (starting from 1)
+        """
+        raise NotImplementedError
+
+    def _check_fitted(self):
+        """ Raises an exception if the model cannot segment images
+        """
+        pass
+
+    def _feature_band(self, narrow_band):
+        """ Returns the narrow band of the points at which the features are
+        computed and the velocities predicted, and the selection of those
+        points among the band points (None if all are selected)
+        """
+        if self.velocity_shell is None:
+            return narrow_band, None
+
+        selection = interface_shell(narrow_band, self.velocity_shell)
+
+        return narrow_band.subset(selection), selection
+
+    def _extend_velocity(self, narrow_band, selection, velocity, dx):
+        """ Returns the velocities predicted at the points of the feature
+        band (see :meth:`_feature_band`) extended to all band points
+        """
+        if selection is None:
+            return velocity
+
+        return extend_velocity(narrow_band, selection, velocity, dx)
+
+    def _crop_padding(self, dx):
+        """ The number of points along each axis by which the crop box must
+        extend beyond the narrow band: the padding needed by the features,
+        and that of the (incremental) reinitialization, which reaches a
+        band width (plus two points) beyond the band. None if a feature
+        must be computed over the full arrays.
+        """
+        padding = self.feature_map.crop_padding(dx)
+        if padding is None:
+            return None
+
+        reach = numpy.ceil(self.band / numpy.asarray(dx)).astype(int) + 2
+
+        return numpy.maximum(padding, reach)
+
+    def _crop_box(self, u, narrow_band, box, dx):
+        """ Returns the crop box (see :mod:`lsml.util.crop`) for the
+        level set `u` and its (non-empty) `narrow_band`, given the current
+        crop box `box`, or None if cropping is disabled
+        """
+        if self.crop_margin is None:
+            return None
+
+        padding = self._crop_padding(dx)
+        if padding is None:
+            return None
+
+        margins = numpy.ceil(
+            self.crop_margin / numpy.asarray(dx)).astype(int)
+
+        return grow_crop_box(box, narrow_band, padding, margins, arr=u)
+
+    @staticmethod
+    def _crop(box, u, img, narrow_band, dx):
+        """ Returns the views of the level set `u` and image `img` over the
+        crop box `box`, the narrow band of the crop, and the position of
+        its first point (or the arguments unchanged and None if `box` is
+        None)
+        """
+        if box is None:
+            return u, img, narrow_band, None
+
+        return u[box], img[box], narrow_band.crop(box), origin(box, dx)
+
+    @staticmethod
+    def _uncrop(box, u, narrow_band, cropped_band, u_next, next_band):
+        """ Returns the level set `u` updated with the values `u_next` of
+        the crop box `box`, which are copied at the points of the narrow
+        band (the only points where the level set changes), and the next
+        narrow band `next_band` of the crop as that of `u`. The previous
+        `narrow_band` (and `cropped_band`, its crop) is that of `u`.
+        """
+        if box is None:
+            return u_next, next_band
+
+        u = u.copy()
+        narrow_band.scatter(u, cropped_band.gather(u_next))
+
+        return u, next_band.uncrop(box, u.shape)
+
+    def segment_iter(self, img, dx=None, iterate_until_validation_max=True,
+                     convergence_tol=None, velocity_tol=None, substeps=None):
+        """
+        Segment `img`, lazily yielding the level set iterates. Only the
+        current and previous iterates are kept alive, so that consumers
+        that need a single iterate at a time (e.g., the final one) avoid
+        holding all of them in memory.
+
+        Parameters
+        ----------
+        img, dx, iterate_until_validation_max, convergence_tol, velocity_tol,
+        substeps
+            See :meth:`segment`
+
+        Yields
+        ------
+        i, u: int, ndarray
+            The iteration number and the level set function at that
+            iteration, starting with the initializer at iteration 0.
+            Iteration stops early (i.e., fewer iterates are yielded) if a
+            convergence criterion is met or the narrow band vanishes. The
+            yielded arrays are not modified afterwards.
+
+        """
+        self._check_fitted()
+
+        return self._segment_iter(
+            img, dx=dx,
+            iterate_until_validation_max=iterate_until_validation_max,
+            convergence_tol=convergence_tol, velocity_tol=velocity_tol,
+            substeps=self._validate_substeps(substeps))
+
+    def _segment_iter(self, img, dx, iterate_until_validation_max,
+                      convergence_tol, velocity_tol, substeps):
+        n_iters = self._n_segment_iters(iterate_until_validation_max)
+        img_, dx, u, narrow_band = self._initialize_segment(img, dx)
+
+        yield 0, u
+
+        steps = self.steps
+        box = None
+
+        for i in range(n_iters):
+
+            if not narrow_band.any():
+                # The level set cannot change once the band vanishes
+                yield i+1, u.copy()
+                return
+
+            # Restrict the computations to the crop box, if enabled
+            box = self._crop_box(u, narrow_band, box, dx)
+            u_box, img_box, cropped_band, box_origin = self._crop(
+                box, u, img_, narrow_band, dx)
+
+            # Compute the features, and use the model to predict velocity
+            feature_band, selection = self._feature_band(cropped_band)
+
+            features = self.feature_map(
+                u=u_box, img=img_box, dist=feature_band.dist,
+                mask=feature_band.mask, dx=dx, band=feature_band,
+                origin=box_origin)
+
+            regression_model = self._get_regression_model(i+1)
+
+            velocity = self._extend_velocity(
+                cropped_band, selection, regression_model.predict(features),
+                dx)
+
+            u_next, next_band, converged = self._update_segment(
+                u=u_box, narrow_band=cropped_band, velocity=velocity,
+                step=steps[i], dx=dx, iteration=i+1,
+                convergence_tol=convergence_tol, velocity_tol=velocity_tol,
+                substeps=substeps)
+
+            u, narrow_band = self._uncrop(
+                box, u, narrow_band, cropped_band, u_next, next_band)
+
+            yield i+1, u
+
+            if converged:
+                return
+
+    def _initialize_segment(self, img, dx):
+        """ Validate the inputs to segment `img` and return the (normalized)
+        image, the delta terms, and the initial level set and narrow band
+        """
+        if self.normalize_imgs:
+            img_ = (img - img.mean()) / img.std()
+        else:
+            img_ = img
+
+        dx = numpy.ones(img_.ndim) if dx is None else dx
+
+        if dx.shape[0] != img_.ndim:
+            raise ValueError("`dx` has incorrect number of elements.")
+
+        u, dist, mask = self.initializer(
+            img_, self.band, dx=dx, engine=self.reinitializer.engine)
+
+        return img_, dx, u, NarrowBand.from_dense(dist, mask)
+
+    def _validate_substeps(self, substeps):
+        """ Returns `substeps`, or the model's if None
+        """
+        if substeps is None:
+            return self.substeps
+
+        if not isinstance(substeps, int) or substeps < 1:
+            msg = "`substeps` ({}) must be a positive int"
+            raise ValueError(msg.format(substeps))
+
+        return substeps
+
+    def _n_substeps(self, substeps, step, velocity, dx):
+        """ The number of updates to apply with the band `velocity`, which
+        is at most `substeps` and such that the front stays at least a grid
+        cell inside the narrow band (which is only recomputed after the
+        updates). Each update moves the front by at most
+        `step * max|velocity|`, i.e., at most a grid cell for a CFL-bounded
+        step.
+        """
+        if substeps == 1:
+            return 1
+
+        max_move = step * numpy.abs(velocity).max()
+        if max_move == 0:
+            return 1
+
+        limit = int((self.band - numpy.max(dx)) / max_move)
+
+        return max(1, min(substeps, limit))
+
+    def _auto_step(self, max_velocity, dx):
+        """ The step for band velocities of magnitude at most `max_velocity`:
+        the CFL-bounded step of the explicit scheme, or for the (stable)
+        semi-implicit scheme, the step that moves the front to within a
+        grid cell of the narrow band edge, if larger
+        """
+        step = numpy.min(dx) / max_velocity
+
+        if self.integrator == AOS_INTEGRATOR:
+            step = max(step, (self.band - numpy.max(dx)) / max_velocity)
+
+        return step
+
+    def _advance_level_set(self, u, narrow_band, velocity, step, dx,
+                           substeps=1):
+        """ Returns the level set advanced from `u` (which is not modified)
+        by updates with the predicted `velocity` at the band points (see
+        :meth:`_n_substeps`), and the total update at the band points
+        """
+        n_substeps = self._n_substeps(substeps, step, velocity, dx)
+
+        velocity = narrow_band.to_dense(velocity)
+        u_next = u.copy()
+        update = None
+
+        if self.integrator == AOS_INTEGRATOR:
+            reset_stale_values(u_next, narrow_band, dx)
+
+        for _ in range(n_substeps):
+            u_band = narrow_band.gather(u_next)
+
+            if self.integrator == AOS_INTEGRATOR:
+                aos_update(arr=u_next, nu=velocity, mask=narrow_band.mask,
+                           step=step, dx=dx, curvature=self.curvature,
+                           out=u_next)
+                substep_update = narrow_band.gather(u_next) - u_band
+            else:
+                # The upwind gradient is recomputed for each update
+                gmag = mg.gradient_magnitude_osher_sethian(
+                    arr=u_next, nu=velocity, mask=narrow_band.mask, dx=dx)
+
+                substep_update = step * narrow_band.gather(velocity * gmag)
+                narrow_band.scatter(u_next, u_band + substep_update)
+
+            if update is None:
+                update = substep_update
+            else:
+                update += substep_update
+
+        return u_next, update
+
+    def _update_segment(self, u, narrow_band, velocity, step, dx, iteration,
+                        convergence_tol=None, velocity_tol=None, substeps=1):
+        """ Returns the level set updated from `u` (which is not modified)
+        with the predicted `velocity` at the band points, the updated narrow
+        band, and whether a convergence criterion was met
+        """
+        u_next, update = self._advance_level_set(
+            u=u, narrow_band=narrow_band, velocity=velocity, step=step,
+            dx=dx, substeps=substeps)
+
+        # Check the convergence criteria
+        converged = False
+        if convergence_tol is not None:
+            converged |= numpy.abs(update).max() < convergence_tol
+        if velocity_tol is not None:
+            converged |= numpy.abs(velocity).max() < velocity_tol
+
+        # Update the narrow band
+        narrow_band = self.reinitializer(
+            arr=u_next, band=self.band, dx=dx, narrow_band=narrow_band,
+            iteration=iteration)
+
+        # The level set cannot change once the band vanishes
+        converged |= not narrow_band.any()
+
+        return u_next, narrow_band, converged
+
+    @staticmethod
+    def _kept_iterations(keep, n_iters):
+        """ The iteration numbers of the iterates kept by `segment`
+        """
+        if keep == 'all':
+            return range(n_iters+1)
+        elif keep == 'final':
+            return [n_iters]
+        elif isinstance(keep, int) and keep > 0:
+            return sorted(set(range(0, n_iters+1, keep)) | {n_iters})
+        else:
+            msg = "`keep` must be 'all', 'final', or a positive int"
+            raise ValueError(msg)
+
+    def segment(self, img, dx=None, verbose=True, on_iterate=None,
+                return_scores=False, seg=None,
+                iterate_until_validation_max=True, convergence_tol=None,
+                velocity_tol=None, return_stop_iteration=False, keep='all',
+                substeps=None):
+        """
+        Segment `img`
+
+        Parameters
+        ----------
+        img: ndarray
+            The image
+
+        dx: ndarray or list, default=None
+            List of the spatial delta terms along each axis; default is ones
+
+        verbose: bool, default=True
+            Print progress
+
+        on_iterate: callable or list of callables, default=None
+            Supply a callable to be performed prior to each level set iteration
+            The expected signature is :code:`on_iterate(i, u)`
+            where :code:`u` is level set function at iteration :code:`i`
+
+        return_scores: bool, default=False,
+            Flag to return the scores per iteration
+
+        seg: ndarray, default=None
+            The segmentation mask. Only required when `return_scores=True`
+
+        iterate_until_validation_max: bool, default=True
+            If True, then the iteration will stop at the index corresponding
+            to the global max over the validation data; otherwise, iterations
+            continue for all possible, i.e., for the number regression models
+            that exist
+
+        convergence_tol: float, default=None
+            If provided, then iteration stops once the maximum absolute
+            update of the level set over the narrow band is below this value
+
+        velocity_tol: float, default=None
+            If provided, then iteration stops once the maximum absolute
+            predicted velocity over the narrow band is below this value
+
+        return_stop_iteration: bool, default=False
+            Flag to return the iteration at which iteration stopped. Besides
+            the above criteria, iteration always stops if the narrow band
+            vanishes, since the level set cannot change afterwards.
+
+        keep: 'all', 'final', or int, default='all'
+            Which iterates to return. 'all' returns every iterate, 'final'
+            returns only the final iterate, and an integer `k` returns
+            every k'th iterate (and the final one). Only the kept iterates
+            are held in memory; see also :meth:`segment_iter`.
+
+        substeps: int, default=None
+            The number of level set updates per velocity prediction (see
+            the `substeps` argument of `fit`). The default (None) uses the
+            number the model was fit with.
+
+        Returns
+        -------
+        us[, scores][, stop_iteration]: ndarray[, ndarray][, int]
+            For `keep='all'`, `us` is shape `(len(self.models)+1,) +
+            img.shape`, where `us[i]` is the i'th iterate of the level set
+            function and `us[i] > 0` yields an approximate boolean-mask
+            segmentation of `img` at the i'th iteration. For `keep='final'`,
+            `us` is the final iterate, of shape `img.shape`, and for integer
+            `keep=k`, `us[j]` is the iterate `min(j*k, n_iters)`. If iteration
+            stopped early, then the remaining iterates (and scores) are
+            copies of the last computed one, so `us` is as large as without
+            stopping; see :meth:`segment_iter` to avoid holding them.
+
+        """
+        self._check_fitted()
+
+        ############################################################
+        # Input validation
+        n_iters = self._n_segment_iters(iterate_until_validation_max)
+        kept = self._kept_iterations(keep, n_iters)
+
+        if on_iterate:
+            if not isinstance(on_iterate, list):
+                on_iterate = [on_iterate]
+
+            if not all([callable(func) for func in on_iterate]):
+                msg = "All on_iterate items must be callable"
+                raise TypeError(msg)
+        if return_scores:
+            if seg is None:
+                msg = "`seg` must be provided to when `return_scores` is True"
+                raise ValueError(msg)
+            from lsml.util.on_iterate import (
+                collect_scores)
+
+            if on_iterate is None:
+                on_iterate = []
+            the_score_collector = collect_scores(seg, self.scorer)
+            on_iterate.append(the_score_collector)
+        # End Input validation
+        ############################################################
+
+        iterates = self.segment_iter(
+            img, dx=dx,
+            iterate_until_validation_max=iterate_until_validation_max,
+            convergence_tol=convergence_tol, velocity_tol=velocity_tol,
+            substeps=substeps)
+
+        print_string = "Iter: {:02d}"
+
+        # For keep='final', only the last iterate is held
+        if keep != 'final':
+            us = KeptIterates(kept, img.shape)
+
+        for stop_iteration, u in iterates:
+
+            if keep != 'final':
+                us.add(stop_iteration, u)
+
+            if verbose:
+                print(print_string.format(stop_iteration))
+
+            # Call all of the `on_iterate` callbacks
+            if on_iterate:
+                for func in on_iterate:
+                    func(stop_iteration, u)
+
+        if verbose and stop_iteration < n_iters:
+            print("Stopped at iteration {:02d}".format(stop_iteration))
+
+        n_remaining = n_iters - stop_iteration
+        if keep == 'final':
+            us = u
+        else:
+            us = us.fill(u)
+
+        results = [us]
+
+        if return_scores:
+            scores = the_score_collector.scores
+            results.append(numpy.array(scores + [scores[-1]] * n_remaining))
+
+        if return_stop_iteration:
+            results.append(stop_iteration)
+
+        return results[0] if len(results) == 1 else tuple(results)
+
+    def segment_batch(self, imgs, dx=None, verbose=True,
+                      iterate_until_validation_max=True, convergence_tol=None,
+                      velocity_tol=None, keep='final', substeps=None):
+        """
+        Segment the images `imgs` in lockstep. At each iteration, the
+        feature vectors over the narrow bands of all images are
+        concatenated so that the regression model predicts the velocities
+        of all images in a single call, which amortizes the per-call
+        overhead of the regression model.
+
+        Parameters
+        ----------
+        imgs: list of ndarray
+            The images, which may have different shapes
+
+        dx: list of ndarray, default=None
+            The list of respective delta terms for the images; the default
+            of None assumes isotropicity with a value of 1
+
+        verbose: bool, default=True
+            Print progress
+
+        iterate_until_validation_max, convergence_tol, velocity_tol, substeps
+            See :meth:`segment`. Images that meet a convergence criterion
+            are removed from the batch.
+
+        keep: 'all', 'final', or int, default='final'
+            Which iterates to return for each image; see :meth:`segment`
+
+        Returns
+        -------
+        us: list of ndarray
+            `us[j]` holds the kept iterates of the j'th image, as returned
+            by :meth:`segment` with the same `keep` argument
+
+        """
+        self._check_fitted()
+
+        n_iters = self._n_segment_iters(iterate_until_validation_max)
+        kept = self._kept_iterations(keep, n_iters)
+        substeps = self._validate_substeps(substeps)
+
+        if dx is None:
+            dx = [None] * len(imgs)
+        elif len(dx) != len(imgs):
+            raise ValueError("`dx` and `imgs` have different lengths.")
+
+        # The per-image (normalized) images, delta terms, current level
+        # sets, narrow bands, and kept iterates (see KeptIterates)
+        imgs_, dxs, us, narrow_bands, iterates = [], [], [], [], []
+
+        for img, dx_ in zip(imgs, dx):
+            img_, dx_, u, narrow_band = self._initialize_segment(img, dx_)
+            imgs_.append(img_)
+            dxs.append(dx_)
+            us.append(u)
+            narrow_bands.append(narrow_band)
+
+            if keep != 'final':
+                iterates.append(KeptIterates(kept, u.shape))
+                iterates[-1].add(0, u)
+
+        # The indices of the images that are still being updated
+        active = [j for j in range(len(imgs)) if narrow_bands[j].any()]
+
+        # The crop boxes of the images (see `_crop_box`)
+        boxes = [None] * len(imgs)
+
+        print_string = "Iter: {:02d} ({:d} active)"
+        if verbose:
+            print(print_string.format(0, len(active)))
+
+        steps = self.steps
+
+        for i in range(n_iters):
+
+            if not active:
+                break
+
+            crops = []
+            for j in active:
+                boxes[j] = self._crop_box(
+                    us[j], narrow_bands[j], boxes[j], dxs[j])
+                crops.append(self._crop(
+                    boxes[j], us[j], imgs_[j], narrow_bands[j], dxs[j]))
+
+            feature_bands = [self._feature_band(cropped_band)
+                             for _, _, cropped_band, _ in crops]
+
+            # Stack the features of all images' band points into one matrix
+            features = numpy.concatenate([
+                self.feature_map(
+                    u=u_box, img=img_box, dist=feature_band.dist,
+                    mask=feature_band.mask, dx=dxs[j], band=feature_band,
+                    origin=box_origin)
+                for j, (u_box, img_box, _, box_origin), (feature_band, _)
+                in zip(active, crops, feature_bands)
+            ])
+
+            regression_model = self._get_regression_model(i+1)
+            velocities = regression_model.predict(features)
+
+            # Split the predictions back into the respective images
+            offsets = numpy.cumsum(
+                [feature_band.size for feature_band, _ in feature_bands])
+            velocities = numpy.split(velocities, offsets[:-1])
+
+            still_active = []
+
+            for j, crop, (_, selection), velocity in zip(
+                    active, crops, feature_bands, velocities):
+
+                u_box, _, cropped_band, _ = crop
+                velocity = self._extend_velocity(
+                    cropped_band, selection, velocity, dxs[j])
+
+                u_next, next_band, converged = self._update_segment(
+                    u=u_box, narrow_band=cropped_band, velocity=velocity,
+                    step=steps[i], dx=dxs[j], iteration=i+1,
+                    convergence_tol=convergence_tol,
+                    velocity_tol=velocity_tol, substeps=substeps)
+
+                us[j], narrow_bands[j] = self._uncrop(
+                    boxes[j], us[j], narrow_bands[j], cropped_band, u_next,
+                    next_band)
+
+                if keep != 'final':
+                    iterates[j].add(i+1, us[j])
+
+                if not converged:
+                    still_active.append(j)
+
+            active = still_active
+
+            if verbose:
+                print(print_string.format(i+1, len(active)))
+
+        if keep == 'final':
+            return us
+
+        return [iterates[j].fill(us[j]) for j in range(len(imgs))]
+
+    def inference_session(self, shape, dx=None,
+                          iterate_until_validation_max=True,
+                          convergence_tol=None, velocity_tol=None,
+                          substeps=None):
+        """
+        Returns an :class:`lsml.core.session.InferenceSession` for
+        repeatedly segmenting images of `shape`, which resolves the
+        iteration count and regression models once and reuses its
+        workspace buffers across iterations and images. See
+        :meth:`segment` for the remaining parameters.
+        """
+        from lsml.core.session import InferenceSession
+
+        return InferenceSession(
+            self, shape, dx=dx,
+            iterate_until_validation_max=iterate_until_validation_max,
+            convergence_tol=convergence_tol, velocity_tol=velocity_tol,
+            substeps=substeps)
+
+    def segment_many(self, imgs, dx=None, n_workers=None, max_in_flight=None,
+                     ordered=True, return_mask=False, **segment_kwargs):
+        """
+        Segment many images across worker processes, yielding
+        `(index, result)` pairs as they complete. See
+        :func:`lsml.core.parallel.segment_many` for the parameters.
+        """
+        self._check_fitted()
+
+        from lsml.core.parallel import segment_many
+
+        return segment_many(
+            self, imgs, dx=dx, n_workers=n_workers,
+            max_in_flight=max_in_flight, ordered=ordered,
+            return_mask=return_mask, **segment_kwargs)
+
+    async def segment_async(self, img, dx=None, on_iterate=None, keep='all',
+                            executor=None, **kwargs):
+        """
+        Segment `img` without blocking the asyncio event loop, by running
+        the iterations on `executor` (default: a new single thread). The
+        `on_iterate` callables may be coroutine functions, which are
+        awaited. See :class:`lsml.core.async_segment.AsyncSegmenter` for
+        iterating asynchronously and capping concurrency, and
+        :meth:`segment` for the remaining parameters.
+        """
+        self._check_fitted()
+
+        from lsml.core.async_segment import AsyncSegmenter
+
+        segmenter = AsyncSegmenter(
+            self, max_concurrency=None if executor else 1, executor=executor)
+
+        try:
+            return await segmenter.segment(
+                img, dx=dx, on_iterate=on_iterate, keep=keep, **kwargs)
+        finally:
+            segmenter.close()
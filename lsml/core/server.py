@@ -0,0 +1,555 @@
+""" A local inference server that keeps fitted models loaded and
+dynamically batches concurrent segmentation requests.
+
+Requests are HTTP over localhost TCP or a Unix socket:
+
+* `POST /segment/<model>?dx=1.0,1.0` with an image in `.npy` format as
+  the body returns the boolean mask in `.npy` format. The model name may
+  be omitted if only one model is served.
+* `GET /models` returns the JSON list of model names.
+* `GET /stats` returns JSON latency and throughput counters per model.
+
+Concurrent requests for the same model are queued and segmented together
+by :meth:`lsml.LevelSetMachineLearning.segment_batch`, so that one
+`predict` call per iteration serves the whole batch.
+
+Example
+-------
+::
+
+    python -m lsml.core.server LSML-model.pkl --port 8765
+
+    # In another process
+    from lsml.core.server import InferenceClient
+    mask = InferenceClient(port=8765).segment(img)
+
+"""
+import argparse
+import collections
+import concurrent.futures
+import http.client
+import http.server
+import io
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy
+
+
+_logger_name = __name__.rsplit('.', 1)[-1]
+logger = logging.getLogger(_logger_name)
+
+#: The number of recent request latencies kept for the percentiles
+LATENCY_HISTORY_LEN = 1000
+
+
+class QueueFull(Exception):
+    """ Raised when a model's request queue is full
+    """
+    pass
+
+
+def _load_model(model):
+    """ Load the model from a filename (a pickled model or a model archive,
+    see :func:`lsml.core.parallel.save_model_archive`) if necessary, with
+    its regression models held in memory. The regression models of a
+    pickled model are read from the directory of its file (see
+    :func:`lsml.segment.load_model`).
+    """
+    from lsml.core.model import LevelSetMachineLearning
+    from lsml.core.parallel import load_model_archive
+    from lsml.segment import load_model
+
+    if isinstance(model, str):
+        if model.endswith('.joblib'):
+            model = load_model_archive(model)
+        else:
+            model = load_model(model)
+
+    if isinstance(model, LevelSetMachineLearning):
+        if not model.fit_job_handler.regression_models:
+            model.fit_job_handler.load_regression_models()
+
+    return model
+
+
+class ModelWorker:
+    """ Queues segmentation requests for one model and segments them in
+    dynamically sized batches on `concurrency` threads
+    """
+    def __init__(self, model, max_batch_size=8, max_batch_delay=0.01,
+                 max_queue=64, concurrency=1, segment_kwargs=None):
+        """
+        Parameters
+        ----------
+        model: LevelSetMachineLearning or InferenceModel
+            The fitted (or exported) model
+
+        max_batch_size: int, default=8
+            The maximum number of images segmented together
+
+        max_batch_delay: float, default=0.01
+            The maximum time (in seconds) to wait for more requests after
+            the first request of a batch arrives
+
+        max_queue: int, default=64
+            The maximum number of queued requests; further requests are
+            rejected with :class:`QueueFull`
+
+        concurrency: int, default=1
+            The number of batches segmented concurrently
+
+        segment_kwargs: dict, default=None
+            Keyword arguments to `segment_batch` (e.g., `convergence_tol`)
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.segment_kwargs = segment_kwargs or {}
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._start_time = time.time()
+        self._latencies = collections.deque(maxlen=LATENCY_HISTORY_LEN)
+        self._counts = collections.Counter()
+
+        self._threads = [
+            threading.Thread(target=self._run, daemon=True)
+            for _ in range(concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, img, dx=None):
+        """ Queue `img` for segmentation and return a future for its mask
+        """
+        future = concurrent.futures.Future()
+
+        try:
+            self._queue.put_nowait((img, dx, future, time.time()))
+        except queue.Full:
+            with self._lock:
+                self._counts['rejected'] += 1
+            raise QueueFull("The request queue is full")
+
+        return future
+
+    def stop(self):
+        """ Stop the worker threads after the queued requests are done
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _next_batch(self):
+        """ Blocks for the first request, then collects more requests until
+        the batch is full or `max_batch_delay` has passed. Returns None when
+        the worker should stop.
+        """
+        item = self._queue.get()
+        if item is None:
+            return None
+
+        batch = [item]
+        deadline = time.time() + self.max_batch_delay
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                # Pass the stop signal on after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._segment(batch)
+
+    def _segment(self, batch):
+        """ Segments a batch of requests and resolves their futures. If the
+        batch fails, its requests are retried one at a time so that only
+        the failing requests receive the error.
+        """
+        imgs, dxs, futures, start_times = zip(*batch)
+
+        try:
+            us = self.model.segment_batch(
+                list(imgs), dx=list(dxs), verbose=False, keep='final',
+                **self.segment_kwargs)
+        except Exception as e:
+            if len(batch) > 1:
+                logger.warning("Batch segmentation failed; retrying the "
+                               "%d requests one at a time", len(batch))
+                for item in batch:
+                    self._segment([item])
+                return
+
+            logger.exception("Error during segmentation")
+            with self._lock:
+                self._counts['errors'] += 1
+            futures[0].set_exception(e)
+            return
+
+        now = time.time()
+
+        with self._lock:
+            self._counts['batches'] += 1
+            self._counts['images'] += len(batch)
+            self._latencies.extend(now - t for t in start_times)
+
+        for future, u in zip(futures, us):
+            future.set_result(u > 0)
+
+    def stats(self):
+        """ Returns a dict of the request counters, the latency percentiles
+        (in seconds) over recent requests, and the throughput (images per
+        second) since the worker started
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = numpy.array(self._latencies)
+
+        n_images = counts.get('images', 0)
+        n_batches = counts.get('batches', 0)
+
+        stats = {
+            'images': n_images,
+            'batches': n_batches,
+            'rejected': counts.get('rejected', 0),
+            'errors': counts.get('errors', 0),
+            'queued': self._queue.qsize(),
+            'mean_batch_size': n_images / n_batches if n_batches else 0.0,
+            'throughput': n_images / (time.time() - self._start_time),
+        }
+
+        for percentile in (50, 95, 99):
+            key = 'latency_p{:d}'.format(percentile)
+            stats[key] = (float(numpy.percentile(latencies, percentile))
+                          if latencies.size else None)
+
+        return stats
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, obj):
+        self._send(status, json.dumps(obj).encode(), 'application/json')
+
+    def _send_error(self, status, message):
+        self._send_json(status, {'error': message})
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+
+        if path == '/models':
+            self._send_json(200, sorted(self.server.workers))
+        elif path == '/stats':
+            self._send_json(200, {
+                name: worker.stats()
+                for name, worker in self.server.workers.items()
+            })
+        else:
+            self._send_error(404, "Unknown path {}".format(path))
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+
+        if parts[0] != 'segment' or len(parts) > 2:
+            self._send_error(404, "Unknown path {}".format(url.path))
+            return
+
+        workers = self.server.workers
+        if len(parts) == 2:
+            name = parts[1]
+        elif len(workers) == 1:
+            name, = workers
+        else:
+            self._send_error(400, "The model name is required")
+            return
+
+        if name not in workers:
+            self._send_error(404, "Unknown model {}".format(name))
+            return
+
+        try:
+            length = int(self.headers['Content-Length'])
+            img = numpy.load(io.BytesIO(self.rfile.read(length)),
+                             allow_pickle=False)
+
+            query = urllib.parse.parse_qs(url.query)
+            dx = None
+            if 'dx' in query:
+                dx = numpy.array(
+                    [float(d) for d in query['dx'][0].split(',')])
+                if dx.shape[0] != img.ndim:
+                    raise ValueError("`dx` has incorrect number of elements")
+        except (TypeError, ValueError) as e:
+            self._send_error(400, "Invalid request: {}".format(e))
+            return
+
+        try:
+            future = workers[name].submit(img, dx=dx)
+        except QueueFull as e:
+            self._send_error(503, str(e))
+            return
+
+        try:
+            mask = future.result()
+        except Exception as e:
+            self._send_error(500, "Segmentation failed: {}".format(e))
+            return
+
+        body = io.BytesIO()
+        numpy.save(body, mask, allow_pickle=False)
+        self._send(200, body.getvalue(), 'application/octet-stream')
+
+
+class _TCPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    address_family = socket.AF_UNIX
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        # Bypass the (host, port) handling of HTTPServer.server_bind
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+class InferenceServer:
+    """ Serves segmentation requests for one or more fitted models, which
+    are loaded once and kept in memory
+    """
+    def __init__(self, models, host='127.0.0.1', port=0, unix_socket=None,
+                 max_batch_size=8, max_batch_delay=0.01, max_queue=64,
+                 concurrency=1, segment_kwargs=None):
+        """
+        Parameters
+        ----------
+        models: dict
+            Maps model names to fitted models or their filenames (pickled
+            models or model archives)
+
+        host, port: str, int, default='127.0.0.1', 0
+            The address to listen on; port 0 picks a free port (see
+            :attr:`port`)
+
+        unix_socket: str, default=None
+            If provided, listen on this Unix socket path instead
+
+        max_batch_size, max_batch_delay, max_queue, concurrency,
+        segment_kwargs
+            See :class:`ModelWorker`; these apply to each model
+        """
+        self.workers = {
+            name: ModelWorker(
+                _load_model(model), max_batch_size=max_batch_size,
+                max_batch_delay=max_batch_delay, max_queue=max_queue,
+                concurrency=concurrency, segment_kwargs=segment_kwargs)
+            for name, model in models.items()
+        }
+
+        if unix_socket is not None:
+            self._server = _UnixServer(unix_socket, _RequestHandler)
+        else:
+            self._server = _TCPServer((host, port), _RequestHandler)
+
+        self._server.workers = self.workers
+        self._thread = None
+
+    @property
+    def address(self):
+        """ The (host, port) or Unix socket path being served
+        """
+        return self._server.server_address
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        """ Serve requests on a background thread
+        """
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """ Serve requests on the calling thread
+        """
+        self._server.serve_forever()
+
+    def stop(self):
+        """ Stop serving and shut down the model workers
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+        for worker in self.workers.values():
+            worker.stop()
+
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class InferenceClient:
+    """ A client for :class:`InferenceServer`
+    """
+    def __init__(self, host='127.0.0.1', port=None, unix_socket=None,
+                 timeout=None):
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.timeout = timeout
+
+    def _connection(self):
+        if self.unix_socket is not None:
+            return _UnixHTTPConnection(self.unix_socket, timeout=self.timeout)
+        return http.client.HTTPConnection(
+            self.host, self.port, timeout=self.timeout)
+
+    def _request(self, method, path, body=None):
+        connection = self._connection()
+        try:
+            connection.request(method, path, body=body)
+            response = connection.getresponse()
+            data = response.read()
+        finally:
+            connection.close()
+
+        if response.status != 200:
+            message = json.loads(data.decode()).get('error', '')
+            raise RuntimeError("Request failed ({:d}): {}".format(
+                response.status, message))
+
+        return data
+
+    def segment(self, img, model=None, dx=None):
+        """ Returns the boolean mask segmenting `img` with the named
+        `model` (which may be omitted if the server has one model)
+        """
+        path = '/segment' if model is None else '/segment/' + model
+        if dx is not None:
+            path += '?dx=' + ','.join(str(float(d)) for d in dx)
+
+        body = io.BytesIO()
+        numpy.save(body, numpy.asarray(img), allow_pickle=False)
+
+        data = self._request('POST', path, body=body.getvalue())
+        return numpy.load(io.BytesIO(data), allow_pickle=False)
+
+    def models(self):
+        return json.loads(self._request('GET', '/models').decode())
+
+    def stats(self):
+        return json.loads(self._request('GET', '/stats').decode())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve segmentation requests with fitted lsml models")
+    parser.add_argument('models', nargs='+',
+                        help="Model filenames, optionally as NAME=FILENAME")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', default=None,
+                        help="Listen on this Unix socket path instead")
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--max-batch-delay', type=float, default=0.01,
+                        help="Seconds to wait to fill a batch")
+    parser.add_argument('--max-queue', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="Batches segmented concurrently per model")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    models = {}
+    for spec in args.models:
+        name, _, filename = spec.rpartition('=')
+        name = name or os.path.splitext(os.path.basename(filename))[0]
+        models[name] = filename
+
+    server = InferenceServer(
+        models, host=args.host, port=args.port, unix_socket=args.unix_socket,
+        max_batch_size=args.max_batch_size,
+        max_batch_delay=args.max_batch_delay, max_queue=args.max_queue,
+        concurrency=args.concurrency)
+
+    logger.info("Serving %s on %s", sorted(models), server.address)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+""" Repeated segmentation of images of a fixed shape with reusable workspace
+buffers
+
+Example
+-------
+::
+
+    session = model.inference_session(shape=(256, 256))
+    u = numpy.empty((256, 256))
+
+    for img in imgs:
+        session.segment(img, out=u)
+
+"""
+import numpy
+
+from lsml.gradient import masked_gradient as mg
+from lsml.util.crop import origin
+from lsml.util.narrow_band import NarrowBand
+from lsml.util.semi_implicit import (
+    AOS_INTEGRATOR, aos_update, reset_stale_values)
+
+
+class InferenceSession:
+    """ Segments images of a fixed shape with a fitted model. The iteration
+    count, steps and regression models are resolved once on creation, and
+    the dense and band-sized workspaces (features, velocities, gradient
+    magnitudes and level sets) are allocated once and reused across
+    iterations and images. If the model crops the computations (see
+    `crop_margin` of :class:`lsml.core.model.LevelSetMachineLearning`),
+    the dense workspaces are those of the crop box, which are reallocated
+    when the box grows, and the level set is written back at the band
+    points.
+
+    The band-sized workspaces grow (geometrically) when the narrow band
+    exceeds their capacity, so that the steady state does not allocate
+    them. The features, regression models, initializer and reinitializer
+    (and the semi-implicit update, if used) may still allocate their own
+    results.
+
+    A session is not thread-safe; use one session per thread. Create one
+    with :meth:`lsml.core.segmentation.SegmentationMixin.inference_session`.
+    """
+    def __init__(self, model, shape, dx=None,
+                 iterate_until_validation_max=True, convergence_tol=None,
+                 velocity_tol=None, substeps=None):
+        """
+        Parameters
+        ----------
+        model: LevelSetMachineLearning or InferenceModel
+            The fitted (or exported) model
+
+        shape: tuple of int
+            The shape of the images to segment
+
+        dx: ndarray or list, default=None
+            The spatial delta terms along each axis; default is ones
+
+        iterate_until_validation_max, convergence_tol, velocity_tol, substeps
+            See :meth:`lsml.LevelSetMachineLearning.segment`
+        """
+        model._check_fitted()
+
+        self.model = model
+        self.shape = tuple(shape)
+
+        dx = numpy.ones(len(self.shape)) if dx is None else numpy.asarray(dx)
+        if dx.shape[0] != len(self.shape):
+            raise ValueError("`dx` has incorrect number of elements.")
+        self.dx = dx
+
+        self.convergence_tol = convergence_tol
+        self.velocity_tol = velocity_tol
+        self.substeps = model._validate_substeps(substeps)
+
+        # Resolve the iteration count and bind the regression models once
+        self.n_iters = model._n_segment_iters(iterate_until_validation_max)
+        self.steps = list(model.steps[:self.n_iters])
+        self.regression_models = [
+            model._get_regression_model(iteration)
+            for iteration in range(1, self.n_iters+1)
+        ]
+
+        # The dense workspaces, which are those of the crop box (allocated
+        # by `_reserve_box`) if the model crops the computations
+        self._cropped = (model.crop_margin is not None and
+                         model._crop_padding(self.dx) is not None)
+
+        self._img = numpy.empty(self.shape)
+
+        if self._cropped:
+            self._us = (numpy.empty(self.shape),)
+            self._box_shape = None
+        else:
+            self._us = (numpy.empty(self.shape), numpy.empty(self.shape))
+            self._velocity = numpy.zeros(self.shape)
+            self._gmag = numpy.zeros(self.shape)
+
+        # The band-sized workspaces, allocated by `_reserve`
+        self._capacity = 0
+        self._features = None
+        self._band_update = None
+        self._band_substep_update = None
+        self._band_u = None
+
+    def _reserve(self, size):
+        """ Grow the band-sized workspaces to hold at least `size` points
+        """
+        if size <= self._capacity:
+            return
+
+        capacity = max(size, 2*self._capacity)
+        n_features = self.model.feature_map.n_features
+
+        self._features = numpy.empty((capacity, n_features))
+        self._band_update = numpy.empty(capacity)
+        self._band_substep_update = numpy.empty(capacity)
+        self._band_u = numpy.empty(capacity)
+        self._capacity = capacity
+
+    def _reserve_box(self, box):
+        """ Returns the dense workspaces for the crop `box`, holding the
+        level set values of the box
+        """
+        shape = tuple(s.stop - s.start for s in box)
+
+        if shape != self._box_shape:
+            self._box_us = (numpy.empty(shape), numpy.empty(shape))
+            self._velocity = numpy.zeros(shape)
+            self._gmag = numpy.zeros(shape)
+            self._box_shape = shape
+
+        u_box, u_next = self._box_us
+        u_box[...] = self._us[0][box]
+
+        return u_box, u_next
+
+    def segment(self, img, out=None, return_stop_iteration=False):
+        """ Segment `img` and return the final iterate of the level set
+
+        Parameters
+        ----------
+        img: ndarray
+            The image, of the session's shape
+
+        out: ndarray, default=None
+            If provided, the final iterate is written into this array (of
+            the session's shape) and it is returned
+
+        return_stop_iteration: bool, default=False
+            Flag to return the iteration at which iteration stopped; see
+            :meth:`lsml.LevelSetMachineLearning.segment`
+
+        Returns
+        -------
+        u[, stop_iteration]: ndarray[, int]
+            The final iterate of the level set function
+        """
+        if img.shape != self.shape:
+            msg = "`img` has shape {}, but the session is for shape {}"
+            raise ValueError(msg.format(img.shape, self.shape))
+
+        model = self.model
+        dx = self.dx
+
+        if model.normalize_imgs:
+            numpy.subtract(img, img.mean(), out=self._img)
+            self._img /= img.std()
+        else:
+            self._img[...] = img
+
+        u0, dist, mask = model.initializer(
+            self._img, model.band, dx=dx, engine=model.reinitializer.engine)
+
+        u = self._us[0]
+        u[...] = u0
+        narrow_band = NarrowBand.from_dense(dist, mask)
+
+        box = None
+        stop_iteration = 0
+
+        for i in range(self.n_iters):
+
+            if not narrow_band.any():
+                # The level set cannot change once the band vanishes
+                stop_iteration = i+1
+                break
+
+            if self._cropped:
+                # Update the crop of the level set, and write it back at
+                # the band points
+                box = model._crop_box(u, narrow_band, box, dx)
+                u_box, u_next = self._reserve_box(box)
+                cropped_band = narrow_band.crop(box)
+
+                next_band, converged = self._iterate(
+                    i, u_box, u_next, self._img[box], cropped_band,
+                    origin(box, dx))
+
+                narrow_band.scatter(u, cropped_band.gather(u_next))
+                narrow_band = next_band.uncrop(box, self.shape)
+            else:
+                u_next = self._us[1]
+                narrow_band, converged = self._iterate(
+                    i, u, u_next, self._img, narrow_band, None)
+
+                u, u_next = u_next, u
+                self._us = (u, u_next)
+
+            stop_iteration = i+1
+
+            if converged or not narrow_band.any():
+                break
+
+        if out is None:
+            out = u.copy()
+        else:
+            out[...] = u
+
+        if return_stop_iteration:
+            return out, stop_iteration
+
+        return out
+
+    def _iterate(self, i, u, u_next, img, narrow_band, box_origin):
+        """ Writes the level set `u` updated by the i'th iteration into
+        `u_next`, and returns the next narrow band and whether a
+        convergence criterion was met. The arrays are those of the crop
+        box whose first point lies at `box_origin`, if not None.
+        """
+        model = self.model
+        dx = self.dx
+
+        # The feature band is a subset of the narrow band
+        size = narrow_band.size
+        self._reserve(size)
+
+        feature_band, selection = model._feature_band(narrow_band)
+
+        features = model.feature_map(
+            u=u, img=img, dist=feature_band.dist, mask=feature_band.mask,
+            dx=dx, band=feature_band, out=self._features[:feature_band.size],
+            origin=box_origin)
+
+        velocity = model._extend_velocity(
+            narrow_band, selection,
+            self.regression_models[i].predict(features), dx)
+
+        # Only the band points of the dense velocity are read
+        narrow_band.scatter(self._velocity, velocity)
+
+        n_substeps = model._n_substeps(
+            self.substeps, self.steps[i], velocity, dx)
+
+        u_next[...] = u
+        update = self._band_update[:size]
+        substep_update = self._band_substep_update[:size]
+        band_u = self._band_u[:size]
+
+        if model.integrator == AOS_INTEGRATOR:
+            reset_stale_values(u_next, narrow_band, dx)
+
+        for substep in range(n_substeps):
+            if model.integrator == AOS_INTEGRATOR:
+                narrow_band.gather(u_next, out=band_u)
+                aos_update(
+                    arr=u_next, nu=self._velocity, mask=narrow_band.mask,
+                    step=self.steps[i], dx=dx, curvature=model.curvature,
+                    out=u_next)
+                narrow_band.gather(u_next, out=substep_update)
+                substep_update -= band_u
+            else:
+                mg.gradient_magnitude_osher_sethian(
+                    arr=u_next, nu=self._velocity, mask=narrow_band.mask,
+                    dx=dx, out=self._gmag)
+
+                narrow_band.gather(self._gmag, out=substep_update)
+                substep_update *= velocity
+                substep_update *= self.steps[i]
+
+                narrow_band.gather(u_next, out=band_u)
+                band_u += substep_update
+                narrow_band.scatter(u_next, band_u)
+
+            # Accumulate the total update
+            if substep:
+                update += substep_update
+            else:
+                update[...] = substep_update
+
+        # Check the convergence criteria
+        converged = False
+        if self.convergence_tol is not None:
+            max_update = max(update.max(), -update.min())
+            converged |= max_update < self.convergence_tol
+        if self.velocity_tol is not None:
+            max_velocity = max(velocity.max(), -velocity.min())
+            converged |= max_velocity < self.velocity_tol
+
+        # Update the narrow band
+        narrow_band = model.reinitializer(
+            arr=u_next, band=model.band, dx=dx, narrow_band=narrow_band,
+            iteration=i+1)
+
+        return narrow_band, converged
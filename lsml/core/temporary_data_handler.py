@@ -6,6 +6,8 @@ import time
 import h5py
 import numpy
 
+from lsml.util.narrow_band import NarrowBand
+
 
 # The name of the temporary hdf5 file to be created
 TMP_H5_FILE_NAME = 'tmp.h5'
@@ -19,8 +21,52 @@ TMP_DIR_NAME = 'tmp'
 
 # Keys into the temporary dataset
 LEVEL_SET_KEY = 'level-set-field'
-SIGNED_DIST_KEY = 'signed-distance'
-MASK_KEY = 'mask'
+BAND_INDICES_KEY = 'band-indices'
+BAND_DISTANCES_KEY = 'band-distances'
+FEATURES_KEY = 'features'
+CROP_BOX_KEY = 'crop-box'
+
+
+def store_narrow_band(group, narrow_band):
+    """ Store the sparse narrow band (see
+    :class:`lsml.util.narrow_band.NarrowBand`) in the hdf5 `group`,
+    replacing any previously stored band
+    """
+    for key in (BAND_INDICES_KEY, BAND_DISTANCES_KEY):
+        if key in group:
+            del group[key]
+
+    group.create_dataset(BAND_INDICES_KEY, data=narrow_band.indices)
+    group.create_dataset(BAND_DISTANCES_KEY, data=narrow_band.distances)
+    group[BAND_INDICES_KEY].attrs['shape'] = narrow_band.shape
+    group[BAND_INDICES_KEY].attrs['outside'] = narrow_band.outside
+
+
+def load_narrow_band(group):
+    """ Load the sparse narrow band stored in the hdf5 `group`
+    """
+    indices = group[BAND_INDICES_KEY]
+    return NarrowBand(indices=indices[...],
+                      distances=group[BAND_DISTANCES_KEY][...],
+                      shape=tuple(indices.attrs['shape']),
+                      outside=indices.attrs['outside'])
+
+
+def store_crop_box(group, box):
+    """ Store the crop box (see :mod:`lsml.util.crop`) in the attributes of
+    the hdf5 `group`, as the start and stop index along each axis
+    """
+    group.attrs[CROP_BOX_KEY] = [(s.start, s.stop) for s in box]
+
+
+def load_crop_box(group):
+    """ Load the crop box stored in the hdf5 `group`, or None if there is
+    none
+    """
+    if CROP_BOX_KEY not in group.attrs:
+        return None
+    return tuple(slice(int(start), int(stop))
+                 for start, stop in group.attrs[CROP_BOX_KEY])
 
 
 class TemporaryDataHandler:
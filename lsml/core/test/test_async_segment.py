@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from lsml.core.async_segment import AsyncSegmenter
+from lsml.core.model import LevelSetMachineLearning
+
+
+class CountingModel(LevelSetMachineLearning):
+    """ Stands in for a fitted model; the i'th iterate is `img + i`
+    """
+    def __init__(self, n_iters=5, delay=0.01):
+        self._is_fitted = True
+        self.n_iters = n_iters
+        self.delay = delay
+        self.n_computed = 0
+        self.n_running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def _n_segment_iters(self, iterate_until_validation_max):
+        return self.n_iters
+
+    def segment_iter(self, img, dx=None, **kwargs):
+        for i in range(self.n_iters+1):
+            with self._lock:
+                self.n_running += 1
+                self.max_running = max(self.max_running, self.n_running)
+            time.sleep(self.delay)
+            with self._lock:
+                self.n_running -= 1
+                self.n_computed += 1
+            yield i, img + i
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+class TestAsyncSegmenter(unittest.TestCase):
+
+    def test_iterate(self):
+
+        model = CountingModel()
+        img = np.zeros((4, 4))
+
+        async def collect():
+            async with AsyncSegmenter(model) as segmenter:
+                return [(i, u[0, 0]) async for i, u in segmenter.iterate(img)]
+
+        self.assertEqual([(i, i) for i in range(6)], run(collect()))
+
+    def test_segment_keep_and_callbacks(self):
+
+        model = CountingModel()
+        img = np.zeros((4, 4))
+        seen = []
+
+        async def on_iterate(i, u):
+            await asyncio.sleep(0)
+            seen.append(i)
+
+        us = run(model.segment_async(img, on_iterate=on_iterate, keep=2))
+
+        self.assertEqual(list(range(6)), seen)
+        self.assertEqual([0, 2, 4, 5], list(us[:, 0, 0]))
+
+        u = run(model.segment_async(img, keep='final'))
+        self.assertEqual(5, u[0, 0])
+
+    def test_event_loop_not_blocked(self):
+
+        model = CountingModel(n_iters=10, delay=0.02)
+        img = np.zeros((4, 4))
+
+        async def main():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.005)
+                    ticks += 1
+
+            task = asyncio.ensure_future(ticker())
+            await model.segment_async(img, keep='final')
+            task.cancel()
+            return ticks
+
+        self.assertGreater(run(main()), 10)
+
+    def test_cancellation(self):
+
+        model = CountingModel(n_iters=100, delay=0.01)
+        img = np.zeros((4, 4))
+
+        async def main():
+            segmenter = AsyncSegmenter(model)
+            task = asyncio.ensure_future(segmenter.segment(img))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0.1)
+            segmenter.close()
+
+        run(main())
+
+        # The segmentation stopped between iterations
+        self.assertLess(model.n_computed, 50)
+
+    def test_max_concurrency(self):
+
+        model = CountingModel(n_iters=5, delay=0.01)
+        img = np.zeros((4, 4))
+
+        async def main():
+            async with AsyncSegmenter(model, max_concurrency=2) as segmenter:
+                await asyncio.gather(*[
+                    segmenter.segment(img, keep='final') for _ in range(6)
+                ])
+
+        run(main())
+
+        self.assertEqual(6 * 6, model.n_computed)
+        self.assertLessEqual(model.max_running, 2)
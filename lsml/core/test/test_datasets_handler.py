@@ -162,6 +162,37 @@ class TestDatasetsHandler(unittest.TestCase):
             if os.path.exists(h5_file):
                 os.remove(h5_file)
 
+    def test_segs_without_boundary(self):
+
+        n_examples = 3
+        n_dim = 3
+
+        # Create some fake image data
+        imgs = [
+            self.random_state.randn(
+                *self.random_state.randint(10, 41, size=n_dim))
+            for _ in range(n_examples)
+        ]
+
+        h5_file = 'tmp.h5'
+
+        for fill_value in (False, True):
+
+            # Create some fake segmentation data, one without a boundary
+            segs = [
+                imgs[i] > 0
+                for i in range(n_examples)
+            ]
+            segs[1] = numpy.full(imgs[1].shape, fill_value)
+
+            try:
+                with self.assertRaises(ValueError) as context:
+                    DatasetsHandler(h5_file=h5_file, imgs=imgs, segs=segs)
+                self.assertIn('segs[1]', str(context.exception))
+            finally:
+                if os.path.exists(h5_file):
+                    os.remove(h5_file)
+
     def test_wrong_dx_shape(self):
 
         n_examples = 3
@@ -0,0 +1,131 @@
+import collections
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+
+from lsml.core.model import LevelSetMachineLearning
+from lsml.data.dim2 import hamburger
+from lsml.feature.provided import image
+from lsml.initializer.provided.ball import BallInitializer
+
+
+class FeatureMapCallCounter:
+    """ Wraps the feature map of a model to count its calls per iteration
+    of the fit
+    """
+    def __init__(self, model):
+        self.feature_map = model.feature_map
+        self.model = model
+        self.calls = collections.Counter()
+
+    def __call__(self, *args, **kwargs):
+        self.calls[self.model.fit_job_handler.iteration] += 1
+        return self.feature_map(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name == 'feature_map':
+            raise AttributeError(name)
+        return getattr(self.feature_map, name)
+
+
+def fit_model(tmp_dir, n_examples=24, max_iters=5, count_features=False,
+              **kwargs):
+    """ Fits a small model in `tmp_dir`, where the fit writes its log,
+    data and regression models
+    """
+    random_state = np.random.RandomState(1234)
+    imgs, segs = hamburger.make_dataset(
+        N=n_examples, verbose=False, random_state=random_state)
+
+    model = LevelSetMachineLearning(
+        features=[image.ImageSample(sigma=0), image.ImageSample(sigma=2)],
+        initializer=BallInitializer(radius=8))
+
+    if count_features:
+        model.feature_map = FeatureMapCallCounter(model)
+
+    cwd = os.getcwd()
+    os.chdir(tmp_dir)
+    try:
+        model.fit(
+            'dataset.h5', imgs=imgs, segs=segs, max_iters=max_iters,
+            random_state=random_state,
+            regression_model_class=LinearRegression,
+            regression_model_kwargs={},
+            # Never exit early, so that all iterations are run
+            validation_history_tol=-np.inf,
+            temp_data_dir=tmp_dir, redirect_stdout_to_logfile=False,
+            **kwargs)
+        model.fit_job_handler.load_regression_models()
+    finally:
+        os.chdir(cwd)
+
+    return model, imgs
+
+
+class TestFitJobHandler(unittest.TestCase):
+
+    def test_adaptive_step(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model, imgs = fit_model(tmp_dir, adaptive_step=True)
+
+        # One step is stored per iteration, each recomputed from that
+        # iteration's predicted velocities
+        self.assertEqual(5, model.fit_job_handler.iteration)
+        self.assertEqual(5, len(model.steps))
+        self.assertTrue(all(step > 0 for step in model.steps))
+        self.assertTrue(any(step != model.step for step in model.steps))
+
+        # Segmentation reproduces the per-iteration steps
+        with mock.patch.object(model, '_update_segment',
+                               wraps=model._update_segment) as update:
+            model.segment(imgs[0], verbose=False,
+                          iterate_until_validation_max=False)
+
+        steps = [call[1]['step'] for call in update.call_args_list]
+        self.assertEqual(model.steps[:len(steps)], steps)
+        self.assertGreater(len(steps), 0)
+
+    def test_fixed_step(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model, _ = fit_model(tmp_dir, max_iters=2, step=0.5)
+
+        self.assertEqual([0.5, 0.5], model.steps)
+
+    def test_convergence_freezing(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Every update is below the tolerance, so each example freezes
+            # after `convergence_patience` iterations
+            model, _ = fit_model(
+                tmp_dir, convergence_tol=1e6, convergence_patience=2,
+                count_features=True)
+
+        fit_job_handler = model.fit_job_handler
+        n_examples = fit_job_handler.datasets_handler.n_examples
+        n_training = model.training_scores.shape[1]
+
+        self.assertEqual(
+            dict.fromkeys(fit_job_handler.scores, 2),
+            fit_job_handler.converged)
+
+        # The features are computed for the regression fit (training
+        # examples) and the update (all examples) until the examples
+        # freeze, then once more to cache the training features, and never
+        # again
+        self.assertEqual(
+            {1: n_training + n_examples, 2: n_training + n_examples,
+             3: n_training},
+            model.feature_map.calls)
+
+        # The scores are carried forward from the last update
+        for scores in fit_job_handler.scores.values():
+            self.assertEqual(6, len(scores))
+            self.assertEqual([scores[2]] * 3, scores[3:])
+            self.assertNotEqual(scores[1], scores[2])
@@ -0,0 +1,68 @@
+import json
+import subprocess
+import sys
+import unittest
+
+
+#: Modules that are expensive to import and must load on first use only
+HEAVY_MODULES = [
+    'h5py',
+    'joblib',
+    'lsml.core.fit_job_handler',
+    'scipy',
+    'skfmm',
+    'skimage',
+    'sklearn',
+]
+
+# Imports `statement` in a fresh interpreter and reports the heavy modules
+# that were loaded
+_SCRIPT = """
+import json, sys
+exec({statement!r})
+loaded = [name for name in {modules!r} if name in sys.modules]
+print(json.dumps(loaded))
+"""
+
+
+def run_import(statement):
+    script = _SCRIPT.format(statement=statement, modules=HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, '-c', script])
+    return json.loads(output.decode())
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_import_lsml(self):
+        loaded = run_import('import lsml')
+        self.assertEqual(loaded, [])
+
+    def test_import_model(self):
+        loaded = run_import('from lsml import LevelSetMachineLearning')
+        self.assertEqual(loaded, [])
+
+    def test_import_inference_model(self):
+        loaded = run_import('from lsml import InferenceModel')
+        self.assertEqual(loaded, [])
+
+    def test_import_features_and_initializers(self):
+        loaded = run_import(
+            'import lsml.feature, lsml.initializer; '
+            'lsml.feature.ImageSample; lsml.initializer.BallInitializer')
+        self.assertEqual(loaded, [])
+
+    def test_lazy_names(self):
+        import lsml
+        import lsml.feature
+        import lsml.initializer
+        from lsml.core.model import LevelSetMachineLearning
+
+        self.assertIs(lsml.LevelSetMachineLearning, LevelSetMachineLearning)
+        self.assertIn('LevelSetMachineLearning', dir(lsml))
+
+        for module in (lsml, lsml.feature, lsml.initializer):
+            for name in module.__all__:
+                self.assertTrue(hasattr(module, name))
+
+        with self.assertRaises(AttributeError):
+            lsml.NotAName
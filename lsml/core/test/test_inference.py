@@ -0,0 +1,292 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from lsml.core.inference import InferenceModel
+from lsml.core.model import LevelSetMachineLearning
+from lsml.feature.provided import image
+from lsml.initializer.provided.ball import BallInitializer
+from lsml.util.sparse_field import SparseFieldReinitializer
+
+
+class ConstantRegressor:
+    """ Predicts a constant velocity for all features
+    """
+    def __init__(self, velocity):
+        self.velocity = velocity
+
+    def predict(self, features):
+        return np.full(features.shape[0], self.velocity)
+
+
+def make_inference_model(n_iters=4, reinitializer=None, step=0.5,
+                         **kwargs):
+    model = LevelSetMachineLearning(
+        features=[image.ImageSample(sigma=0)],
+        initializer=BallInitializer(radius=4), band=3,
+        reinitializer=reinitializer)
+
+    return InferenceModel(
+        feature_map=model.feature_map,
+        initializer=model.initializer,
+        reinitializer=model.reinitializer,
+        scorer=model.scorer,
+        band=model.band,
+        normalize_imgs=model.normalize_imgs,
+        steps=[step] * n_iters,
+        regression_models=[ConstantRegressor(1.0)] * n_iters,
+        **kwargs)
+
+
+class TestInferenceModel(unittest.TestCase):
+
+    def setUp(self):
+        self.img = np.random.RandomState(1234).randn(32, 32)
+
+    def test_mismatched_lengths(self):
+        with self.assertRaises(ValueError):
+            InferenceModel(
+                feature_map=None, initializer=None, reinitializer=None,
+                scorer=None, band=3, normalize_imgs=True, steps=[1.0],
+                regression_models=[])
+
+    def test_segment_iterates(self):
+        inference_model = make_inference_model(n_iters=4)
+
+        us = inference_model.segment(self.img, verbose=False)
+
+        self.assertEqual(us.shape, (5,) + self.img.shape)
+
+        # A positive velocity grows the region
+        for i in range(4):
+            self.assertGreater((us[i+1] > 0).sum(), (us[i] > 0).sum())
+
+    def test_segment_batch_matches_segment(self):
+        inference_model = make_inference_model()
+
+        u = inference_model.segment(self.img, verbose=False, keep='final')
+        us = inference_model.segment_batch([self.img, self.img])
+
+        for u_batch in us:
+            np.testing.assert_array_equal(u_batch, u)
+
+    def test_save_load(self):
+        inference_model = make_inference_model()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'inference.pkl')
+            inference_model.save(filename)
+            loaded = InferenceModel.load(filename)
+
+        self.assertEqual(loaded.n_iters, inference_model.n_iters)
+        np.testing.assert_array_equal(
+            loaded.segment(self.img, verbose=False),
+            inference_model.segment(self.img, verbose=False))
+
+
+class TestInferenceSession(unittest.TestCase):
+
+    def setUp(self):
+        random_state = np.random.RandomState(1234)
+        self.imgs = [random_state.randn(32, 32) for _ in range(3)]
+
+    def test_matches_segment(self):
+        inference_model = make_inference_model()
+        session = inference_model.inference_session(shape=(32, 32))
+
+        out = np.empty((32, 32))
+
+        for img in self.imgs:
+            u = inference_model.segment(img, verbose=False, keep='final')
+            result = session.segment(img, out=out)
+
+            self.assertIs(result, out)
+            np.testing.assert_array_equal(out, u)
+
+    def test_stop_iteration(self):
+        inference_model = make_inference_model(n_iters=4)
+        session = inference_model.inference_session(
+            shape=(32, 32), convergence_tol=np.inf)
+
+        u, stop_iteration = session.segment(
+            self.imgs[0], return_stop_iteration=True)
+
+        _, expected = inference_model.segment(
+            self.imgs[0], verbose=False, keep='final', convergence_tol=np.inf,
+            return_stop_iteration=True)
+
+        self.assertEqual(stop_iteration, 1)
+        self.assertEqual(stop_iteration, expected)
+
+    def test_shape_mismatch(self):
+        session = make_inference_model().inference_session(shape=(32, 32))
+
+        with self.assertRaises(ValueError):
+            session.segment(np.zeros((16, 16)))
+
+
+class TestSubsteps(unittest.TestCase):
+
+    def setUp(self):
+        self.img = np.random.RandomState(1234).randn(32, 32)
+        self.inference_model = make_inference_model(n_iters=3)
+
+    def test_substeps_move_further(self):
+        u1 = self.inference_model.segment(
+            self.img, verbose=False, keep='final', substeps=1)
+        u2 = self.inference_model.segment(
+            self.img, verbose=False, keep='final', substeps=2)
+
+        self.assertGreater((u2 > 0).sum(), (u1 > 0).sum())
+
+    def test_model_substeps_default(self):
+        u = self.inference_model.segment(
+            self.img, verbose=False, keep='final', substeps=2)
+
+        self.inference_model.substeps = 2
+        np.testing.assert_array_equal(
+            self.inference_model.segment(
+                self.img, verbose=False, keep='final'), u)
+
+    def test_session_matches_segment(self):
+        session = self.inference_model.inference_session(
+            shape=self.img.shape, substeps=3)
+
+        np.testing.assert_array_equal(
+            session.segment(self.img),
+            self.inference_model.segment(
+                self.img, verbose=False, keep='final', substeps=3))
+
+    def test_substeps_limited_by_band(self):
+        velocity = np.ones(10)
+        dx = np.ones(2)
+
+        # Each update moves the front by half a cell, and the front must
+        # stay a cell inside the band of width 3
+        self.assertEqual(self.inference_model._n_substeps(
+            10, step=0.5, velocity=velocity, dx=dx), 4)
+        self.assertEqual(self.inference_model._n_substeps(
+            2, step=0.5, velocity=velocity, dx=dx), 2)
+        self.assertEqual(self.inference_model._n_substeps(
+            10, step=0.5, velocity=np.zeros(10), dx=dx), 1)
+
+    def test_invalid_substeps(self):
+        with self.assertRaises(ValueError):
+            self.inference_model.segment(self.img, substeps=0)
+
+
+class TestSparseFieldEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.img = np.random.RandomState(1234).randn(32, 32)
+        self.inference_model = make_inference_model(
+            n_iters=4, reinitializer=SparseFieldReinitializer())
+
+    def test_matches_distance_transform_engine(self):
+        u = self.inference_model.segment(
+            self.img, verbose=False, keep='final')
+        expected = make_inference_model(n_iters=4).segment(
+            self.img, verbose=False, keep='final')
+
+        # The regions agree up to the approximate outer layer distances
+        disagreement = ((u > 0) != (expected > 0)).sum()
+        self.assertLessEqual(disagreement, 0.02 * (expected > 0).sum())
+
+    def test_session_matches_segment(self):
+        session = self.inference_model.inference_session(
+            shape=self.img.shape)
+
+        np.testing.assert_array_equal(
+            session.segment(self.img),
+            self.inference_model.segment(
+                self.img, verbose=False, keep='final'))
+
+
+class TestSemiImplicitIntegrator(unittest.TestCase):
+
+    def setUp(self):
+        self.img = np.random.RandomState(1234).randn(32, 32)
+
+    def test_large_step(self):
+        def radii(us):
+            return np.sqrt((us > 0).sum(axis=(1, 2)) / np.pi)
+
+        explicit = make_inference_model(n_iters=3, step=0.5)
+        aos = make_inference_model(n_iters=3, step=2.0, integrator='aos')
+
+        explicit_us = explicit.segment(self.img, verbose=False)
+        aos_us = aos.segment(self.img, verbose=False)
+
+        self.assertTrue(np.isfinite(aos_us).all())
+
+        # The disk grows (strictly) with each iteration, and at least twice
+        # as fast as with the largest stable explicit step
+        explicit_radii, aos_radii = radii(explicit_us), radii(aos_us)
+        self.assertTrue((np.diff(aos_radii) > 0).all())
+        self.assertGreater(aos_radii[-1] - aos_radii[0],
+                           2 * (explicit_radii[-1] - explicit_radii[0]))
+
+    def test_session_matches_segment(self):
+        inference_model = make_inference_model(
+            n_iters=3, step=2.0, integrator='aos', curvature=0.5)
+        session = inference_model.inference_session(
+            shape=self.img.shape, substeps=2)
+
+        np.testing.assert_array_equal(
+            session.segment(self.img),
+            inference_model.segment(
+                self.img, verbose=False, keep='final', substeps=2))
+
+    def test_auto_step(self):
+        explicit = make_inference_model()
+        aos = make_inference_model(integrator='aos')
+        dx = np.ones(2)
+
+        self.assertEqual(explicit._auto_step(4.0, dx), 0.25)
+        # The front may move to a cell short of the band edge (band=3)
+        self.assertEqual(aos._auto_step(4.0, dx), 0.5)
+
+    def test_invalid_parameters(self):
+        kwargs = dict(features=[image.ImageSample(sigma=0)],
+                      initializer=BallInitializer(radius=4))
+
+        with self.assertRaises(ValueError):
+            LevelSetMachineLearning(integrator='implicit', **kwargs)
+        with self.assertRaises(ValueError):
+            LevelSetMachineLearning(curvature=1.0, **kwargs)
+        with self.assertRaises(ValueError):
+            LevelSetMachineLearning(integrator='aos', curvature=-1.0,
+                                    **kwargs)
+
+
+class TestCropMargin(unittest.TestCase):
+
+    def setUp(self):
+        self.img = np.random.RandomState(1234).randn(48, 48)
+
+    def test_matches_uncropped(self):
+        # The front moves by more than the margin, so the box grows
+        for kwargs in [{}, dict(integrator='aos', curvature=0.5)]:
+            full = make_inference_model(n_iters=6, step=0.8, **kwargs)
+            cropped = make_inference_model(n_iters=6, step=0.8,
+                                           crop_margin=1.0, **kwargs)
+
+            expected = full.segment(self.img, verbose=False, keep='final')
+            session = cropped.inference_session(shape=self.img.shape)
+
+            np.testing.assert_allclose(
+                cropped.segment(self.img, verbose=False, keep='final'),
+                expected)
+            np.testing.assert_allclose(session.segment(self.img), expected)
+
+    def test_invalid_parameters(self):
+        kwargs = dict(initializer=BallInitializer(radius=4))
+
+        with self.assertRaises(ValueError):
+            LevelSetMachineLearning(features=[image.ImageSample(sigma=0)],
+                                    crop_margin=-1.0, **kwargs)
+        with self.assertRaises(ValueError):
+            LevelSetMachineLearning(features=[image.COMRaySample(sigma=0)],
+                                    crop_margin=1.0, **kwargs)
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from lsml.core.model import LevelSetMachineLearning
+from lsml.core.parallel import (
+    load_model_archive, save_model_archive, segment_many)
+from lsml.core.test.test_fit_job_handler import fit_model
+from lsml.core.test.test_inference import make_inference_model
+
+
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+        random_state = np.random.RandomState(1234)
+        self.imgs = [random_state.randn(24, 24) for _ in range(6)]
+        self.model = make_inference_model()
+        self.expected = [
+            self.model.segment(img, verbose=False, keep='final')
+            for img in self.imgs
+        ]
+
+    def test_save_load_model_archive(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'model.joblib')
+            save_model_archive(self.model, filename)
+            model = load_model_archive(filename)
+
+            u = model.segment(self.imgs[0], verbose=False, keep='final')
+
+        np.testing.assert_array_equal(self.expected[0], u)
+
+    def test_save_saved_model_archive(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # The fit writes the model and its regression models to
+            # `tmp_dir`, which is not the working directory
+            model, imgs = fit_model(tmp_dir, n_examples=10, max_iters=2)
+            saved = LevelSetMachineLearning.load(
+                os.path.join(tmp_dir, 'LSML-model.pkl'))
+
+            filename = os.path.join(tmp_dir, 'model.joblib')
+            save_model_archive(saved, filename, dirname=tmp_dir)
+            archived = load_model_archive(filename)
+
+            u = archived.segment(imgs[0], verbose=False, keep='final')
+
+        # The saved model is unchanged
+        self.assertEqual([], saved.fit_job_handler.regression_models)
+        np.testing.assert_array_equal(
+            model.segment(imgs[0], verbose=False, keep='final'), u)
+
+    def test_ordered(self):
+
+        results = list(segment_many(self.model, self.imgs, n_workers=2))
+
+        self.assertEqual(list(range(len(self.imgs))),
+                         [index for index, _ in results])
+
+        for (_, u), expected in zip(results, self.expected):
+            np.testing.assert_array_equal(expected, u)
+
+    def test_unordered(self):
+
+        results = list(segment_many(self.model, self.imgs, n_workers=2,
+                                    max_in_flight=3, ordered=False))
+
+        indices = [index for index, _ in results]
+        self.assertEqual(list(range(len(self.imgs))), sorted(indices))
+
+        for index, u in results:
+            np.testing.assert_array_equal(self.expected[index], u)
+
+    def test_return_mask(self):
+
+        dx = [np.ones(2)] * len(self.imgs)
+        results = segment_many(self.model, self.imgs, dx=dx, n_workers=2,
+                               return_mask=True)
+
+        for index, mask in results:
+            self.assertEqual(np.bool_, mask.dtype)
+            np.testing.assert_array_equal(self.expected[index] > 0, mask)
+
+    def test_archive_filename(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'model.joblib')
+            save_model_archive(self.model, filename)
+
+            results = list(segment_many(filename, self.imgs, n_workers=2))
+
+            # The given archive is not removed
+            self.assertTrue(os.path.exists(filename))
+
+        for index, u in results:
+            np.testing.assert_array_equal(self.expected[index], u)
+
+    def test_close(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_dir = os.path.join(tmp_dir, 'archive')
+            os.mkdir(archive_dir)
+
+            with mock.patch('lsml.core.parallel.tempfile.mkdtemp',
+                            return_value=archive_dir):
+                results = segment_many(self.model, iter(self.imgs),
+                                       n_workers=2, max_in_flight=2)
+
+                index, u = next(results)
+                results.close()
+
+            # The temporary archive is removed when the generator closes
+            self.assertFalse(os.path.exists(archive_dir))
+
+        self.assertEqual(0, index)
+        np.testing.assert_array_equal(self.expected[0], u)
+
+        with self.assertRaises(StopIteration):
+            next(results)
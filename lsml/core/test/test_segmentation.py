@@ -0,0 +1,97 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from lsml.core.test.test_fit_job_handler import fit_model
+from lsml.core.test.test_inference import make_inference_model
+from lsml.util.distance_transform import Reinitializer
+
+
+class TestEarlyStopping(unittest.TestCase):
+
+    def setUp(self):
+        self.img = np.random.RandomState(1234).randn(32, 32)
+        self.inference_model = make_inference_model(n_iters=6)
+
+    def test_convergence_tol(self):
+        # Every update is below the tolerance, so iteration stops after
+        # the first update
+        us, stop_iteration = self.inference_model.segment(
+            self.img, verbose=False, convergence_tol=np.inf,
+            return_stop_iteration=True)
+
+        self.assertEqual(1, stop_iteration)
+        self.assertEqual((7,) + self.img.shape, us.shape)
+
+        # The remaining iterates are filled with the last computed one
+        expected = self.inference_model.segment(self.img, verbose=False)
+        np.testing.assert_array_equal(expected[:2], us[:2])
+        for u in us[2:]:
+            np.testing.assert_array_equal(us[1], u)
+
+    def test_velocity_tol(self):
+        # The constant unit velocity is below the tolerance
+        _, stop_iteration = self.inference_model.segment(
+            self.img, verbose=False, velocity_tol=2.0, keep='final',
+            return_stop_iteration=True)
+        self.assertEqual(1, stop_iteration)
+
+        _, stop_iteration = self.inference_model.segment(
+            self.img, verbose=False, velocity_tol=0.5, keep='final',
+            return_stop_iteration=True)
+        self.assertEqual(6, stop_iteration)
+
+    def test_scores_and_keep(self):
+        seg = self.img > 0
+
+        us, scores = self.inference_model.segment(
+            self.img, verbose=False, convergence_tol=np.inf, keep=4,
+            return_scores=True, seg=seg)
+
+        # Iterates 0, 4 and 6 are kept, the latter two after the stop
+        self.assertEqual((3,) + self.img.shape, us.shape)
+        np.testing.assert_array_equal(us[1], us[2])
+        self.assertFalse(np.array_equal(us[0], us[1]))
+
+        self.assertEqual(7, len(scores))
+        np.testing.assert_array_equal(scores[1], scores[2:])
+
+    def test_batch_matches_segment(self):
+        expected = self.inference_model.segment(
+            self.img, verbose=False, convergence_tol=np.inf, keep=4)
+
+        us, = self.inference_model.segment_batch(
+            [self.img], verbose=False, convergence_tol=np.inf, keep=4)
+
+        np.testing.assert_array_equal(expected, us)
+
+    def test_no_stop(self):
+        _, stop_iteration = self.inference_model.segment(
+            self.img, verbose=False, keep='final',
+            return_stop_iteration=True)
+        self.assertEqual(6, stop_iteration)
+
+
+class TestOlderModels(unittest.TestCase):
+
+    def test_segment_without_new_attributes(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model, imgs = fit_model(tmp_dir, n_examples=10, max_iters=2)
+
+        # Models pickled before these options were added have none of them,
+        # and reinitialized with the full distance transform
+        model.reinitializer = Reinitializer(incremental=False)
+        expected = model.segment(imgs[0], verbose=False, keep='final')
+
+        for name in ('reinitializer', 'velocity_shell', 'integrator',
+                     'curvature', 'crop_margin'):
+            delattr(model, name)
+        del model.fit_job_handler.steps
+        del model.fit_job_handler.substeps
+
+        u = model.segment(imgs[0], verbose=False, keep='final')
+
+        np.testing.assert_array_equal(expected, u)
+        self.assertEqual([model.step] * 2, model.steps)
@@ -0,0 +1,170 @@
+import concurrent.futures
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from lsml.core.server import InferenceClient, InferenceServer, ModelWorker
+from lsml.core.test.test_fit_job_handler import fit_model
+
+
+class ThresholdModel:
+    """ Stands in for a fitted model; "segments" by thresholding at zero
+    """
+    def __init__(self, delay=None):
+        self.batch_sizes = []
+        self.delay = delay
+
+    def segment_batch(self, imgs, dx=None, verbose=True, keep='final'):
+        if self.delay is not None:
+            self.delay.wait()
+        self.batch_sizes.append(len(imgs))
+        if any(np.isnan(img).any() for img in imgs):
+            raise ValueError("The image contains NaN values")
+        return [img.copy() for img in imgs]
+
+
+class TestInferenceServer(unittest.TestCase):
+
+    def setUp(self):
+        self.random_state = np.random.RandomState(1234)
+
+    def test_segment(self):
+
+        img = self.random_state.randn(17, 23)
+
+        with InferenceServer({'threshold': ThresholdModel()}) as server:
+            client = InferenceClient(port=server.port)
+
+            self.assertEqual(['threshold'], client.models())
+
+            mask = client.segment(img, dx=[1.0, 2.0])
+            self.assertEqual(np.bool_, mask.dtype)
+            np.testing.assert_array_equal(img > 0, mask)
+
+            # The model name may be given explicitly
+            mask = client.segment(img, model='threshold')
+            np.testing.assert_array_equal(img > 0, mask)
+
+            with self.assertRaises(RuntimeError):
+                client.segment(img, model='unknown')
+
+            with self.assertRaises(RuntimeError):
+                client.segment(img, dx=[1.0])
+
+            stats = client.stats()['threshold']
+            self.assertEqual(2, stats['images'])
+
+    def test_dynamic_batching(self):
+
+        model = ThresholdModel()
+        imgs = [self.random_state.randn(8, 8) for _ in range(8)]
+
+        server = InferenceServer({'threshold': model}, max_batch_size=4,
+                                 max_batch_delay=0.5)
+
+        with server:
+            client = InferenceClient(port=server.port)
+            with concurrent.futures.ThreadPoolExecutor(8) as executor:
+                masks = list(executor.map(client.segment, imgs))
+
+        for img, mask in zip(imgs, masks):
+            np.testing.assert_array_equal(img > 0, mask)
+
+        # Concurrent requests are segmented together
+        self.assertEqual(8, sum(model.batch_sizes))
+        self.assertLess(len(model.batch_sizes), 8)
+        self.assertLessEqual(max(model.batch_sizes), 4)
+
+    def test_batch_failure(self):
+
+        model = ThresholdModel()
+        good_imgs = [self.random_state.randn(8, 8) for _ in range(2)]
+        bad_img = np.full((8, 8), np.nan)
+
+        worker = ModelWorker(model, max_batch_size=3, max_batch_delay=0.5)
+        try:
+            good_futures = [worker.submit(img) for img in good_imgs]
+            bad_future = worker.submit(bad_img)
+
+            # Only the bad request fails; the others are retried alone
+            for img, future in zip(good_imgs, good_futures):
+                np.testing.assert_array_equal(
+                    img > 0, future.result(timeout=10))
+
+            with self.assertRaises(ValueError):
+                bad_future.result(timeout=10)
+        finally:
+            worker.stop()
+
+        self.assertEqual([3, 1, 1, 1], model.batch_sizes)
+        self.assertEqual(1, worker.stats()['errors'])
+        self.assertEqual(2, worker.stats()['images'])
+
+    def test_queue_full(self):
+
+        delay = threading.Event()
+        model = ThresholdModel(delay=delay)
+        img = self.random_state.randn(8, 8)
+
+        server = InferenceServer({'threshold': model}, max_batch_size=1,
+                                 max_queue=1)
+
+        with server:
+            client = InferenceClient(port=server.port)
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                futures = [executor.submit(client.segment, img)
+                           for _ in range(4)]
+
+                # At most one request is segmenting and one is queued, so
+                # the others are rejected
+                rejected = 0
+                for future in concurrent.futures.as_completed(
+                        futures, timeout=10):
+                    if future.exception() is not None:
+                        rejected += 1
+                    if rejected == 2:
+                        break
+                delay.set()
+
+            rejected = sum(future.exception() is not None
+                           for future in futures)
+
+            self.assertGreaterEqual(rejected, 2)
+            self.assertEqual(rejected,
+                             client.stats()['threshold']['rejected'])
+
+    def test_unix_socket(self):
+
+        img = self.random_state.randn(5, 6, 7)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'lsml.sock')
+
+            with InferenceServer({'threshold': ThresholdModel()},
+                                 unix_socket=path):
+                client = InferenceClient(unix_socket=path)
+                mask = client.segment(img)
+
+            self.assertFalse(os.path.exists(path))
+
+        np.testing.assert_array_equal(img > 0, mask)
+
+
+class TestSavedModel(unittest.TestCase):
+
+    def test_load_from_other_directory(self):
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # The fit writes the model and its regression models to
+            # `tmp_dir`, which is not the working directory of the server
+            model, imgs = fit_model(tmp_dir, n_examples=10, max_iters=2)
+            filename = os.path.join(tmp_dir, 'LSML-model.pkl')
+
+            with InferenceServer({'lsml': filename}) as server:
+                mask = InferenceClient(port=server.port).segment(imgs[0])
+
+        np.testing.assert_array_equal(
+            model.segment(imgs[0], verbose=False, keep='final') > 0, mask)
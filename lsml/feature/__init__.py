@@ -1,18 +1,26 @@
-# flake8: noqa
+""" Features of the level set and image. The provided features are imported
+on first access; see :mod:`lsml` for the rationale.
+"""
+from lsml.util.lazy import lazy_names
 
-from .provided.image import (
-    get_basic_image_features,
-    ImageEdgeSample,
-    ImageSample,
-    InteriorImageAverage,
-    InteriorImageVariation,
-)
 
-from .provided.shape import (
-    BoundarySize,
-    DistanceToCenterOfMass,
-    get_basic_shape_features,
-    IsoperimetricRatio,
-    Moments,
-    Size,
-)
+# Maps the public names to the modules defining them
+_lazy_names = {
+    'get_basic_image_features': 'lsml.feature.provided.image',
+    'ImageEdgeSample': 'lsml.feature.provided.image',
+    'ImageSample': 'lsml.feature.provided.image',
+    'InteriorImageAverage': 'lsml.feature.provided.image',
+    'InteriorImageVariation': 'lsml.feature.provided.image',
+
+    'BoundarySize': 'lsml.feature.provided.shape',
+    'Curvature': 'lsml.feature.provided.shape',
+    'DistanceToCenterOfMass': 'lsml.feature.provided.shape',
+    'get_basic_shape_features': 'lsml.feature.provided.shape',
+    'IsoperimetricRatio': 'lsml.feature.provided.shape',
+    'Moments': 'lsml.feature.provided.shape',
+    'Size': 'lsml.feature.provided.shape',
+}
+
+__all__ = list(_lazy_names)
+
+__getattr__, __dir__ = lazy_names(__name__, _lazy_names)
@@ -138,6 +138,30 @@ class BaseFeature(abc.ABC):
             return self.compute_feature(
                 u=u, dist=dist, mask=mask, dx=dx)
 
+    def crop_padding(self, dx):
+        """ Returns the number of points (a scalar or one value per axis)
+        by which a sub-array of the arrays must extend beyond the narrow
+        band for the feature values at the band points computed over the
+        sub-array (see :meth:`translate`) to equal those computed over the
+        full arrays, given that the sub-array also holds every point where
+        `u` is positive. The default (None) indicates that the feature
+        must be computed over the full arrays.
+
+        Parameters
+        ----------
+        dx: numpy.array, shape=ndim
+            The delta terms
+        """
+        return None
+
+    def translate(self, values, origin):
+        """ Returns the feature `values` computed over a sub-array whose
+        first point lies at position `origin` (in the units of `dx`) as
+        computed over the full arrays. The default returns `values`
+        unchanged, i.e., for features that do not depend on position.
+        """
+        return values
+
     @abc.abstractmethod
     def compute_feature(self, u, img, dist, mask, dx):
         """ Compute the feature
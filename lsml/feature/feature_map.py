@@ -50,17 +50,67 @@ class FeatureMap(object):
             j += feature.size
         return indices
 
-    def __call__(self, u, img, dist, mask, dx=None):
+    def crop_padding(self, dx):
+        """ The number of points along each axis by which a sub-array of the
+        arrays must extend beyond the narrow band for the features to be
+        computed over it (see :meth:`BaseFeature.crop_padding`), or None
+        if a feature must be computed over the full arrays
+        """
+        padding = np.zeros(len(dx), dtype=int)
+
+        for feature in self.features:
+            feature_padding = feature.crop_padding(dx)
+            if feature_padding is None:
+                return None
+            padding = np.maximum(padding, feature_padding)
+
+        return padding
+
+    def __call__(self, u, img, dist, mask, dx=None, band=None, out=None,
+                 origin=None):
         """ Compute the features from the feature list.
 
+        Parameters
+        ----------
+        band: NarrowBand, default=None
+            If provided (see :class:`lsml.util.narrow_band.NarrowBand`),
+            the features are only returned at the band points, in the
+            order of the band points.
+
+        out: numpy.array, default=None
+            If provided, the features are written into this array (of the
+            shape described below) and it is returned, rather than
+            allocating a new array
+
+        origin: numpy.array, default=None
+            If provided, the arrays are a sub-array (see
+            :meth:`crop_padding`) of the full arrays whose first point lies
+            at this position (in the units of `dx`), and the features are
+            translated to the full arrays (see
+            :meth:`BaseFeature.translate`)
+
         Returns
         -------
         features: numpy.array, shape = img.shape + (n_features,)
-            The resulting feature array
+            The resulting feature array, or of shape
+            `(band.size, n_features)` if `band` is provided
 
         """
-        features_shape = u.shape + (self.n_features,)
-        features_array = np.zeros(features_shape)
+        if band is None:
+            shape = u.shape + (self.n_features,)
+        else:
+            shape = (band.size, self.n_features)
+
+        if out is None:
+            features_array = np.zeros(shape)
+        elif out.shape != shape:
+            msg = "`out` has shape {}, but must be shape {}"
+            raise ValueError(msg.format(out.shape, shape))
+        else:
+            features_array = out
+            if band is None:
+                # Only the values in `mask` are written below
+                features_array.fill(0)
 
         # Loop through the feature list and stack the results into an array
         for ifeature, feature in enumerate(self.features):
@@ -68,13 +118,20 @@ class FeatureMap(object):
             feature_slice = self.feature_slices[ifeature]
 
             if isinstance(feature, BaseImageFeature):
-                features_array[mask, feature_slice] = feature(
-                    u=u, img=img, dist=dist, mask=mask, dx=dx)[mask].squeeze()
+                values = feature(u=u, img=img, dist=dist, mask=mask, dx=dx)
             elif isinstance(feature, BaseShapeFeature):
-                features_array[mask, feature_slice] = feature(
-                    u=u, dist=dist, mask=mask, dx=dx)[mask].squeeze()
+                values = feature(u=u, dist=dist, mask=mask, dx=dx)
             else:
                 msg = "Unknown feature type ({})"
                 raise ValueError(msg.format(feature.__class__.__name__))
 
+            if origin is not None:
+                values = feature.translate(values, origin)
+
+            if band is None:
+                features_array[mask, feature_slice] = values[mask].squeeze()
+            else:
+                features_array[:, feature_slice] = band.gather(
+                    values).squeeze()
+
         return features_array
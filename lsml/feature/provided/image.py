@@ -1,12 +1,19 @@
 from functools import reduce
 
 import numpy
-from scipy.ndimage.filters import gaussian_filter1d
 
 from lsml.feature.base_feature import (
     BaseImageFeature, LOCAL_FEATURE_TYPE, GLOBAL_FEATURE_TYPE)
 
 
+def _smoothing_padding(sigma, dx):
+    """ The radius (in points along each axis) of the gaussian smoothing
+    kernels of `gaussian_filter1d` (truncated at 4 standard deviations),
+    i.e., the padding beyond a point needed to smooth the image there
+    """
+    return [int(4.0 * sigma / delta + 0.5) for delta in dx]
+
+
 class ImageSample(BaseImageFeature):
     """ The gaussian-smoothed image sampled locally
     """
@@ -16,7 +23,12 @@ class ImageSample(BaseImageFeature):
     def name(self):
         return "Image sample (\u03c3 = {:.3f})".format(self.sigma)
 
+    def crop_padding(self, dx):
+        return _smoothing_padding(self.sigma, dx)
+
     def compute_feature(self, u, img, dist, mask, dx):
+        from scipy.ndimage import gaussian_filter1d
+
         feature = numpy.empty_like(u)
 
         if self.sigma == 0:
@@ -42,7 +54,15 @@ class ImageEdgeSample(BaseImageFeature):
     def name(self):
         return "Image edge sample (\u03c3 = {:.3f})".format(self.sigma)
 
+    def crop_padding(self, dx):
+        if self.sigma == 0:
+            # The centered differences of `numpy.gradient`
+            return 1
+        return _smoothing_padding(self.sigma, dx)
+
     def compute_feature(self, u, img, dist, mask, dx):
+        from scipy.ndimage import gaussian_filter1d
+
         feature = numpy.empty_like(u)
 
         if self.sigma == 0:
@@ -75,7 +95,11 @@ class InteriorImageAverage(BaseImageFeature):
     def name(self):
         return "Interior image average (\u03c3 = {:.3f})".format(self.sigma)
 
+    def crop_padding(self, dx):
+        return _smoothing_padding(self.sigma, dx)
+
     def compute_feature(self, u, img, dist, mask, dx):
+        from scipy.ndimage import gaussian_filter1d
 
         feature = numpy.empty_like(u)
 
@@ -103,7 +127,11 @@ class InteriorImageVariation(BaseImageFeature):
     def name(self):
         return "Interior image variation (\u03c3 = {:.3f})".format(self.sigma)
 
+    def crop_padding(self, dx):
+        return _smoothing_padding(self.sigma, dx)
+
     def compute_feature(self, u, img, dist, mask, dx):
+        from scipy.ndimage import gaussian_filter1d
 
         feature = numpy.empty_like(u)
 
@@ -1,9 +1,8 @@
 import numpy
-from skimage.measure import marching_cubes_lewiner as marching_cubes
-from skimage.measure import find_contours, mesh_surface_area
 
 from lsml.feature.base_feature import (
     BaseShapeFeature, GLOBAL_FEATURE_TYPE, LOCAL_FEATURE_TYPE)
+from lsml.gradient import masked_gradient
 
 
 class Size(BaseShapeFeature):
@@ -23,6 +22,9 @@ class Size(BaseShapeFeature):
         else:
             return 'Hyper-volume'
 
+    def crop_padding(self, dx):
+        return 1
+
     def compute_feature(self, u, dist, mask, dx):
 
         size = (u > 0).sum() * numpy.prod(dx)
@@ -53,6 +55,9 @@ class BoundarySize(BaseShapeFeature):
         elif self.ndim == 3:
             return 'Surface area'
 
+    def crop_padding(self, dx):
+        return 1
+
     def compute_feature(self, u, dist, mask, dx):
 
         feature = numpy.empty_like(u)
@@ -70,6 +75,7 @@ class BoundarySize(BaseShapeFeature):
         return feature
 
     def _compute_arc_length(self, u, dx):
+        from skimage.measure import find_contours
 
         contours = find_contours(u, 0)
 
@@ -85,6 +91,9 @@ class BoundarySize(BaseShapeFeature):
         return total_arc_length
 
     def _compute_surface_area(self, u, dx):
+        from skimage.measure import marching_cubes_lewiner as marching_cubes
+        from skimage.measure import mesh_surface_area
+
         verts, faces, _, _ = marching_cubes(u, 0., spacing=dx)
         return mesh_surface_area(verts, faces)
 
@@ -112,6 +121,9 @@ class IsoperimetricRatio(BaseShapeFeature):
 
         super(IsoperimetricRatio, self).__init__(ndim)
 
+    def crop_padding(self, dx):
+        return 1
+
     def compute_feature(self, u, dist, mask, dx):
 
         if self.ndim == 2:
@@ -229,6 +241,20 @@ class Moments(BaseShapeFeature):
 
         return moment
 
+    def crop_padding(self, dx):
+        return 1
+
+    def translate(self, values, origin):
+        from itertools import product
+
+        # The first moments are positions (of the center of mass), whereas
+        # the higher moments are centered
+        for i, (axis, order) in enumerate(product(self.axes, self.orders)):
+            if order == 1:
+                values[..., i] += origin[axis]
+
+        return values
+
     def compute_feature(self, u, dist, mask, dx):
         from itertools import product
         features = numpy.empty(u.shape + (self.size,))
@@ -247,6 +273,9 @@ class DistanceToCenterOfMass(BaseShapeFeature):
     def name(self):
         return "Distance to center of mass"
 
+    def crop_padding(self, dx):
+        return 1
+
     def compute_feature(self, u, dist, mask, dx):
 
         # Sneakily use the center of mass utility buried in the
@@ -267,6 +296,47 @@ class DistanceToCenterOfMass(BaseShapeFeature):
         return feature
 
 
+class Curvature(BaseShapeFeature):
+    """ Computes the curvature of the level sets of the signed distance
+    transform at each point in the narrow band. In 2D, this is the curvature
+    of the level curves; in 3D, it is the mean curvature (the sum of the
+    principal curvatures) of the level surfaces. Positive values indicate
+    locally convex regions of the segmentation.
+    """
+    locality = LOCAL_FEATURE_TYPE
+
+    def __init__(self, ndim=2):
+        if ndim < 2 or ndim > 3:
+            msg = ("Curvature is only defined for dimensions 2 and 3; "
+                   "ndim provided = {}")
+            raise ValueError(msg.format(ndim))
+
+        super(Curvature, self).__init__(ndim)
+
+    @property
+    def name(self):
+        if self.ndim == 2:
+            return 'Curvature'
+        else:
+            return 'Mean curvature'
+
+    def crop_padding(self, dx):
+        return 1
+
+    def compute_feature(self, u, dist, mask, dx):
+
+        # The distance transform is only valid in the narrow band, which
+        # the curvature routine respects; without it, fall back to `u`
+        arr = u if dist is None else dist
+
+        feature = numpy.empty_like(u)
+        masked_gradient.curvature(
+            arr=numpy.asarray(arr, dtype=numpy.float),
+            mask=mask, dx=dx, out=feature)
+
+        return feature
+
+
 def get_basic_shape_features(ndim=2, moment_orders=[1, 2]):
     """ Generate a list of basic shape features at multiple sigma values
 
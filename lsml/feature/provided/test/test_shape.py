@@ -225,3 +225,43 @@ class TestShapeFeatures(unittest.TestCase):
         self.assertAlmostEqual(0.2, spread[0], places=2)
         self.assertAlmostEqual(0.2, spread[1], places=2)
         self.assertAlmostEqual(0.2, spread[2], places=2)
+
+    def test_curvature_2d(self):
+
+        x, dx = np.linspace(-2, 2, 401, retstep=True)
+        y, dy = np.linspace(-2, 2, 301, retstep=True)
+
+        xx, yy = np.meshgrid(x, y, indexing='ij')
+        rr = np.sqrt(xx**2 + yy**2)
+
+        z = 1 - rr
+        mask = np.abs(z) < 0.1
+
+        curvature = shape.Curvature(ndim=2)
+        kappa = curvature(u=z, dist=z, mask=mask, dx=[dx, dy])
+
+        near = np.abs(z) < 0.05
+        self.assertLessEqual(np.abs(kappa - 1 / rr)[near].max(), 1e-3)
+
+    def test_curvature_3d(self):
+
+        x, dx = np.linspace(-2, 2, 101, retstep=True)
+        y, dy = np.linspace(-2, 2, 81, retstep=True)
+        z, dz = np.linspace(-2, 2, 121, retstep=True)
+
+        xx, yy, zz = np.meshgrid(x, y, z, indexing='ij')
+        rr = np.sqrt(xx**2 + yy**2 + zz**2)
+
+        w = 1 - rr
+        mask = np.abs(w) < 0.25
+
+        curvature = shape.Curvature(ndim=3)
+        kappa = curvature(u=w, dist=w, mask=mask, dx=[dx, dy, dz])
+
+        near = np.abs(w) < 0.1
+        self.assertLessEqual(np.abs(kappa - 2 / rr)[near].max(), 1e-2)
+
+    def test_curvature_bad_ndim(self):
+
+        with self.assertRaises(ValueError):
+            shape.Curvature(ndim=1)
@@ -29,3 +29,77 @@ class TestFeatureMap(unittest.TestCase):
 
         # Smoke test
         feature_map(u=u, img=img, dist=u, mask=mask)
+
+    def test_narrow_band_features(self):
+
+        from lsml.feature.provided import image
+        from lsml.feature.provided import shape
+        from lsml.util.narrow_band import NarrowBand
+
+        features = [
+            image.ImageSample(sigma=0),
+            shape.Moments(),
+        ]
+
+        feature_map = FeatureMap(features=features)
+
+        random_state = np.random.RandomState(1234)
+        img = random_state.randn(34, 67)
+        u = random_state.randn(34, 67)
+        mask = random_state.randn(34, 67) > 0
+        band = NarrowBand.from_dense(u, mask)
+
+        dense = feature_map(u=u, img=img, dist=u, mask=mask)
+        sparse = feature_map(u=u, img=img, dist=u, mask=mask, band=band)
+
+        self.assertEqual((mask.sum(), feature_map.n_features), sparse.shape)
+        np.testing.assert_allclose(dense[mask], sparse)
+
+    def test_cropped_features(self):
+
+        from lsml.feature.provided import image
+        from lsml.feature.provided import shape
+        from lsml.util.crop import grow_crop_box, origin
+        from lsml.util.distance_transform import distance_transform
+
+        features = [
+            image.ImageSample(sigma=2),
+            image.ImageEdgeSample(sigma=0),
+            image.InteriorImageAverage(sigma=1),
+            shape.Size(),
+            shape.BoundarySize(),
+            shape.Moments(),
+            shape.DistanceToCenterOfMass(),
+            shape.Curvature(),
+        ]
+
+        feature_map = FeatureMap(features=features)
+
+        ii, jj = np.indices((64, 72), dtype=np.float)
+        u = 7 - np.sqrt((ii - 40.2)**2 + (jj - 25.7)**2)
+        img = np.random.RandomState(1234).randn(64, 72)
+        dx = np.array([1.0, 1.5])
+
+        band = distance_transform(u, band=3, dx=dx, return_band=True)
+        padding = feature_map.crop_padding(dx)
+        box = grow_crop_box(None, band, padding, margins=0, arr=u)
+        cropped_band = band.crop(box)
+
+        expected = feature_map(u=u, img=img, dist=band.dist, mask=band.mask,
+                               dx=dx, band=band)
+        cropped = feature_map(
+            u=u[box], img=img[box], dist=cropped_band.dist,
+            mask=cropped_band.mask, dx=dx, band=cropped_band,
+            origin=origin(box, dx))
+
+        np.testing.assert_array_equal(padding, [8, 5])
+        np.testing.assert_allclose(cropped, expected)
+
+    def test_crop_padding_unsupported(self):
+
+        from lsml.feature.provided import image
+
+        feature_map = FeatureMap(features=[
+            image.ImageSample(sigma=0), image.COMRaySample(sigma=0)])
+
+        self.assertIsNone(feature_map.crop_padding(np.ones(2)))
@@ -0,0 +1,224 @@
+""" Registry and selection of the numerical backends that implement the
+routines in :mod:`lsml.gradient.masked_gradient`.
+
+The following backends are provided:
+
+* `'c'`: the compiled C kernels (requires the shared library built at
+  install time)
+* `'numba'`: JIT-compiled kernels (requires numba)
+* `'numpy'`: vectorized pure NumPy (always available)
+
+By default (`'auto'`), the fastest available backend is chosen by a short
+calibration the first time arrays of a given dimension and size class are
+encountered. The choice can be overridden with :func:`set_backend` or by
+setting the environment variable `LSML_GRADIENT_BACKEND` to a backend name.
+"""
+from collections import OrderedDict
+import importlib
+import logging
+import os
+import time
+
+import numpy as np
+
+
+_logger_name = __name__.rsplit('.', 1)[-1]
+logger = logging.getLogger(_logger_name)
+
+#: The environment variable that overrides the automatic backend selection
+BACKEND_ENV_VAR = 'LSML_GRADIENT_BACKEND'
+
+#: The backend name indicating automatic selection by calibration
+AUTO_BACKEND = 'auto'
+
+#: Calibration is performed on arrays with at most this many elements
+MAX_CALIBRATION_SIZE = 2**21
+
+# Maps backend names to the modules implementing them, in order of
+# preference when calibration is not possible
+_backend_modules = OrderedDict([
+    ('c', 'lsml.gradient.c_backend'),
+    ('numba', 'lsml.gradient.numba_backend'),
+    ('numpy', 'lsml.gradient.numpy_backend'),
+])
+
+# Backend name (or None) set explicitly via `set_backend`
+_forced_backend = None
+
+# Caches for loaded modules, import errors, and calibration results
+_loaded_backends = {}
+_import_errors = {}
+_calibrated_backends = {}
+
+
+def register_backend(name, module_name):
+    """ Register a module implementing the backend functions under `name`.
+    The module must define `gradient_centered`,
+    `gradient_magnitude_osher_sethian`, and `curvature` with the signatures
+    used in :mod:`lsml.gradient.numpy_backend`, and may optionally define
+    the `*_batch` variants. Importing the module should raise ImportError
+    if the backend is unavailable.
+    """
+    _backend_modules[name] = module_name
+    _loaded_backends.pop(name, None)
+    _import_errors.pop(name, None)
+    _calibrated_backends.clear()
+
+
+def get_backend(name):
+    """ Get the module implementing the backend `name`
+
+    Raises
+    ------
+    ValueError
+        If `name` is not a registered backend
+
+    ImportError
+        If the backend is registered but not available (e.g., missing
+        compiled library or missing optional dependency)
+    """
+    if name not in _backend_modules:
+        msg = "Unknown backend `{}`; should be one of {}"
+        raise ValueError(msg.format(name, list(_backend_modules)))
+
+    if name in _loaded_backends:
+        return _loaded_backends[name]
+
+    if name in _import_errors:
+        raise _import_errors[name]
+
+    try:
+        module = importlib.import_module(_backend_modules[name])
+    except ImportError as e:
+        msg = "Backend `{}` is not available: {}".format(name, e)
+        _import_errors[name] = ImportError(msg)
+        raise _import_errors[name]
+
+    _loaded_backends[name] = module
+
+    return module
+
+
+def available_backends():
+    """ Returns the list of names of backends that can be loaded
+    """
+    available = []
+
+    for name in _backend_modules:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        available.append(name)
+
+    return available
+
+
+def set_backend(name):
+    """ Set the backend used by the masked gradient routines. `name` is
+    a registered backend name or `'auto'`. None restores the default
+    behavior (the environment variable, if set, and otherwise `'auto'`).
+    """
+    global _forced_backend
+
+    if name is not None and name != AUTO_BACKEND:
+        get_backend(name)  # Raises if unknown or unavailable
+
+    _forced_backend = name
+
+
+def get_backend_name():
+    """ Returns the backend name currently in effect, possibly `'auto'`
+    """
+    if _forced_backend is not None:
+        return _forced_backend
+
+    return os.environ.get(BACKEND_ENV_VAR) or AUTO_BACKEND
+
+
+def _size_class(shape):
+    """ Arrays whose sizes are within a factor of four share a size class
+    """
+    return len(shape), int(np.log2(max(np.prod(shape), 1))) // 2
+
+
+def _calibration_inputs(shape):
+    """ Synthetic inputs for calibration: the signed distance to a ball in
+    the center of an array of (at most `MAX_CALIBRATION_SIZE` elements
+    with the proportions of) `shape`, masked to a narrow band
+    """
+    shape = np.array(shape, dtype=np.float64)
+    scale = min(1.0, (MAX_CALIBRATION_SIZE / shape.prod())**(1./len(shape)))
+    shape = tuple(np.maximum(3, (shape * scale).astype(int)))
+
+    indices = np.indices(shape, dtype=np.float64)
+    center = (np.array(shape, dtype=np.float64) - 1) / 2
+    slices = (slice(None),) + (None,) * len(shape)
+    radius = np.sqrt(((indices - center[slices])**2).sum(axis=0))
+
+    arr = min(shape) / 3. - radius
+    mask = np.abs(arr) <= 3
+    nu = np.cos(radius)
+    dx = np.ones(len(shape))
+
+    return arr, nu, mask, dx
+
+
+def calibrate(shape, backends=None, repeats=3):
+    """ Time the upwind gradient magnitude routine of each of the
+    `backends` (default: all available) on synthetic inputs resembling
+    arrays of `shape`, and return the name of the fastest. The result is
+    cached for the dimension and size class of `shape`.
+    """
+    if backends is None:
+        backends = available_backends()
+
+    if not backends:
+        raise RuntimeError("No masked gradient backends are available")
+
+    arr, nu, mask, dx = _calibration_inputs(shape)
+    out = np.zeros_like(arr)
+
+    timings = OrderedDict()
+
+    for name in backends:
+        func = get_backend(name).gradient_magnitude_osher_sethian
+
+        # Warm-up call (e.g., triggers JIT compilation)
+        func(arr, nu, mask, dx, out)
+
+        best = np.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func(arr, nu, mask, dx, out)
+            best = min(best, time.perf_counter() - start)
+
+        timings[name] = best
+
+    fastest = min(timings, key=timings.get)
+
+    msg = "Calibrated backends for shape {}: {} (selected `{}`)"
+    logger.info(msg.format(
+        arr.shape,
+        ", ".join("{}={:.2e}s".format(k, v) for k, v in timings.items()),
+        fastest))
+
+    _calibrated_backends[_size_class(shape)] = fastest
+
+    return fastest
+
+
+def select_backend(shape):
+    """ Returns the backend module to be used for arrays of `shape`
+    """
+    name = get_backend_name()
+
+    if name != AUTO_BACKEND:
+        return get_backend(name)
+
+    size_class = _size_class(shape)
+
+    if size_class not in _calibrated_backends:
+        calibrate(shape)
+
+    return get_backend(_calibrated_backends[size_class])
@@ -0,0 +1,259 @@
+""" The C backend for the masked gradient routines, which wraps the shared
+library compiled from `lsml/util/_cutil/masked_gradient.c` via ctypes.
+Importing this module raises ImportError if the library can't be found.
+"""
+import ctypes
+import pathlib
+
+import numpy as np
+from numpy.ctypeslib import ndpointer
+
+
+try:
+    import lsml
+    util = pathlib.Path(lsml.__file__).parent / 'util'
+    name = list(util.glob('masked_gradient*'))[0]
+    _masked_gradient = ctypes.cdll.LoadLibrary(str(name))
+except Exception:
+    raise ImportError('Could not find shared library for masked_gradient')
+
+# The element strides argument that follows each array argument
+_strides_arg = ndpointer(np.intp, ndim=1, flags='C_CONTIGUOUS')
+
+
+def _get_gradient_centered_func(ndim, batch=False):
+    """ Gets the function from the c module and sets up the respective
+    argument and return types. If `batch` is True, then the batched variant
+    of the function is returned.
+    """
+    name = 'gradient_centered{:d}d'.format(ndim) + ('_batch' if batch else '')
+    func = getattr(_masked_gradient, name)
+    func.restype = None
+
+    array_dimension_args = ((ctypes.c_int,) * (ndim + int(batch)))
+    array_arg = (ndpointer(ctypes.c_double), _strides_arg)
+    mask_arg = (ndpointer(ctypes.c_bool), _strides_arg)
+    gradient_args = (ndpointer(ctypes.c_double), _strides_arg) * ndim
+    gradient_magnitude_arg = (ndpointer(ctypes.c_double), _strides_arg)
+    if batch:
+        delta_args = (ndpointer(ctypes.c_double, ndim=2,
+                                flags='C_CONTIGUOUS'),)
+    else:
+        delta_args = (ctypes.c_double,) * ndim
+    normalize_arg = (ctypes.c_int,)
+
+    func.argtypes = (
+        array_dimension_args +
+        array_arg +
+        mask_arg +
+        gradient_args +
+        gradient_magnitude_arg +
+        delta_args +
+        normalize_arg
+    )
+
+    return func
+
+
+def _get_gradient_magnitude_osher_sethian_func(ndim, batch=False):
+    """ Gets the function from the c module and sets up the respective
+    argument and return types. If `batch` is True, then the batched variant
+    of the function is returned.
+    """
+    name = 'gmag_os{:d}d'.format(ndim) + ('_batch' if batch else '')
+    func = getattr(_masked_gradient, name)
+    func.restype = None
+
+    array_dimension_args = ((ctypes.c_int,) * (ndim + int(batch)))
+    array_arg = (ndpointer(ctypes.c_double), _strides_arg)
+    mask_arg = (ndpointer(ctypes.c_bool), _strides_arg)
+    nu_arg = (ndpointer(ctypes.c_double), _strides_arg)
+    gradient_magnitude_arg = (ndpointer(ctypes.c_double), _strides_arg)
+    if batch:
+        delta_args = (ndpointer(ctypes.c_double, ndim=2,
+                                flags='C_CONTIGUOUS'),)
+    else:
+        delta_args = (ctypes.c_double,) * ndim
+
+    func.argtypes = (
+        array_dimension_args +
+        array_arg +
+        mask_arg +
+        nu_arg +
+        gradient_magnitude_arg +
+        delta_args
+    )
+
+    return func
+
+
+def _get_curvature_func(ndim):
+    """ Gets the function from the c module and sets up the respective
+    argument and return types
+    """
+    func = getattr(_masked_gradient, 'curvature{:d}d'.format(ndim))
+    func.restype = None
+
+    array_dimension_args = ((ctypes.c_int,) * ndim)
+    array_arg = (ndpointer(ctypes.c_double), _strides_arg)
+    mask_arg = (ndpointer(ctypes.c_bool), _strides_arg)
+    curvature_arg = (ndpointer(ctypes.c_double), _strides_arg)
+    delta_args = (ctypes.c_double,) * ndim
+
+    func.argtypes = (
+        array_dimension_args +
+        array_arg +
+        mask_arg +
+        curvature_arg +
+        delta_args
+    )
+
+    return func
+
+
+def _element_strides(arr):
+    """ Returns the strides of `arr` in units of elements (rather than bytes)
+    as required by the C functions, or None if the strides are not a
+    multiple of the item size
+    """
+    if any(stride % arr.itemsize for stride in arr.strides):
+        return None
+    return np.array(arr.strides, dtype=np.intp) // arr.itemsize
+
+
+def _as_strided_arg(arr):
+    """ Returns the pair of arguments `(arr, strides)` passed to the C
+    functions for an input array. Arrays with strides that are not a
+    multiple of the item size (which can only arise from unusual views) are
+    copied; all other views are passed through without copying.
+    """
+    strides = _element_strides(arr)
+    if strides is None:
+        arr = np.ascontiguousarray(arr)
+        strides = _element_strides(arr)
+    return arr, strides
+
+
+def gradient_centered(arr, mask, dx, normalize,
+                      gradients, gradient_magnitude):
+    ndim = arr.ndim
+
+    arr, arr_strides = _as_strided_arg(arr)
+    mask, mask_strides = _as_strided_arg(mask)
+
+    # Set up the C function
+    func = _get_gradient_centered_func(ndim=ndim)
+
+    # Set up the arguments to the C function
+    args = (
+        arr.shape +
+        (arr, arr_strides) +
+        (mask, mask_strides) +
+        tuple(arg
+              for gradient in gradients
+              for arg in (gradient, _element_strides(gradient))) +
+        (gradient_magnitude, _element_strides(gradient_magnitude)) +
+        tuple(dx) +
+        (int(normalize),)
+    )
+
+    # Call the C function
+    func(*args)
+
+
+def gradient_magnitude_osher_sethian(arr, nu, mask, dx, gradient_magnitude):
+    ndim = arr.ndim
+
+    arr, arr_strides = _as_strided_arg(arr)
+    mask, mask_strides = _as_strided_arg(mask)
+    nu, nu_strides = _as_strided_arg(nu)
+
+    # Set up the C function
+    func = _get_gradient_magnitude_osher_sethian_func(ndim=ndim)
+
+    # Set up the arguments to the C function
+    args = (
+        arr.shape +
+        (arr, arr_strides) +
+        (mask, mask_strides) +
+        (nu, nu_strides) +
+        (gradient_magnitude, _element_strides(gradient_magnitude)) +
+        tuple(dx)
+    )
+
+    # Call the C function
+    func(*args)
+
+
+def curvature(arr, mask, dx, kappa):
+    ndim = arr.ndim
+
+    arr, arr_strides = _as_strided_arg(arr)
+    mask, mask_strides = _as_strided_arg(mask)
+
+    # Set up the C function
+    func = _get_curvature_func(ndim=ndim)
+
+    # Set up the arguments to the C function
+    args = (
+        arr.shape +
+        (arr, arr_strides) +
+        (mask, mask_strides) +
+        (kappa, _element_strides(kappa)) +
+        tuple(dx)
+    )
+
+    # Call the C function
+    func(*args)
+
+
+def gradient_centered_batch(arrs, masks, dx, normalize,
+                            gradients, gradient_magnitude):
+    ndim = arrs.ndim - 1
+
+    arrs, arrs_strides = _as_strided_arg(arrs)
+    masks, masks_strides = _as_strided_arg(masks)
+
+    # Set up the C function
+    func = _get_gradient_centered_func(ndim=ndim, batch=True)
+
+    # Set up the arguments to the C function
+    args = (
+        arrs.shape +
+        (arrs, arrs_strides) +
+        (masks, masks_strides) +
+        tuple(arg
+              for gradient in gradients
+              for arg in (gradient, _element_strides(gradient))) +
+        (gradient_magnitude, _element_strides(gradient_magnitude)) +
+        (np.ascontiguousarray(dx),) +
+        (int(normalize),)
+    )
+
+    # Call the C function
+    func(*args)
+
+
+def gradient_magnitude_osher_sethian_batch(arrs, nus, masks, dx,
+                                           gradient_magnitude):
+    ndim = arrs.ndim - 1
+
+    arrs, arrs_strides = _as_strided_arg(arrs)
+    masks, masks_strides = _as_strided_arg(masks)
+    nus, nus_strides = _as_strided_arg(nus)
+
+    # Set up the C function
+    func = _get_gradient_magnitude_osher_sethian_func(ndim=ndim, batch=True)
+
+    # Set up the arguments to the C function
+    args = (
+        arrs.shape +
+        (arrs, arrs_strides) +
+        (masks, masks_strides) +
+        (nus, nus_strides) +
+        (gradient_magnitude, _element_strides(gradient_magnitude)) +
+        (np.ascontiguousarray(dx),)
+    )
+
+    # Call the C function
+    func(*args)
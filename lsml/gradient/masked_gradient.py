@@ -1,76 +1,43 @@
-import ctypes
-import pathlib
-
+""" Masked finite difference routines used throughout the level set
+computations. The arguments are validated and output arrays are allocated
+here, and the computations are dispatched to one of the numerical backends
+in :mod:`lsml.gradient.backend`.
+"""
 import numpy as np
-from numpy.ctypeslib import ndpointer
-
 
-try:
-    import lsml
-    util = pathlib.Path(lsml.__file__).parent / 'util'
-    name = list(util.glob('masked_gradient*'))[0]
-    _masked_gradient = ctypes.cdll.LoadLibrary(str(name))
-except Exception:
-    raise ImportError('Could not find shared library for masked_gradient')
+from lsml.gradient.backend import get_backend, select_backend
 
 
-def _get_gradient_centered_func(ndim):
-    """ Gets the function from the c module and sets up the respective
-    argument and return types
+def _get_backend(name, shape):
+    """ Returns the backend module `name`, or the selected backend for
+    arrays of `shape` if `name` is None
     """
-    func = getattr(_masked_gradient, 'gradient_centered{:d}d'.format(ndim))
-    func.restype = None
-
-    array_dimension_args = ((ctypes.c_int,) * ndim)
-    array_arg = (ndpointer(ctypes.c_double),)
-    mask_arg = (ndpointer(ctypes.c_bool),)
-    gradient_args = (ndpointer(ctypes.c_double),) * ndim
-    gradient_magnitude_arg = (ndpointer(ctypes.c_double),)
-    delta_args = (ctypes.c_double,) * ndim
-    normalize_arg = (ctypes.c_int,)
-
-    func.argtypes = (
-        array_dimension_args +
-        array_arg +
-        mask_arg +
-        gradient_args +
-        gradient_magnitude_arg +
-        delta_args +
-        normalize_arg
-    )
-
-    return func
-
-
-def _get_gradient_magnitude_osher_sethian_func(ndim):
-    """ Gets the function from the c module and sets up the respective
-    argument and return types
-    """
-    func = getattr(_masked_gradient, 'gmag_os{:d}d'.format(ndim))
-    func.restype = None
-
-    array_dimension_args = ((ctypes.c_int,) * ndim)
-    array_arg = (ndpointer(ctypes.c_double),)
-    mask_arg = (ndpointer(ctypes.c_bool),)
-    nu_arg = (ndpointer(ctypes.c_double),)
-    gradient_magnitude_arg = (ndpointer(ctypes.c_double),)
-    delta_args = (ctypes.c_double,) * ndim
+    if name is None:
+        return select_backend(shape)
+    return get_backend(name)
 
-    func.argtypes = (
-        array_dimension_args +
-        array_arg +
-        mask_arg +
-        nu_arg +
-        gradient_magnitude_arg +
-        delta_args
-    )
 
-    return func
+def _validate_out(out, shape, name):
+    """ Checks that a user-provided output array can be written to
+    directly by the backend functions
+    """
+    if not isinstance(out, np.ndarray):
+        raise TypeError("`{}` must be a numpy array".format(name))
+    if out.dtype != np.float:
+        raise ValueError("`{}` must be float type.".format(name))
+    if out.shape != shape:
+        msg = "`{}` has shape {}, but must be shape {}"
+        raise ValueError(msg.format(name, out.shape, shape))
+    if not out.flags.writeable:
+        raise ValueError("`{}` must be writeable.".format(name))
+    if any(stride % out.itemsize for stride in out.strides):
+        msg = "`{}` strides must be a multiple of its item size"
+        raise ValueError(msg.format(name))
 
 
 def gradient_centered(arr, mask=None, dx=None,
                       return_gradient_magnitude=True,
-                      normalize=False):
+                      normalize=False, out=None, backend=None):
     """
     Compute the centered difference approximations of the partial
     derivatives of `arr` along each coordinate axis, computed only
@@ -102,6 +69,25 @@ def gradient_centered(arr, mask=None, dx=None,
         Note that if `return_mag` is True, the gradient magnitude is
         magnitude value prior to normalization (not necessarily one).
 
+    out: tuple, default=None
+        A 2-tuple, `(gradients, gradient_magnitude)`, where `gradients` is
+        a list of `arr.ndim` float arrays and `gradient_magnitude` is a float
+        array, all of shape `arr.shape`, into which the results are written
+        (only where `mask` is true). These may be non-contiguous views, e.g.,
+        `u[i0:i1, j0:j1]`. The default (None) allocates new arrays.
+
+    backend: str, default=None
+        The name of the backend (see :mod:`lsml.gradient.backend`) used
+        for the computation. If None (default), the backend is selected
+        automatically or by the `LSML_GRADIENT_BACKEND` environment
+        variable.
+
+    Note
+    ----
+    `arr`, `mask`, and `out` may be arbitrarily strided views; no copy is
+    made. The boundaries of a view are treated as the boundaries of the
+    domain, i.e., one-sided differences are used there.
+
     Returns
     -------
     [gradient_1, ... , gradient_n], gradient_magnitude: list, ndarray
@@ -115,7 +101,7 @@ def gradient_centered(arr, mask=None, dx=None,
         raise ValueError("`arr` must be float type.")
 
     if mask is not None:
-        if mask.ndim != ndim:
+        if mask.shape != arr.shape:
             raise ValueError("Shape mismatch between `mask` and `arr`.")
     else:
         mask = np.ones(arr.shape, dtype=np.bool)
@@ -126,25 +112,20 @@ def gradient_centered(arr, mask=None, dx=None,
     else:
         dx = np.ones(ndim, dtype=np.float)
 
-    gradients = [np.zeros_like(arr) for _ in range(ndim)]
-    gradient_magnitude = np.zeros_like(arr)
-
-    # Set up the C function
-    func = _get_gradient_centered_func(ndim=ndim)
-
-    # Set up the arguments to the C function
-    args = (
-        arr.shape +
-        (arr,) +
-        (mask,) +
-        tuple(gradients) +
-        (gradient_magnitude,) +
-        tuple(dx) +
-        (int(normalize),)
-    )
+    if out is None:
+        gradients = [np.zeros_like(arr) for _ in range(ndim)]
+        gradient_magnitude = np.zeros_like(arr)
+    else:
+        gradients, gradient_magnitude = out
+        if len(gradients) != ndim:
+            raise ValueError("`out` must contain `arr.ndim` gradients.")
+        for gradient in gradients:
+            _validate_out(gradient, arr.shape, 'out')
+        _validate_out(gradient_magnitude, arr.shape, 'out')
 
-    # Call the C function
-    func(*args)
+    module = _get_backend(backend, arr.shape)
+    module.gradient_centered(
+        arr, mask, dx, normalize, gradients, gradient_magnitude)
 
     if return_gradient_magnitude:
         return gradients, gradient_magnitude
@@ -152,7 +133,8 @@ def gradient_centered(arr, mask=None, dx=None,
         return gradients
 
 
-def gradient_magnitude_osher_sethian(arr, nu, mask=None, dx=None):
+def gradient_magnitude_osher_sethian(arr, nu, mask=None, dx=None, out=None,
+                                     backend=None):
     """
     This numerical approximation is an upwind approximation of
     the velocity-dependent gradient magnitude term in the PDE:
@@ -194,6 +176,21 @@ def gradient_magnitude_osher_sethian(arr, nu, mask=None, dx=None):
         These indicate the "delta" or spacing terms along each axis.
         If None (default), then spacing is 1.0 along each axis.
 
+    out: ndarray, dtype=float, same shape as `A`, default=None
+        If provided, the result is written into this array (only where
+        `mask` is true) and returned. It may be a non-contiguous view.
+
+    backend: str, default=None
+        The name of the backend (see :mod:`lsml.gradient.backend`) used
+        for the computation. If None (default), the backend is selected
+        automatically or by the `LSML_GRADIENT_BACKEND` environment
+        variable.
+
+    Note
+    ----
+    As with :func:`gradient_centered`, all array arguments may be
+    arbitrarily strided views.
+
     Returns
     -------
     gradient_magnitude: ndarray
@@ -205,7 +202,7 @@ def gradient_magnitude_osher_sethian(arr, nu, mask=None, dx=None):
         raise ValueError("`arr` must be float type.")
 
     if mask is not None:
-        if mask.ndim != ndim:
+        if mask.shape != arr.shape:
             raise ValueError("Shape mismatch between `mask` and `arr`.")
     else:
         mask = np.ones(arr.shape, dtype=np.bool)
@@ -216,22 +213,274 @@ def gradient_magnitude_osher_sethian(arr, nu, mask=None, dx=None):
     else:
         dx = np.ones(ndim, dtype=np.float)
 
-    gradient_magnitude = np.zeros_like(arr)
+    if nu.shape != arr.shape:
+        raise ValueError("Shape mismatch between `nu` and `arr`.")
+
+    if out is None:
+        gradient_magnitude = np.zeros_like(arr)
+    else:
+        _validate_out(out, arr.shape, 'out')
+        gradient_magnitude = out
+
+    module = _get_backend(backend, arr.shape)
+    module.gradient_magnitude_osher_sethian(
+        arr, nu, mask, dx, gradient_magnitude)
+
+    return gradient_magnitude
+
+
+def curvature(arr, mask=None, dx=None, out=None, backend=None):
+    """
+    Compute the curvature of the level sets of `arr`,
+
+    .. math::
+        \\kappa = -\\nabla \\cdot \\frac{\\nabla u}{\\| \\nabla u \\|}
+
+    only where `mask` is true. With the convention that `arr` is positive
+    inside of the zero level set, a circle of radius :math:`r` has curvature
+    :math:`1/r`, and a sphere of radius :math:`r` has (the sum of principal
+    curvatures) :math:`2/r`.
+
+    Note
+    ----
+    Only dimensions 2 and 3 are supported. Only values of `arr` inside of
+    `mask` are used: where a finite difference stencil would reach outside
+    of the mask, a one-sided difference is used for the first derivatives
+    and the second derivative terms are taken to be zero. Thus, `arr` may be
+    a narrow band signed distance array whose values outside the band are
+    meaningless.
 
-    # Set up the C function
-    func = _get_gradient_magnitude_osher_sethian_func(ndim=ndim)
+    Parameters
+    ----------
+    arr: ndarray, dtype=float
+        The curvature of the level sets of `arr` is returned.
+
+    mask: ndarray, dtype=bool, same shape as `arr`, default=None
+        The curvature is only computed where `mask` is true. If None
+        (default), then mask True everywhere.
+
+    dx: ndarray, dtype=float, len=arr.ndim
+        These indicate the "delta" or spacing terms along each axis.
+        If None (default), then spacing is 1.0 along each axis.
+
+    out: ndarray, dtype=float, same shape as `arr`, default=None
+        If provided, the result is written into this (possibly strided)
+        array and returned.
+
+    backend: str, default=None
+        The name of the backend (see :mod:`lsml.gradient.backend`) used
+        for the computation. If None (default), the backend is selected
+        automatically or by the `LSML_GRADIENT_BACKEND` environment
+        variable.
+
+    Returns
+    -------
+    curvature: ndarray
+        The curvature (only computed where mask is True).
+    """
+    ndim = arr.ndim
+    if ndim not in (2, 3):
+        raise ValueError("Only dimensions 2 and 3 supported.")
+    if arr.dtype != np.float:
+        raise ValueError("`arr` must be float type.")
+
+    if mask is not None:
+        if mask.shape != arr.shape:
+            raise ValueError("Shape mismatch between `mask` and `arr`.")
+    else:
+        mask = np.ones(arr.shape, dtype=np.bool)
+
+    if dx is not None:
+        if len(dx) != ndim:
+            raise ValueError("`dx` vector shape mismatch.")
+    else:
+        dx = np.ones(ndim, dtype=np.float)
+
+    if out is None:
+        kappa = np.zeros_like(arr)
+    else:
+        _validate_out(out, arr.shape, 'out')
+        kappa = out
 
-    # Set up the arguments to the C function
-    args = (
-        arr.shape +
-        (arr,) +
-        (mask,) +
-        (nu,) +
-        (gradient_magnitude,) +
-        tuple(dx)
-    )
+    module = _get_backend(backend, arr.shape)
+    module.curvature(arr, mask, dx, kappa)
 
-    # Call the C function
-    func(*args)
+    return kappa
+
+
+def _validate_batch_inputs(arrs, masks, dx):
+    """ Validates the inputs shared by the batched functions, returning the
+    (possibly defaulted) `masks` and `dx` arrays
+    """
+    if arrs.ndim < 2:
+        raise ValueError("`arrs` must be shape `(batch,) + shape`.")
+
+    batch_size = arrs.shape[0]
+    ndim = arrs.ndim - 1
+    assert 1 <= ndim <= 3, "Only dimensions 1-3 supported."
+    if arrs.dtype != np.float:
+        raise ValueError("`arrs` must be float type.")
+
+    if masks is not None:
+        if masks.shape != arrs.shape:
+            raise ValueError("Shape mismatch between `masks` and `arrs`.")
+    else:
+        masks = np.ones(arrs.shape, dtype=np.bool)
+
+    if dx is None:
+        dx = np.ones((batch_size, ndim), dtype=np.float)
+    else:
+        dx = np.array(dx, dtype=np.float)
+        if dx.ndim == 1:
+            # The same delta terms are used for each example
+            dx = np.tile(dx, (batch_size, 1))
+        if dx.shape != (batch_size, ndim):
+            raise ValueError("`dx` vector shape mismatch.")
+
+    return masks, dx
+
+
+def gradient_centered_batch(arrs, masks=None, dx=None,
+                            return_gradient_magnitude=True,
+                            normalize=False, out=None, backend=None):
+    """
+    The batched version of :func:`gradient_centered`, computed over a stack
+    of same-shape arrays. Backends that provide a batched routine (e.g., the
+    C backend) process the whole stack with a single call.
+
+    This is not used by :meth:`SegmentationMixin.segment_batch`, which
+    updates the images over their respective crop boxes, whose shapes
+    differ.
+
+    Parameters
+    ----------
+    arrs: ndarray, dtype=float, shape=(batch,) + shape
+        The stack of arrays whose gradients are computed.
+
+    masks: ndarray, dtype=bool, same shape as `arrs`, default=None
+        The gradient of `arrs[i]` is only computed where `masks[i]` is true.
+        If None (default), then mask True everywhere.
+
+    dx: ndarray, dtype=float, shape=(batch, ndim) or (ndim,), default=None
+        The delta terms for each example. A single vector of length `ndim`
+        is used for every example. If None (default), then spacing is 1.0
+        along each axis.
+
+    return_gradient_magnitude: bool, default=True
+        If True, the gradient magnitude is computed and returned also.
+
+    normalize: bool, default=False
+        See :func:`gradient_centered`.
+
+    out: tuple, default=None
+        A 2-tuple, `(gradients, gradient_magnitude)`, of (possibly strided)
+        arrays, each of shape `arrs.shape`, into which results are written.
+
+    backend: str, default=None
+        The name of the backend (see :mod:`lsml.gradient.backend`) used
+        for the computation. If None (default), the backend is selected
+        automatically or by the `LSML_GRADIENT_BACKEND` environment
+        variable.
+
+    Returns
+    -------
+    [gradient_1, ... , gradient_n], gradient_magnitude: list, ndarray
+        Each term has shape `arrs.shape`, so that, e.g., `gradient_1[i]` is
+        the gradient along the first axis of `arrs[i]`.
+    """
+    masks, dx = _validate_batch_inputs(arrs, masks, dx)
+    ndim = arrs.ndim - 1
+
+    if out is None:
+        gradients = [np.zeros_like(arrs) for _ in range(ndim)]
+        gradient_magnitude = np.zeros_like(arrs)
+    else:
+        gradients, gradient_magnitude = out
+        if len(gradients) != ndim:
+            raise ValueError("`out` must contain `arrs.ndim-1` gradients.")
+        for gradient in gradients:
+            _validate_out(gradient, arrs.shape, 'out')
+        _validate_out(gradient_magnitude, arrs.shape, 'out')
+
+    module = _get_backend(backend, arrs.shape[1:])
+
+    if hasattr(module, 'gradient_centered_batch'):
+        module.gradient_centered_batch(
+            arrs, masks, dx, normalize, gradients, gradient_magnitude)
+    else:
+        for i in range(arrs.shape[0]):
+            module.gradient_centered(
+                arrs[i], masks[i], dx[i], normalize,
+                [gradient[i] for gradient in gradients],
+                gradient_magnitude[i])
+
+    if return_gradient_magnitude:
+        return gradients, gradient_magnitude
+    else:
+        return gradients
+
+
+def gradient_magnitude_osher_sethian_batch(arrs, nus, masks=None, dx=None,
+                                           out=None, backend=None):
+    """
+    The batched version of :func:`gradient_magnitude_osher_sethian`,
+    computed over a stack of same-shape arrays. Backends that provide a
+    batched routine process the whole stack with a single call.
+
+    Like :func:`gradient_centered_batch`, this is not used by
+    :meth:`SegmentationMixin.segment_batch`.
+
+    Parameters
+    ----------
+    arrs: ndarray, dtype=float, shape=(batch,) + shape
+        The stack of level set arrays.
+
+    nus: ndarray, dtype=float, same shape as `arrs`
+        The respective velocity arrays.
+
+    masks: ndarray, dtype=bool, same shape as `arrs`, default=None
+        The result for `arrs[i]` is only computed where `masks[i]` is true.
+        If None (default), then mask True everywhere.
+
+    dx: ndarray, dtype=float, shape=(batch, ndim) or (ndim,), default=None
+        The delta terms for each example. A single vector of length `ndim`
+        is used for every example. If None (default), then spacing is 1.0
+        along each axis.
+
+    out: ndarray, dtype=float, same shape as `arrs`, default=None
+        If provided, the result is written into this (possibly strided)
+        array and returned.
+
+    backend: str, default=None
+        The name of the backend (see :mod:`lsml.gradient.backend`) used
+        for the computation. If None (default), the backend is selected
+        automatically or by the `LSML_GRADIENT_BACKEND` environment
+        variable.
+
+    Returns
+    -------
+    gradient_magnitude: ndarray, shape=arrs.shape
+        The velocity-dependent gradient magnitude approximations.
+    """
+    masks, dx = _validate_batch_inputs(arrs, masks, dx)
+
+    if nus.shape != arrs.shape:
+        raise ValueError("Shape mismatch between `nus` and `arrs`.")
+
+    if out is None:
+        gradient_magnitude = np.zeros_like(arrs)
+    else:
+        _validate_out(out, arrs.shape, 'out')
+        gradient_magnitude = out
+
+    module = _get_backend(backend, arrs.shape[1:])
+
+    if hasattr(module, 'gradient_magnitude_osher_sethian_batch'):
+        module.gradient_magnitude_osher_sethian_batch(
+            arrs, nus, masks, dx, gradient_magnitude)
+    else:
+        for i in range(arrs.shape[0]):
+            module.gradient_magnitude_osher_sethian(
+                arrs[i], nus[i], masks[i], dx[i], gradient_magnitude[i])
 
     return gradient_magnitude
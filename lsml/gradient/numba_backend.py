@@ -0,0 +1,208 @@
+""" A JIT-compiled backend for the masked gradient routines using numba.
+Importing this module raises ImportError if numba is not installed.
+
+The kernels are written for three dimensions; one and two dimensional
+arrays are passed as views with trailing singleton axes, along which all
+derivative terms vanish.
+"""
+import numba
+import numpy as np
+
+
+def _as3d(arr):
+    """ A view of `arr` with trailing singleton axes added to make it 3D
+    """
+    return arr[(Ellipsis,) + (None,) * (3 - arr.ndim)]
+
+
+def _as3d_deltas(dx):
+    """ Delta terms padded with ones to length three
+    """
+    deltas = np.ones(3, dtype=np.float64)
+    deltas[:len(dx)] = dx
+    return deltas
+
+
+@numba.njit(cache=True)
+def _one_sided(A, i, j, k, axis, delta):
+    """ The forward and backward differences of `A` at `(i, j, k)` along
+    `axis`, with the single available difference used for both at the array
+    boundaries (as in the C routines)
+    """
+    n = A.shape[axis]
+    a0 = A[i, j, k]
+
+    if n < 2:
+        return 0.0, 0.0
+
+    ip, jp, kp = i, j, k
+    im, jm, km = i, j, k
+    if axis == 0:
+        ip += 1
+        im -= 1
+    elif axis == 1:
+        jp += 1
+        jm -= 1
+    else:
+        kp += 1
+        km -= 1
+
+    index = (i, j, k)[axis]
+
+    if index == 0:
+        forward = (A[ip, jp, kp] - a0) / delta
+        backward = forward
+    elif index == n - 1:
+        backward = (a0 - A[im, jm, km]) / delta
+        forward = backward
+    else:
+        forward = (A[ip, jp, kp] - a0) / delta
+        backward = (a0 - A[im, jm, km]) / delta
+
+    return forward, backward
+
+
+@numba.njit(cache=True)
+def _gradient_centered3d(A, mask, di, dj, dk, gmag, dx, normalize):
+    m, n, p = A.shape
+    for i in range(m):
+        for j in range(n):
+            for k in range(p):
+                if not mask[i, j, k]:
+                    continue
+
+                fi, bi = _one_sided(A, i, j, k, 0, dx[0])
+                fj, bj = _one_sided(A, i, j, k, 1, dx[1])
+                fk, bk = _one_sided(A, i, j, k, 2, dx[2])
+
+                gi = 0.5 * (fi + bi)
+                gj = 0.5 * (fj + bj)
+                gk = 0.5 * (fk + bk)
+                g = np.sqrt(gi*gi + gj*gj + gk*gk)
+
+                if normalize and g > 0:
+                    gi /= g
+                    gj /= g
+                    gk /= g
+
+                di[i, j, k] = gi
+                dj[i, j, k] = gj
+                dk[i, j, k] = gk
+                gmag[i, j, k] = g
+
+
+@numba.njit(cache=True)
+def _gmag_os3d(A, mask, nu, gmag, dx):
+    m, n, p = A.shape
+    for i in range(m):
+        for j in range(n):
+            for k in range(p):
+                if not mask[i, j, k]:
+                    continue
+
+                total = 0.0
+                for axis in range(3):
+                    f, b = _one_sided(A, i, j, k, axis, dx[axis])
+                    if nu[i, j, k] < 0:
+                        total += max(b, 0.0)**2 + min(f, 0.0)**2
+                    else:
+                        total += min(b, 0.0)**2 + max(f, 0.0)**2
+
+                gmag[i, j, k] = np.sqrt(total)
+
+
+@numba.njit(cache=True)
+def _in_mask(mask, i, j, k):
+    m, n, p = mask.shape
+    if i < 0 or j < 0 or k < 0 or i > m-1 or j > n-1 or k > p-1:
+        return False
+    return mask[i, j, k]
+
+
+@numba.njit(cache=True)
+def _derivs(A, mask, i, j, k, a, b, c, delta):
+    fwd = _in_mask(mask, i+a, j+b, k+c)
+    bck = _in_mask(mask, i-a, j-b, k-c)
+    a0 = A[i, j, k]
+
+    if fwd and bck:
+        af = A[i+a, j+b, k+c]
+        ab = A[i-a, j-b, k-c]
+        return 0.5*(af - ab) / delta, (af - 2*a0 + ab) / (delta*delta)
+    elif fwd:
+        return (A[i+a, j+b, k+c] - a0) / delta, 0.0
+    elif bck:
+        return (a0 - A[i-a, j-b, k-c]) / delta, 0.0
+    else:
+        return 0.0, 0.0
+
+
+@numba.njit(cache=True)
+def _mixed(A, mask, i, j, k, a1, b1, c1, a2, b2, c2, h1, h2):
+    if not (_in_mask(mask, i+a1+a2, j+b1+b2, k+c1+c2) and
+            _in_mask(mask, i+a1-a2, j+b1-b2, k+c1-c2) and
+            _in_mask(mask, i-a1+a2, j-b1+b2, k-c1+c2) and
+            _in_mask(mask, i-a1-a2, j-b1-b2, k-c1-c2)):
+        return 0.0
+
+    return (A[i+a1+a2, j+b1+b2, k+c1+c2] - A[i+a1-a2, j+b1-b2, k+c1-c2] -
+            A[i-a1+a2, j-b1+b2, k-c1+c2] + A[i-a1-a2, j-b1-b2, k-c1-c2]
+            ) / (4*h1*h2)
+
+
+@numba.njit(cache=True)
+def _curvature3d(A, mask, kappa, dx):
+    m, n, p = A.shape
+    for i in range(m):
+        for j in range(n):
+            for k in range(p):
+                if not mask[i, j, k]:
+                    continue
+
+                ai, aii = _derivs(A, mask, i, j, k, 1, 0, 0, dx[0])
+                aj, ajj = _derivs(A, mask, i, j, k, 0, 1, 0, dx[1])
+                ak, akk = _derivs(A, mask, i, j, k, 0, 0, 1, dx[2])
+
+                aij = _mixed(A, mask, i, j, k, 1, 0, 0, 0, 1, 0,
+                             dx[0], dx[1])
+                aik = _mixed(A, mask, i, j, k, 1, 0, 0, 0, 0, 1,
+                             dx[0], dx[2])
+                ajk = _mixed(A, mask, i, j, k, 0, 1, 0, 0, 0, 1,
+                             dx[1], dx[2])
+
+                g2 = ai*ai + aj*aj + ak*ak
+
+                if g2 == 0:
+                    kappa[i, j, k] = 0.0
+                    continue
+
+                kappa[i, j, k] = -(
+                    (ajj + akk)*ai*ai +
+                    (aii + akk)*aj*aj +
+                    (aii + ajj)*ak*ak -
+                    2*ai*aj*aij - 2*ai*ak*aik - 2*aj*ak*ajk
+                ) / (g2*np.sqrt(g2))
+
+
+def gradient_centered(arr, mask, dx, normalize,
+                      gradients, gradient_magnitude):
+
+    arr3d = _as3d(arr)
+
+    # Scratch arrays stand in for the gradients along the singleton axes
+    gradients3d = [_as3d(gradient) for gradient in gradients]
+    gradients3d += [np.empty(arr3d.shape)
+                    for _ in range(3 - len(gradients))]
+
+    _gradient_centered3d(
+        arr3d, _as3d(mask), *gradients3d, _as3d(gradient_magnitude),
+        _as3d_deltas(dx), bool(normalize))
+
+
+def gradient_magnitude_osher_sethian(arr, nu, mask, dx, gradient_magnitude):
+    _gmag_os3d(_as3d(arr), _as3d(mask), _as3d(nu),
+               _as3d(gradient_magnitude), _as3d_deltas(dx))
+
+
+def curvature(arr, mask, dx, kappa):
+    _curvature3d(_as3d(arr), _as3d(mask), _as3d(kappa), _as3d_deltas(dx))
@@ -0,0 +1,118 @@
+import os
+import unittest
+
+import numpy as np
+
+from lsml.gradient import backend
+from lsml.gradient import masked_gradient as mg
+
+
+class TestBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.random_state = np.random.RandomState(1234)
+        self.backends = backend.available_backends()
+
+    def tearDown(self):
+        backend.set_backend(None)
+        os.environ.pop(backend.BACKEND_ENV_VAR, None)
+
+    def _random_inputs(self, ndim):
+        dims = self.random_state.randint(20, 31, size=ndim)
+        arr = self.random_state.randn(*dims)
+        nu = self.random_state.randn(*dims)
+        mask = self.random_state.rand(*dims) > 0.3
+        dx = self.random_state.rand(ndim) + 0.5
+        return arr, nu, mask, dx
+
+    def test_numpy_always_available(self):
+        self.assertIn('numpy', self.backends)
+
+    def test_backends_agree(self):
+
+        for ndim in [1, 2, 3]:
+            arr, nu, mask, dx = self._random_inputs(ndim)
+
+            results = {}
+            for name in self.backends:
+                grads, gmag = mg.gradient_centered(
+                    arr, mask=mask, dx=dx, normalize=True, backend=name)
+                gmag_os = mg.gradient_magnitude_osher_sethian(
+                    arr, nu, mask=mask, dx=dx, backend=name)
+                results[name] = grads + [gmag, gmag_os]
+
+            for name in self.backends:
+                for expected, result in zip(results['numpy'], results[name]):
+                    np.testing.assert_allclose(result, expected, atol=1e-10)
+
+    def test_backends_agree_strided(self):
+
+        arr = self.random_state.randn(40, 50)[::2, ::-3]
+        nu = self.random_state.randn(40, 50)[1::2, ::3]
+        mask = (self.random_state.rand(20, 17) > 0.3).T.copy().T
+
+        results = {}
+        for name in self.backends:
+            out = np.zeros((40, 34))[::2, ::2]
+            results[name] = mg.gradient_magnitude_osher_sethian(
+                arr, nu, mask=mask, out=out, backend=name)
+            self.assertIs(results[name], out)
+
+        for name in self.backends:
+            np.testing.assert_allclose(
+                results[name], results['numpy'], atol=1e-10)
+
+    def test_backends_agree_curvature(self):
+
+        for ndim in [2, 3]:
+            arr, _, mask, dx = self._random_inputs(ndim)
+
+            expected = mg.curvature(arr, mask=mask, dx=dx, backend='numpy')
+
+            for name in self.backends:
+                kappa = mg.curvature(arr, mask=mask, dx=dx, backend=name)
+                np.testing.assert_allclose(kappa, expected, atol=1e-8)
+
+    def test_backends_agree_batch(self):
+
+        arrs = self.random_state.randn(3, 20, 25)
+        nus = self.random_state.randn(3, 20, 25)
+        masks = self.random_state.rand(3, 20, 25) > 0.3
+        dx = self.random_state.rand(3, 2) + 0.5
+
+        expected = mg.gradient_magnitude_osher_sethian_batch(
+            arrs, nus, masks=masks, dx=dx, backend='numpy')
+
+        for name in self.backends:
+            gmag = mg.gradient_magnitude_osher_sethian_batch(
+                arrs, nus, masks=masks, dx=dx, backend=name)
+            np.testing.assert_allclose(gmag, expected, atol=1e-10)
+
+    def test_set_backend(self):
+
+        backend.set_backend('numpy')
+        self.assertEqual(backend.get_backend_name(), 'numpy')
+        self.assertIs(backend.select_backend((10, 10)),
+                      backend.get_backend('numpy'))
+
+        backend.set_backend(None)
+        self.assertEqual(backend.get_backend_name(), backend.AUTO_BACKEND)
+
+    def test_environment_variable(self):
+
+        os.environ[backend.BACKEND_ENV_VAR] = 'numpy'
+        self.assertIs(backend.select_backend((10, 10)),
+                      backend.get_backend('numpy'))
+
+    def test_calibrate(self):
+
+        name = backend.calibrate((30, 30), repeats=1)
+        self.assertIn(name, self.backends)
+
+    def test_unknown_backend(self):
+
+        with self.assertRaises(ValueError):
+            backend.set_backend('fortran')
+
+        with self.assertRaises(ValueError):
+            mg.gradient_centered(np.zeros((5, 5)), backend='fortran')
@@ -118,3 +118,165 @@ class TestMaskedGradient(unittest.TestCase):
         gmag_error = np.abs(gmag - gmag_true).mean()
 
         self.assertLessEqual(gmag_error, 1e-8)
+
+    def test_gradient_centered_strided_view(self):
+
+        for ndim in [1, 2, 3]:
+            dims = self.random_state.randint(30, 51, size=ndim)
+            arr = self.random_state.randn(*dims)
+            mask = self.random_state.randn(*dims) > 0
+            dx = self.random_state.rand(ndim)
+
+            # A cropped, non-contiguous view and its contiguous copy
+            crop = tuple(slice(3, dim-4, 2) for dim in dims)
+            view = arr[crop]
+
+            grads, gmag = mg.gradient_centered(view, mask=mask[crop], dx=dx)
+            grads_copy, gmag_copy = mg.gradient_centered(
+                view.copy(), mask=mask[crop].copy(), dx=dx)
+
+            for i in range(ndim):
+                self.assertTrue((grads[i] == grads_copy[i]).all())
+            self.assertTrue((gmag == gmag_copy).all())
+
+    def test_gradient_centered_strided_out(self):
+
+        for ndim in [1, 2, 3]:
+            dims = self.random_state.randint(30, 51, size=ndim)
+            arr = self.random_state.randn(*dims)
+            crop = tuple(slice(5, dim-5) for dim in dims)
+
+            # Write into views of larger, pre-allocated arrays
+            grads_full = [np.zeros(dims) for _ in range(ndim)]
+            gmag_full = np.zeros(dims)
+            out = ([g[crop] for g in grads_full], gmag_full[crop])
+
+            mg.gradient_centered(arr[crop], out=out)
+            grads, gmag = mg.gradient_centered(arr[crop].copy())
+
+            for i in range(ndim):
+                self.assertTrue((grads_full[i][crop] == grads[i]).all())
+                grads_full[i][crop] = 0
+                self.assertTrue((grads_full[i] == 0).all())
+
+            self.assertTrue((gmag_full[crop] == gmag).all())
+
+    def test_gradient_magnitude_osher_sethian_strided(self):
+
+        arr = self.random_state.randn(141, 112)
+        nu = self.random_state.randn(141, 112)
+        dx = self.random_state.rand(2)
+
+        crop = (slice(10, 100), slice(100, 20, -3))
+        out = np.zeros((141, 112))
+
+        gmag = mg.gradient_magnitude_osher_sethian(
+            arr[crop], nu[crop], dx=dx, out=out[crop])
+        gmag_true = self.manual_gmag_os(
+            arr[crop].copy(), nu[crop].copy(), dx)
+
+        self.assertIs(gmag.base, out)
+        self.assertLessEqual(np.abs(gmag - gmag_true).mean(), 1e-8)
+        self.assertLessEqual(np.abs(out[crop] - gmag_true).mean(), 1e-8)
+
+    def test_bad_out(self):
+
+        arr = self.random_state.randn(20, 30)
+
+        with self.assertRaises(ValueError):
+            mg.gradient_magnitude_osher_sethian(
+                arr, arr, out=np.zeros((20, 31)))
+
+        with self.assertRaises(ValueError):
+            mg.gradient_magnitude_osher_sethian(
+                arr, arr, out=np.zeros((20, 30), dtype=np.float32))
+
+    def test_gradient_centered_batch(self):
+
+        for ndim in [1, 2, 3]:
+            batch_size = 4
+            dims = self.random_state.randint(20, 41, size=ndim)
+            arrs = self.random_state.randn(batch_size, *dims)
+            masks = self.random_state.randn(batch_size, *dims) > 0
+            dx = self.random_state.rand(batch_size, ndim)
+
+            grads, gmag = mg.gradient_centered_batch(arrs, masks, dx=dx)
+
+            for i in range(batch_size):
+                grads_i, gmag_i = mg.gradient_centered(
+                    arrs[i], mask=masks[i], dx=dx[i])
+
+                for axis in range(ndim):
+                    self.assertTrue((grads[axis][i] == grads_i[axis]).all())
+                self.assertTrue((gmag[i] == gmag_i).all())
+
+    def test_gradient_magnitude_osher_sethian_batch(self):
+
+        for ndim in [1, 2, 3]:
+            batch_size = 3
+            dims = self.random_state.randint(20, 41, size=ndim)
+            arrs = self.random_state.randn(batch_size, *dims)
+            nus = self.random_state.randn(batch_size, *dims)
+            masks = self.random_state.randn(batch_size, *dims) > 0
+            dx = self.random_state.rand(ndim)
+
+            gmag = mg.gradient_magnitude_osher_sethian_batch(
+                arrs, nus, masks=masks, dx=dx)
+
+            for i in range(batch_size):
+                gmag_i = mg.gradient_magnitude_osher_sethian(
+                    arrs[i], nus[i], mask=masks[i], dx=dx)
+                self.assertTrue((gmag[i] == gmag_i).all())
+
+    def test_batch_dx_mismatch(self):
+
+        arrs = self.random_state.randn(3, 10, 12)
+
+        with self.assertRaises(ValueError):
+            mg.gradient_centered_batch(arrs, dx=np.ones((2, 2)))
+
+    def test_curvature_circle(self):
+
+        x, dx = np.linspace(-2, 2, 301, retstep=True)
+        y, dy = np.linspace(-2, 2, 401, retstep=True)
+        xx, yy = np.meshgrid(x, y, indexing='ij')
+        rr = np.sqrt(xx**2 + yy**2)
+
+        # A narrow band signed distance to the unit circle with junk
+        # values outside of the band
+        dist = 1 - rr
+        mask = np.abs(dist) < 0.1
+        dist[~mask] = 0
+
+        kappa = mg.curvature(dist, mask=mask, dx=[dx, dy])
+
+        # Only check the points whose stencils lie entirely in the band
+        inner = np.abs(1 - rr) < 0.05
+        error = np.abs(kappa - 1 / rr)[inner]
+
+        self.assertLessEqual(error.max(), 1e-3)
+        self.assertTrue((kappa[~mask] == 0).all())
+
+    def test_curvature_sphere(self):
+
+        x, dx = np.linspace(-2, 2, 101, retstep=True)
+        y, dy = np.linspace(-2, 2, 121, retstep=True)
+        z, dz = np.linspace(-2, 2, 81, retstep=True)
+        xx, yy, zz = np.meshgrid(x, y, z, indexing='ij')
+        rr = np.sqrt(xx**2 + yy**2 + zz**2)
+
+        dist = 1 - rr
+        mask = np.abs(dist) < 0.25
+        dist[~mask] = 0
+
+        kappa = mg.curvature(dist, mask=mask, dx=[dx, dy, dz])
+
+        inner = np.abs(1 - rr) < 0.1
+        error = np.abs(kappa - 2 / rr)[inner]
+
+        self.assertLessEqual(error.max(), 1e-2)
+
+    def test_curvature_bad_ndim(self):
+
+        with self.assertRaises(ValueError):
+            mg.curvature(self.random_state.randn(10))
@@ -1,3 +1,17 @@
-# flake8: noqa
-from .provided.ball import BallInitializer, RandomBallInitializer, ThresholdBallInitializer
-from .provided.threshold import ThresholdInitializer
+""" Level set initializers. The provided initializers are imported on first
+access; see :mod:`lsml` for the rationale.
+"""
+from lsml.util.lazy import lazy_names
+
+
+# Maps the public names to the modules defining them
+_lazy_names = {
+    'BallInitializer': 'lsml.initializer.provided.ball',
+    'RandomBallInitializer': 'lsml.initializer.provided.ball',
+    'ThresholdBallInitializer': 'lsml.initializer.provided.ball',
+    'ThresholdInitializer': 'lsml.initializer.provided.threshold',
+}
+
+__all__ = list(_lazy_names)
+
+__getattr__, __dir__ = lazy_names(__name__, _lazy_names)
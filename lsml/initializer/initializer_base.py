@@ -3,7 +3,7 @@ import abc
 import numpy
 
 from lsml.util.distance_transform import (
-    distance_transform)
+    SKFMM_ENGINE, distance_transform)
 
 
 class InitializerBase(abc.ABC):
@@ -16,10 +16,12 @@ class InitializerBase(abc.ABC):
         """
         pass
 
-    def __call__(self, img, band=0, dx=None, seed=None):
+    def __call__(self, img, band=0, dx=None, seed=None, engine=SKFMM_ENGINE):
         """ The __call__ function handles input validation, etc. This
         function is used internally and calls the user-implemented
-        `initializer` member function.
+        `initializer` member function. The signed distance transform of
+        the initial level set is computed with the distance `engine` (see
+        :func:`lsml.util.distance_transform.distance_transform`).
         """
         # Validate the delta terms
         if dx is None:
@@ -56,7 +58,8 @@ class InitializerBase(abc.ABC):
         u = 2 * init_mask.astype(numpy.float) - 1
 
         # Compute the distance transform
-        dist, mask = distance_transform(arr=u, band=band, dx=dx)
+        dist, mask = distance_transform(
+            arr=u, band=band, dx=dx, engine=engine)
 
         return u, dist, mask
 
@@ -1,4 +1,3 @@
-import skfmm
 import numpy as np
 
 from scipy.ndimage import gaussian_filter1d as gf1d
@@ -6,6 +5,7 @@ from skimage.measure import label
 
 from lsml.initializer.initializer_base import InitializerBase
 from lsml.initializer.provided.util import radii_from_mask as rfm
+from lsml.util.distance_transform import SKFMM_ENGINE, distance_transform
 
 
 class RayTrimInitializer(InitializerBase):
@@ -88,7 +88,8 @@ class RayTrimInitializer(InitializerBase):
         # Compute phis.
         self.phis = np.arccos(self.X[:, 2])
 
-    def __call__(self, img, band, dx=None, seed=None, only_seg=False):
+    def __call__(self, img, band, dx=None, seed=None, only_seg=False,
+                 engine=SKFMM_ENGINE):
         """
         `seed` should not account for `dx`, i.e., it should be provided
         in "index" coordinates (although fractional coordinates are allowed).
@@ -154,12 +155,6 @@ class RayTrimInitializer(InitializerBase):
         u0 = B.astype(np.float)
         u0 *= 2; u0 -= 1
 
-        dist = skfmm.distance(u0, narrow=band, dx=dx)
-
-        if hasattr(dist, 'mask'):
-            mask = ~dist.mask
-            dist = dist.data
-        else:
-            mask = np.ones(img.shape, dtype=np.bool)
+        dist, mask = distance_transform(u0, band=band, dx=dx, engine=engine)
 
         return u0, dist, mask
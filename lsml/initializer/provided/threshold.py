@@ -1,6 +1,3 @@
-from scipy.ndimage import gaussian_filter
-from skimage.filters.thresholding import threshold_otsu
-
 from lsml.initializer.initializer_base import (
     InitializerBase)
 
@@ -25,6 +22,8 @@ class ThresholdInitializer(InitializerBase):
         self.sigma = sigma
 
     def initialize(self, img, dx, seed):
+        from scipy.ndimage import gaussian_filter
+        from skimage.filters.thresholding import threshold_otsu
 
         if self.sigma == 0:
             blur = img.copy()
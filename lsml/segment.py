@@ -0,0 +1,217 @@
+""" Segment a dataset of images with a fitted model from the command line.
+
+The input is either an hdf5 file in the layout written by
+:class:`lsml.core.datasets_handler.DatasetsHandler` or a directory of
+`.npy` images. The final masks (and scores, when ground-truth
+segmentations are available) are written to an hdf5 file with one group
+per image key::
+
+    key
+    |_ mask
+    |_ attrs
+       |_ score (if a segmentation is available)
+
+Images whose groups are already complete in the output file are skipped,
+so an interrupted run can be resumed by running the same command again.
+
+The model is either exported (see
+:meth:`lsml.LevelSetMachineLearning.export_for_inference`), which is
+self-contained, or saved by `fit`, whose regression models are read from
+the `regression-models` directory next to the model file (where `fit`
+writes them when run from the model's directory).
+
+Example
+-------
+::
+
+    python -m lsml.segment LSML-model.pkl dataset.h5 masks.h5 --workers 4
+
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import h5py
+import numpy
+
+
+MASK_KEY = 'mask'
+SCORE_ATTR = 'score'
+COMPLETE_ATTR = 'complete'
+
+
+def load_model(filename):
+    """ Load a saved or exported model, with the regression models of a
+    saved model read from the directory of `filename` into memory
+    """
+    from lsml import LevelSetMachineLearning
+
+    model = LevelSetMachineLearning.load(filename)
+
+    handler = getattr(model, 'fit_job_handler', None)
+    if handler is not None and not handler.regression_models:
+        handler.load_regression_models(
+            dirname=os.path.dirname(os.path.abspath(filename)))
+
+    return model
+
+
+def iterate_inputs(path, dx=None, skip=()):
+    """ Yields `(key, img, dx, seg)` for the images at `path`, which is an
+    hdf5 file in the `DatasetsHandler` layout or a directory of `.npy`
+    images. `seg` is None when no segmentation is available. The `dx`
+    argument (default: ones) is used for `.npy` images. The images whose
+    keys are in `skip` are not read.
+    """
+    from lsml.core.datasets_handler import IMAGE_KEY, SEGMENTATION_KEY
+
+    if os.path.isdir(path):
+        for filename in sorted(os.listdir(path)):
+            key = os.path.splitext(filename)[0]
+            if not filename.endswith('.npy') or key in skip:
+                continue
+            img = numpy.load(os.path.join(path, filename))
+            dx_ = numpy.ones(img.ndim) if dx is None else numpy.asarray(dx)
+            yield key, img, dx_, None
+        return
+
+    with h5py.File(path, mode='r') as hf:
+        for key in sorted(hf.keys()):
+            if key in skip:
+                continue
+            group = hf[key]
+            seg = None
+            if SEGMENTATION_KEY in group:
+                seg = group[SEGMENTATION_KEY][...]
+            yield key, group[IMAGE_KEY][...], group.attrs['dx'], seg
+
+
+def completed_keys(output):
+    """ Returns the set of image keys that are complete in the output file
+    """
+    if not os.path.exists(output):
+        return set()
+
+    with h5py.File(output, mode='r') as hf:
+        return {key for key in hf.keys()
+                if hf[key].attrs.get(COMPLETE_ATTR, False)}
+
+
+def _segment_all(model, inputs, workers, segment_kwargs):
+    """ Yields `(key, u, seg)` for the `inputs` as they are segmented
+    """
+    if workers == 1:
+        for key, img, dx, seg in inputs:
+            u = model.segment(img, dx=dx, verbose=False, keep='final',
+                              **segment_kwargs)
+            yield key, u, seg
+        return
+
+    # Only the keys and segmentations are held here; the images are
+    # consumed lazily by the worker pool
+    keys, segs = [], []
+
+    def images():
+        for key, img, dx, seg in inputs:
+            keys.append(key)
+            segs.append(seg)
+            yield img, dx
+
+    images_, dxs = _unzip(images())
+
+    results = model.segment_many(
+        images_, dx=dxs, n_workers=workers, ordered=False, **segment_kwargs)
+
+    for index, u in results:
+        yield keys[index], u, segs[index]
+        segs[index] = None
+
+
+def _unzip(pairs):
+    """ Lazily split an iterable of pairs into two iterables
+    """
+    first, second = itertools.tee(pairs)
+    return (a for a, _ in first), (b for _, b in second)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Segment a dataset with a fitted lsml model")
+    parser.add_argument('model',
+                        help="Filename of the saved (or exported) model")
+    parser.add_argument('input',
+                        help="An hdf5 file in the DatasetsHandler layout or "
+                             "a directory of .npy images")
+    parser.add_argument('output', help="Filename of the output hdf5 file")
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help="Number of worker processes")
+    parser.add_argument('--dx', type=float, nargs='+', default=None,
+                        help="Delta terms for .npy images (default: ones)")
+    parser.add_argument('--all-iterations', action='store_true',
+                        help="Iterate over all regression models rather "
+                             "than up to the validation maximum")
+    parser.add_argument('--convergence-tol', type=float, default=None,
+                        help="Stop once the max band update is below this")
+    parser.add_argument('--velocity-tol', type=float, default=None,
+                        help="Stop once the max band velocity is below this")
+    parser.add_argument('--substeps', type=int, default=None,
+                        help="Level set updates per velocity prediction "
+                             "(default: as fit)")
+    parser.add_argument('--chunk-size', type=int, default=64,
+                        help="Edge length of the output mask chunks")
+    args = parser.parse_args(argv)
+
+    model = load_model(args.model)
+
+    segment_kwargs = {
+        'iterate_until_validation_max': not args.all_iterations,
+        'convergence_tol': args.convergence_tol,
+        'velocity_tol': args.velocity_tol,
+        'substeps': args.substeps,
+    }
+
+    done = completed_keys(args.output)
+    if done:
+        print("Skipping {} completed images".format(len(done)))
+
+    inputs = iterate_inputs(args.input, dx=args.dx, skip=done)
+
+    start = time.time()
+    n_done = 0
+
+    with h5py.File(args.output, mode='a') as hf:
+        for key, u, seg in _segment_all(
+                model, inputs, args.workers, segment_kwargs):
+
+            if key in hf:
+                # Incomplete output from an interrupted run
+                del hf[key]
+
+            group = hf.create_group(key)
+            chunks = tuple(min(n, args.chunk_size) for n in u.shape)
+            group.create_dataset(MASK_KEY, data=u > 0, chunks=chunks,
+                                 compression='gzip')
+
+            message = "{}".format(key)
+            if seg is not None:
+                score = model.scorer(u, seg)
+                group.attrs[SCORE_ATTR] = score
+                message += " score={:.4f}".format(score)
+
+            # Marked complete last, so that partial writes are redone
+            group.attrs[COMPLETE_ATTR] = True
+            hf.flush()
+
+            n_done += 1
+            print(message)
+
+    elapsed = time.time() - start
+    print("Segmented {} images in {:.1f}s".format(n_done, elapsed))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
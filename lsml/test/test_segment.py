@@ -0,0 +1,121 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import h5py
+import numpy as np
+
+from lsml.core.test.test_fit_job_handler import fit_model
+from lsml.segment import (
+    COMPLETE_ATTR, MASK_KEY, SCORE_ATTR, iterate_inputs, load_model, main)
+
+
+class TestSegment(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        model_dir = os.path.join(cls.tmp_dir.name, 'model')
+        os.mkdir(model_dir)
+
+        # The fit writes the model, its regression models and the hdf5
+        # dataset to `model_dir`
+        cls.model, cls.imgs = fit_model(
+            model_dir, n_examples=10, max_iters=2)
+        cls.model_filename = os.path.join(model_dir, 'LSML-model.pkl')
+        cls.dataset_filename = os.path.join(model_dir, 'dataset.h5')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def run_main(self, argv):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(0, main(argv))
+        return output.getvalue()
+
+    def segment(self, img):
+        return self.model.segment(img, verbose=False, keep='final')
+
+    def test_load_model(self):
+        # The regression models are found next to the model file, rather
+        # than in the working directory
+        model = load_model(self.model_filename)
+
+        self.assertEqual(2, len(model.fit_job_handler.regression_models))
+        np.testing.assert_array_equal(
+            self.segment(self.imgs[0]) > 0,
+            model.segment(self.imgs[0], verbose=False, keep='final') > 0)
+
+    def test_hdf5_input(self):
+
+        output_filename = os.path.join(self.tmp_dir.name, 'hdf5-masks.h5')
+        argv = [self.model_filename, self.dataset_filename, output_filename]
+
+        self.run_main(argv)
+
+        with h5py.File(self.dataset_filename, mode='r') as df, \
+                h5py.File(output_filename, mode='r') as hf:
+
+            self.assertEqual(sorted(df.keys()), sorted(hf.keys()))
+
+            for key in df.keys():
+                img = df[key]['image'][...]
+                seg = df[key]['segmentation'][...]
+                mask = hf[key][MASK_KEY][...]
+
+                np.testing.assert_array_equal(self.segment(img) > 0, mask)
+                self.assertAlmostEqual(
+                    self.model.scorer(self.segment(img), seg),
+                    hf[key].attrs[SCORE_ATTR])
+                self.assertTrue(hf[key].attrs[COMPLETE_ATTR])
+
+        # A second run skips the completed images
+        output = self.run_main(argv)
+        self.assertIn("Skipping 10 completed images", output)
+        self.assertIn("Segmented 0 images", output)
+
+    def test_npy_input(self):
+
+        input_dir = os.path.join(self.tmp_dir.name, 'npy-images')
+        os.mkdir(input_dir)
+        for i, img in enumerate(self.imgs[:3]):
+            np.save(os.path.join(input_dir, 'img-{:d}.npy'.format(i)), img)
+
+        output_filename = os.path.join(self.tmp_dir.name, 'npy-masks.h5')
+        argv = [self.model_filename, input_dir, output_filename,
+                '--workers', '2', '--dx', '1', '1']
+
+        self.run_main(argv)
+
+        with h5py.File(output_filename, mode='r') as hf:
+            self.assertEqual(['img-0', 'img-1', 'img-2'], sorted(hf.keys()))
+
+            for i, img in enumerate(self.imgs[:3]):
+                group = hf['img-{:d}'.format(i)]
+                np.testing.assert_array_equal(
+                    self.segment(img) > 0, group[MASK_KEY][...])
+                # There are no segmentations to score against
+                self.assertNotIn(SCORE_ATTR, group.attrs)
+                self.assertTrue(group.attrs[COMPLETE_ATTR])
+
+        # The completed images are not read again
+        with mock.patch('lsml.segment.numpy.load') as load:
+            output = self.run_main(argv)
+        load.assert_not_called()
+        self.assertIn("Skipping 3 completed images", output)
+        self.assertIn("Segmented 0 images", output)
+
+    def test_iterate_inputs_skip(self):
+
+        with h5py.File(self.dataset_filename, mode='r') as hf:
+            all_keys = sorted(hf.keys())
+
+        keys = [key for key, _, _, _ in iterate_inputs(
+            self.dataset_filename, skip=set(all_keys[:2]))]
+
+        self.assertEqual(all_keys[2:], keys)
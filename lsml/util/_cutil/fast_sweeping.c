@@ -0,0 +1,189 @@
+/*
+ * Fast sweeping
+ * -------------
+ * Routines for computing the (unsigned) distance to the zero level set of
+ * an array by the fast sweeping method [1] with anisotropic grid spacing.
+ *
+ * Points adjacent to the zero level set are initialized from the linearly
+ * interpolated location of the zero crossings and are then held fixed.
+ * All other points are initialized to `cap` and are updated by Gauss-Seidel
+ * sweeps of the Godunov upwind discretization of |Du| = 1 in one of the
+ * 2^ndim alternating orderings. Since the values only ever decrease, the
+ * results of sweeps in different orderings (started from the same values)
+ * can be combined by taking the pointwise minimum [2], which allows the
+ * orderings to be swept in parallel.
+ *
+ * All arrays are C-contiguous of shape (m, n, p); two dimensional arrays
+ * are passed with p = 1.
+ *
+ * [1]: Zhao, Hongkai. "A fast sweeping method for eikonal equations."
+ *      Mathematics of computation 74.250 (2005): 603-627.
+ *
+ * [2]: Zhao, Hongkai. "Parallel implementations of the fast sweeping
+ *      method." Journal of Computational Mathematics (2007): 421-429.
+ */
+#include <stdbool.h>
+#include <math.h>
+
+
+static inline int fs_index(int i, int j, int k, int n, int p) {
+    return (i*n + j)*p + k;
+}
+
+
+/*
+ * The distance along one axis from the point with value u0 to the
+ * interpolated zero crossing towards the neighbor with value u1, or
+ * INFINITY if there is no crossing.
+ */
+static inline double fs_crossing(double u0, double u1, double h) {
+    if (u0 == 0) return 0;
+    if ((u0 > 0) == (u1 > 0)) return INFINITY;
+    return h * u0 / (u0 - u1);
+}
+
+
+int fs_initialize3d(int m, int n, int p, double * u, double * d,
+                    bool * frozen, double deli, double delj, double delk,
+                    double cap) {
+    int l, n_frozen = 0;
+    double di, dj, dk, s;
+
+    for(int i=0; i < m; i++) {
+        for(int j=0; j < n; j++) {
+            for(int k=0; k < p; k++) {
+                l = fs_index(i, j, k, n, p);
+
+                di = dj = dk = INFINITY;
+
+                if (i > 0)
+                    di = fmin(di, fs_crossing(u[l], u[l-n*p], deli));
+                if (i < m-1)
+                    di = fmin(di, fs_crossing(u[l], u[l+n*p], deli));
+                if (j > 0)
+                    dj = fmin(dj, fs_crossing(u[l], u[l-p], delj));
+                if (j < n-1)
+                    dj = fmin(dj, fs_crossing(u[l], u[l+p], delj));
+                if (k > 0)
+                    dk = fmin(dk, fs_crossing(u[l], u[l-1], delk));
+                if (k < p-1)
+                    dk = fmin(dk, fs_crossing(u[l], u[l+1], delk));
+
+                if (u[l] == 0 || di == 0 || dj == 0 || dk == 0) {
+                    d[l] = 0;
+                    frozen[l] = true;
+                    n_frozen++;
+                }
+                else if (isfinite(di) || isfinite(dj) || isfinite(dk)) {
+                    // The distance to the plane through the crossings
+                    s = 0;
+                    if (isfinite(di)) s += 1.0 / (di*di);
+                    if (isfinite(dj)) s += 1.0 / (dj*dj);
+                    if (isfinite(dk)) s += 1.0 / (dk*dk);
+                    d[l] = 1.0 / sqrt(s);
+                    frozen[l] = true;
+                    n_frozen++;
+                }
+                else {
+                    d[l] = cap;
+                    frozen[l] = false;
+                }
+            }
+        }
+    }
+
+    return n_frozen;
+}
+
+
+/*
+ * Solves the Godunov discretization at a point given the smallest neighbor
+ * value `a[r]` along each of the `ndim` axes with spacing `h[r]`.
+ */
+static double fs_solve(int ndim, double * a, double * h) {
+    double t, A, B, C, x, disc;
+
+    // Insertion sort on the neighbor values
+    for(int r=1; r < ndim; r++) {
+        for(int s=r; s > 0 && a[s] < a[s-1]; s--) {
+            t = a[s]; a[s] = a[s-1]; a[s-1] = t;
+            t = h[s]; h[s] = h[s-1]; h[s-1] = t;
+        }
+    }
+
+    if (!isfinite(a[0])) return INFINITY;
+
+    x = a[0] + h[0];
+    A = B = C = 0;
+
+    for(int r=0; r < ndim; r++) {
+        if (x <= a[r]) break;
+
+        A += 1.0 / (h[r]*h[r]);
+        B += a[r] / (h[r]*h[r]);
+        C += a[r]*a[r] / (h[r]*h[r]);
+
+        disc = B*B - A*(C - 1);
+        if (disc < 0) break;
+        x = (B + sqrt(disc)) / A;
+    }
+
+    return x;
+}
+
+
+double fs_sweep3d(int m, int n, int p, double * d, bool * frozen,
+                  double deli, double delj, double delk, int direction) {
+    int i, j, k, l, ndim;
+    double a[3], h[3], x, change = 0;
+
+    int i0 = (direction & 1) ? m-1 : 0, si = (direction & 1) ? -1 : 1;
+    int j0 = (direction & 2) ? n-1 : 0, sj = (direction & 2) ? -1 : 1;
+    int k0 = (direction & 4) ? p-1 : 0, sk = (direction & 4) ? -1 : 1;
+
+    for(int ii=0; ii < m; ii++) {
+        i = i0 + si*ii;
+        for(int jj=0; jj < n; jj++) {
+            j = j0 + sj*jj;
+            for(int kk=0; kk < p; kk++) {
+                k = k0 + sk*kk;
+                l = fs_index(i, j, k, n, p);
+
+                if (frozen[l]) continue;
+
+                ndim = 0;
+                if (m > 1) {
+                    a[ndim] = fmin(i > 0 ? d[l-n*p] : INFINITY,
+                                   i < m-1 ? d[l+n*p] : INFINITY);
+                    h[ndim++] = deli;
+                }
+                if (n > 1) {
+                    a[ndim] = fmin(j > 0 ? d[l-p] : INFINITY,
+                                   j < n-1 ? d[l+p] : INFINITY);
+                    h[ndim++] = delj;
+                }
+                if (p > 1) {
+                    a[ndim] = fmin(k > 0 ? d[l-1] : INFINITY,
+                                   k < p-1 ? d[l+1] : INFINITY);
+                    h[ndim++] = delk;
+                }
+
+                if (ndim == 0) continue;
+
+                // The solution is larger than the smallest neighbor value
+                x = a[0];
+                for(int r=1; r < ndim; r++) x = fmin(x, a[r]);
+                if (x >= d[l]) continue;
+
+                x = fs_solve(ndim, a, h);
+
+                if (x < d[l]) {
+                    change = fmax(change, d[l] - x);
+                    d[l] = x;
+                }
+            }
+        }
+    }
+
+    return change;
+}
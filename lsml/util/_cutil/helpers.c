@@ -8,6 +8,7 @@
 #define C_HELPERS
 
 #include <stdlib.h>
+#include <stddef.h>
 
 #define PI    3.14159265358979311599796346854419
 #define TWOPI 6.28318530717958623199592693708837
@@ -52,6 +53,18 @@ int inline mi2d(int i, int j, int m, int n) {
     return n*i + j;
 }
 
+// Map the index (i,j,k) to the element offset into a (possibly
+// non-contiguous) 3D array view with element strides `s`.
+ptrdiff_t inline si3d(int i, int j, int k, const ptrdiff_t * s) {
+    return i*s[0] + j*s[1] + k*s[2];
+}
+
+// Map the index (i,j) to the element offset into a (possibly
+// non-contiguous) 2D array view with element strides `s`.
+ptrdiff_t inline si2d(int i, int j, const ptrdiff_t * s) {
+    return i*s[0] + j*s[1];
+}
+
 
 // Simple math functions.
 double inline max(double a, double b) { return a < b ? b : a; }
@@ -2,6 +2,11 @@
  * Masked gradient
  * ---------------
  * Routines for computing gradients over masked regions.
+ *
+ * Every array argument is followed by its element strides (i.e., the numpy
+ * byte strides divided by the item size) so that arbitrary views, such as
+ * a cropped sub-volume `A[i0:i1, j0:j1, k0:k1]`, can be read from and
+ * written to without first being copied into a contiguous buffer.
  */
 #include <stdio.h>
 #include <stdlib.h>
@@ -10,197 +15,229 @@
 #include "helpers.c"
 
 
-void gradient_centered3d(int m, int n, int p, double * A, bool * mask,
-                         double * di, double * dj, double * dk, double * gmag,
+void gradient_centered3d(int m, int n, int p,
+                         double * A, ptrdiff_t * sA,
+                         bool * mask, ptrdiff_t * smask,
+                         double * di, ptrdiff_t * sdi,
+                         double * dj, ptrdiff_t * sdj,
+                         double * dk, ptrdiff_t * sdk,
+                         double * gmag, ptrdiff_t * sgmag,
                          double deli, double delj, double delk,
                          int normalize) {
-    int l;
+    ptrdiff_t l;
+    double gi, gj, gk, g;
 
     for(int i=0; i < m; i++) {
         for(int j=0; j < n; j++) {
             for(int k=0; k < p; k++) {
-                l = mi3d(i,j,k,m,n,p);
+                if (!mask[si3d(i,j,k,smask)]) continue;
 
-                if (!mask[l]) continue;
+                l = si3d(i,j,k,sA);
 
                 if (i == 0) {
-                    di[l] = A[mi3d(i+1,j,k,m,n,p)] - A[l];
+                    gi = A[si3d(i+1,j,k,sA)] - A[l];
                 }
                 else if (i == m-1) {
-                    di[l] = A[l] - A[mi3d(i-1,j,k,m,n,p)];
+                    gi = A[l] - A[si3d(i-1,j,k,sA)];
                 }
                 else {
-                    di[l] = 0.5*(A[mi3d(i+1,j,k,m,n,p)] -\
-                                 A[mi3d(i-1,j,k,m,n,p)]);
+                    gi = 0.5*(A[si3d(i+1,j,k,sA)] -\
+                              A[si3d(i-1,j,k,sA)]);
                 }
 
                 // Gradient along j axes.
                 if (j == 0) {
-                    dj[l] = A[mi3d(i,j+1,k,m,n,p)] - A[l];
+                    gj = A[si3d(i,j+1,k,sA)] - A[l];
                 }
                 else if (j == n-1) {
-                    dj[l] = A[l] - A[mi3d(i,j-1,k,m,n,p)];
+                    gj = A[l] - A[si3d(i,j-1,k,sA)];
                 }
                 else {
-                    dj[l] = 0.5*(A[mi3d(i,j+1,k,m,n,p)] -\
-                                 A[mi3d(i,j-1,k,m,n,p)]);
+                    gj = 0.5*(A[si3d(i,j+1,k,sA)] -\
+                              A[si3d(i,j-1,k,sA)]);
                 }
 
                 // Gradient along k axes.
                 if (k == 0) {
-                    dk[l] = A[mi3d(i,j,k+1,m,n,p)] - A[l];
+                    gk = A[si3d(i,j,k+1,sA)] - A[l];
                 }
                 else if (k == p-1) {
-                    dk[l] = A[l] - A[mi3d(i,j,k-1,m,n,p)];
+                    gk = A[l] - A[si3d(i,j,k-1,sA)];
                 }
                 else {
-                    dk[l] = 0.5*(A[mi3d(i,j,k+1,m,n,p)] -\
-                                 A[mi3d(i,j,k-1,m,n,p)]);
+                    gk = 0.5*(A[si3d(i,j,k+1,sA)] -\
+                              A[si3d(i,j,k-1,sA)]);
                 }
 
-                di[l] = di[l] / deli;
-                dj[l] = dj[l] / delj;
-                dk[l] = dk[l] / delk;
+                gi = gi / deli;
+                gj = gj / delj;
+                gk = gk / delk;
 
-                gmag[l] = sqrt(sqr(di[l]) + sqr(dj[l]) + sqr(dk[l]));
+                g = sqrt(sqr(gi) + sqr(gj) + sqr(gk));
 
-                if (normalize == 1 && gmag[l] > 0) {
-                    di[l] /= gmag[l];
-                    dj[l] /= gmag[l];
-                    dk[l] /= gmag[l];
+                if (normalize == 1 && g > 0) {
+                    gi /= g;
+                    gj /= g;
+                    gk /= g;
                 }
+
+                di[si3d(i,j,k,sdi)] = gi;
+                dj[si3d(i,j,k,sdj)] = gj;
+                dk[si3d(i,j,k,sdk)] = gk;
+                gmag[si3d(i,j,k,sgmag)] = g;
             } // End k loop.
         } // End j loop.
     } // End i loop.
 }
 
-void gradient_centered2d(int m, int n, double * A, bool * mask,
-                         double * di, double * dj, double * gmag,
+void gradient_centered2d(int m, int n,
+                         double * A, ptrdiff_t * sA,
+                         bool * mask, ptrdiff_t * smask,
+                         double * di, ptrdiff_t * sdi,
+                         double * dj, ptrdiff_t * sdj,
+                         double * gmag, ptrdiff_t * sgmag,
                          double deli, double delj,
                          int normalize) {
-    int l;
+    ptrdiff_t l;
+    double gi, gj, g;
 
     for(int i=0; i < m; i++) {
         for(int j=0; j < n; j++) {
-            l = mi2d(i,j,m,n);
+            if (!mask[si2d(i,j,smask)]) continue;
 
-            if (!mask[l]) continue;
+            l = si2d(i,j,sA);
 
             if (i == 0) {
-                di[l] = A[mi2d(i+1,j,m,n)] - A[l];
+                gi = A[si2d(i+1,j,sA)] - A[l];
             }
             else if (i == m-1) {
-                di[l] = A[l] - A[mi2d(i-1,j,m,n)];
+                gi = A[l] - A[si2d(i-1,j,sA)];
             }
             else {
-                di[l] = 0.5*(A[mi2d(i+1,j,m,n)] -\
-                             A[mi2d(i-1,j,m,n)]);
+                gi = 0.5*(A[si2d(i+1,j,sA)] -\
+                          A[si2d(i-1,j,sA)]);
             }
 
             // Gradient along j axes.
             if (j == 0) {
-                dj[l] = A[mi2d(i,j+1,m,n)] - A[l];
+                gj = A[si2d(i,j+1,sA)] - A[l];
             }
             else if (j == n-1) {
-                dj[l] = A[l] - A[mi2d(i,j-1,m,n)];
+                gj = A[l] - A[si2d(i,j-1,sA)];
             }
             else {
-                dj[l] = 0.5*(A[mi2d(i,j+1,m,n)] -\
-                             A[mi2d(i,j-1,m,n)]);
+                gj = 0.5*(A[si2d(i,j+1,sA)] -\
+                          A[si2d(i,j-1,sA)]);
             }
 
-            di[l] = di[l] / deli;
-            dj[l] = dj[l] / delj;
+            gi = gi / deli;
+            gj = gj / delj;
 
-            gmag[l] = sqrt(sqr(di[l]) + sqr(dj[l]));
+            g = sqrt(sqr(gi) + sqr(gj));
 
-            if (normalize == 1 && gmag[l] > 0) {
-                di[l] /= gmag[l];
-                dj[l] /= gmag[l];
+            if (normalize == 1 && g > 0) {
+                gi /= g;
+                gj /= g;
             }
+
+            di[si2d(i,j,sdi)] = gi;
+            dj[si2d(i,j,sdj)] = gj;
+            gmag[si2d(i,j,sgmag)] = g;
         } // End j loop.
     } // End i loop.
 }
 
-void gradient_centered1d(int m, double * A, bool * mask,
-                         double * di, double * gmag,
+void gradient_centered1d(int m,
+                         double * A, ptrdiff_t * sA,
+                         bool * mask, ptrdiff_t * smask,
+                         double * di, ptrdiff_t * sdi,
+                         double * gmag, ptrdiff_t * sgmag,
                          double deli,
                          int normalize) {
+    double gi, g;
+
     for(int i=0; i < m; i++) {
-        if (!mask[i]) continue;
+        if (!mask[i*smask[0]]) continue;
 
         if (i == 0) {
-            di[i] = A[i+1] - A[i];
+            gi = A[(i+1)*sA[0]] - A[i*sA[0]];
         }
         else if (i == m-1) {
-            di[i] = A[i] - A[i-1];
+            gi = A[i*sA[0]] - A[(i-1)*sA[0]];
         }
         else {
-            di[i] = 0.5*(A[i+1] - A[i-1]);
+            gi = 0.5*(A[(i+1)*sA[0]] - A[(i-1)*sA[0]]);
         }
 
-        di[i] = di[i] / deli;
+        gi = gi / deli;
 
-        gmag[i] = (di[i] > 0) ? di[i] : -di[i];
+        g = (gi > 0) ? gi : -gi;
 
-        if (normalize == 1 && gmag[i] > 0) {
-            di[i] /= gmag[i];
+        if (normalize == 1 && g > 0) {
+            gi /= g;
         }
+
+        di[i*sdi[0]] = gi;
+        gmag[i*sgmag[0]] = g;
     } // End i loop.
 }
 
-void gmag_os3d(int m, int n, int p, double * A, bool * mask,
-               double * nu, double * gmag,
+void gmag_os3d(int m, int n, int p,
+               double * A, ptrdiff_t * sA,
+               bool * mask, ptrdiff_t * smask,
+               double * nu, ptrdiff_t * snu,
+               double * gmag, ptrdiff_t * sgmag,
                double deli, double delj, double delk) {
-    int l;
+    ptrdiff_t l;
     double fi,fj,fk,bi,bj,bk;
 
     for(int i=0; i < m; i++) {
         for(int j=0; j < n; j++) {
             for(int k=0; k < p; k++) {
 
-                l = mi3d(i,j,k,m,n,p);
-                if (!mask[l]) continue;
+                if (!mask[si3d(i,j,k,smask)]) continue;
+
+                l = si3d(i,j,k,sA);
 
                 if (i == 0) {
-                    fi = A[mi3d(i+1,j,k,m,n,p)] - A[l];
+                    fi = A[si3d(i+1,j,k,sA)] - A[l];
                     bi = fi;
                 }
                 else if (i == m-1) {
-                    bi = A[l] - A[mi3d(i-1,j,k,m,n,p)];
+                    bi = A[l] - A[si3d(i-1,j,k,sA)];
                     fi = bi;
                 }
                 else {
-                    fi = A[mi3d(i+1,j,k,m,n,p)] - A[l];
-                    bi = A[l] - A[mi3d(i-1,j,k,m,n,p)];
+                    fi = A[si3d(i+1,j,k,sA)] - A[l];
+                    bi = A[l] - A[si3d(i-1,j,k,sA)];
                 }
 
                 // Gradient along j axes.
                 if (j == 0) {
-                    fj = A[mi3d(i,j+1,k,m,n,p)] - A[l];
+                    fj = A[si3d(i,j+1,k,sA)] - A[l];
                     bj = fj;
                 }
                 else if (j == n-1) {
-                    bj = A[l] - A[mi3d(i,j-1,k,m,n,p)];
+                    bj = A[l] - A[si3d(i,j-1,k,sA)];
                     fj = bj;
                 }
                 else {
-                    fj = A[mi3d(i,j+1,k,m,n,p)] - A[l];
-                    bj = A[l] - A[mi3d(i,j-1,k,m,n,p)];
+                    fj = A[si3d(i,j+1,k,sA)] - A[l];
+                    bj = A[l] - A[si3d(i,j-1,k,sA)];
                 }
 
                 // Gradient along k axes.
                 if (k == 0) {
-                    fk = A[mi3d(i,j,k+1,m,n,p)] - A[l];
+                    fk = A[si3d(i,j,k+1,sA)] - A[l];
                     bk = fk;
                 }
                 else if (k == p-1) {
-                    bk = A[l] - A[mi3d(i,j,k-1,m,n,p)];
+                    bk = A[l] - A[si3d(i,j,k-1,sA)];
                     fk = bk;
                 }
                 else {
-                    fk = A[mi3d(i,j,k+1,m,n,p)] - A[l];
-                    bk = A[l] - A[mi3d(i,j,k-1,m,n,p)];
+                    fk = A[si3d(i,j,k+1,sA)] - A[l];
+                    bk = A[l] - A[si3d(i,j,k-1,sA)];
                 }
 
                 fi = fi/deli;
@@ -210,58 +247,64 @@ void gmag_os3d(int m, int n, int p, double * A, bool * mask,
                 fk = fk/delk;
                 bk = bk/delk;
 
-                if (nu[l] < 0) {
-                    gmag[l] = sqrt(sqr(max(bi,0)) + sqr(min(fi,0)) + \
-                                   sqr(max(bj,0)) + sqr(min(fj,0)) + \
-                                   sqr(max(bk,0)) + sqr(min(fk,0)));
+                if (nu[si3d(i,j,k,snu)] < 0) {
+                    gmag[si3d(i,j,k,sgmag)] = sqrt(
+                        sqr(max(bi,0)) + sqr(min(fi,0)) + \
+                        sqr(max(bj,0)) + sqr(min(fj,0)) + \
+                        sqr(max(bk,0)) + sqr(min(fk,0)));
                 }
                 else {
-                    gmag[l] = sqrt(sqr(min(bi,0)) + sqr(max(fi,0)) + \
-                                   sqr(min(bj,0)) + sqr(max(fj,0)) + \
-                                   sqr(min(bk,0)) + sqr(max(fk,0)));
+                    gmag[si3d(i,j,k,sgmag)] = sqrt(
+                        sqr(min(bi,0)) + sqr(max(fi,0)) + \
+                        sqr(min(bj,0)) + sqr(max(fj,0)) + \
+                        sqr(min(bk,0)) + sqr(max(fk,0)));
                 } // End if speed.
             } // End k loop.
         } // End j loop.
     } // End i loop.
 }
 
-void gmag_os2d(int m, int n, double * A, bool * mask,
-               double * nu, double * gmag,
+void gmag_os2d(int m, int n,
+               double * A, ptrdiff_t * sA,
+               bool * mask, ptrdiff_t * smask,
+               double * nu, ptrdiff_t * snu,
+               double * gmag, ptrdiff_t * sgmag,
                double deli, double delj) {
-    int l;
+    ptrdiff_t l;
     double fi,fj,bi,bj;
 
     for(int i=0; i < m; i++) {
         for(int j=0; j < n; j++) {
-            l = mi2d(i,j,m,n);
 
-            if (!mask[l]) continue;
+            if (!mask[si2d(i,j,smask)]) continue;
+
+            l = si2d(i,j,sA);
 
             if (i == 0) {
-                fi = A[mi2d(i+1,j,m,n)] - A[l];
+                fi = A[si2d(i+1,j,sA)] - A[l];
                 bi = fi;
             }
             else if (i == m-1) {
-                bi = A[l] - A[mi2d(i-1,j,m,n)];
+                bi = A[l] - A[si2d(i-1,j,sA)];
                 fi = bi;
             }
             else {
-                fi = A[mi2d(i+1,j,m,n)] - A[l];
-                bi = A[l] - A[mi2d(i-1,j,m,n)];
+                fi = A[si2d(i+1,j,sA)] - A[l];
+                bi = A[l] - A[si2d(i-1,j,sA)];
             }
 
             // Gradient along j axes.
             if (j == 0) {
-                fj = A[mi2d(i,j+1,m,n)] - A[l];
+                fj = A[si2d(i,j+1,sA)] - A[l];
                 bj = fj;
             }
             else if (j == n-1) {
-                bj = A[l] - A[mi2d(i,j-1,m,n)];
+                bj = A[l] - A[si2d(i,j-1,sA)];
                 fj = bj;
             }
             else {
-                fj = A[mi2d(i,j+1,m,n)] - A[l];
-                bj = A[l] - A[mi2d(i,j-1,m,n)];
+                fj = A[si2d(i,j+1,sA)] - A[l];
+                bj = A[l] - A[si2d(i,j-1,sA)];
             }
 
             fi = fi/deli;
@@ -269,47 +312,300 @@ void gmag_os2d(int m, int n, double * A, bool * mask,
             fj = fj/delj;
             bj = bj/delj;
 
-            if (nu[l] < 0) {
-                gmag[l] = sqrt(sqr(max(bi,0)) + sqr(min(fi,0)) + \
-                               sqr(max(bj,0)) + sqr(min(fj,0)));
+            if (nu[si2d(i,j,snu)] < 0) {
+                gmag[si2d(i,j,sgmag)] = sqrt(
+                    sqr(max(bi,0)) + sqr(min(fi,0)) + \
+                    sqr(max(bj,0)) + sqr(min(fj,0)));
             }
             else {
-                gmag[l] = sqrt(sqr(min(bi,0)) + sqr(max(fi,0)) + \
-                               sqr(min(bj,0)) + sqr(max(fj,0)));
+                gmag[si2d(i,j,sgmag)] = sqrt(
+                    sqr(min(bi,0)) + sqr(max(fi,0)) + \
+                    sqr(min(bj,0)) + sqr(max(fj,0)));
             } // End if speed.
         } // End j loop.
     } // End i loop.
 }
 
-void gmag_os1d(int m, double * A, bool * mask,
-               double * nu, double * gmag,
+void gmag_os1d(int m,
+               double * A, ptrdiff_t * sA,
+               bool * mask, ptrdiff_t * smask,
+               double * nu, ptrdiff_t * snu,
+               double * gmag, ptrdiff_t * sgmag,
                double deli) {
     double fi,bi;
 
     for(int i=0; i < m; i++) {
-        if (!mask[i]) continue;
+        if (!mask[i*smask[0]]) continue;
 
         if (i == 0) {
-            fi = A[i+1] - A[i];
+            fi = A[(i+1)*sA[0]] - A[i*sA[0]];
             bi = fi;
         }
         else if (i == m-1) {
-            bi = A[i] - A[i-1];
+            bi = A[i*sA[0]] - A[(i-1)*sA[0]];
             fi = bi;
         }
         else {
-            fi = A[i+1] - A[i];
-            bi = A[i] - A[i-1];
+            fi = A[(i+1)*sA[0]] - A[i*sA[0]];
+            bi = A[i*sA[0]] - A[(i-1)*sA[0]];
         }
 
         fi = fi/deli;
         bi = bi/deli;
 
-        if (nu[i] < 0) {
-            gmag[i] = sqrt(sqr(max(bi,0)) + sqr(min(fi,0)));
+        if (nu[i*snu[0]] < 0) {
+            gmag[i*sgmag[0]] = sqrt(sqr(max(bi,0)) + sqr(min(fi,0)));
         }
         else {
-            gmag[i] = sqrt(sqr(min(bi,0)) + sqr(max(fi,0)));
+            gmag[i*sgmag[0]] = sqrt(sqr(min(bi,0)) + sqr(max(fi,0)));
         } // End if speed.
     } // End i loop.
 }
+
+
+/*
+ * Batched variants
+ * ----------------
+ * These operate on stacks of same-shape arrays, shape `(b,) + shape`, with
+ * one set of delta terms per example; `dx` is shape `(b, ndim)` and
+ * C-contiguous. The strides arguments have length `ndim+1` with the stride
+ * along the batch axis first.
+ */
+
+void gradient_centered3d_batch(int b, int m, int n, int p,
+                               double * A, ptrdiff_t * sA,
+                               bool * mask, ptrdiff_t * smask,
+                               double * di, ptrdiff_t * sdi,
+                               double * dj, ptrdiff_t * sdj,
+                               double * dk, ptrdiff_t * sdk,
+                               double * gmag, ptrdiff_t * sgmag,
+                               double * dx, int normalize) {
+    for(int ib=0; ib < b; ib++) {
+        gradient_centered3d(m, n, p,
+                            A + ib*sA[0], sA+1,
+                            mask + ib*smask[0], smask+1,
+                            di + ib*sdi[0], sdi+1,
+                            dj + ib*sdj[0], sdj+1,
+                            dk + ib*sdk[0], sdk+1,
+                            gmag + ib*sgmag[0], sgmag+1,
+                            dx[3*ib], dx[3*ib+1], dx[3*ib+2],
+                            normalize);
+    }
+}
+
+void gradient_centered2d_batch(int b, int m, int n,
+                               double * A, ptrdiff_t * sA,
+                               bool * mask, ptrdiff_t * smask,
+                               double * di, ptrdiff_t * sdi,
+                               double * dj, ptrdiff_t * sdj,
+                               double * gmag, ptrdiff_t * sgmag,
+                               double * dx, int normalize) {
+    for(int ib=0; ib < b; ib++) {
+        gradient_centered2d(m, n,
+                            A + ib*sA[0], sA+1,
+                            mask + ib*smask[0], smask+1,
+                            di + ib*sdi[0], sdi+1,
+                            dj + ib*sdj[0], sdj+1,
+                            gmag + ib*sgmag[0], sgmag+1,
+                            dx[2*ib], dx[2*ib+1],
+                            normalize);
+    }
+}
+
+void gradient_centered1d_batch(int b, int m,
+                               double * A, ptrdiff_t * sA,
+                               bool * mask, ptrdiff_t * smask,
+                               double * di, ptrdiff_t * sdi,
+                               double * gmag, ptrdiff_t * sgmag,
+                               double * dx, int normalize) {
+    for(int ib=0; ib < b; ib++) {
+        gradient_centered1d(m,
+                            A + ib*sA[0], sA+1,
+                            mask + ib*smask[0], smask+1,
+                            di + ib*sdi[0], sdi+1,
+                            gmag + ib*sgmag[0], sgmag+1,
+                            dx[ib],
+                            normalize);
+    }
+}
+
+void gmag_os3d_batch(int b, int m, int n, int p,
+                     double * A, ptrdiff_t * sA,
+                     bool * mask, ptrdiff_t * smask,
+                     double * nu, ptrdiff_t * snu,
+                     double * gmag, ptrdiff_t * sgmag,
+                     double * dx) {
+    for(int ib=0; ib < b; ib++) {
+        gmag_os3d(m, n, p,
+                  A + ib*sA[0], sA+1,
+                  mask + ib*smask[0], smask+1,
+                  nu + ib*snu[0], snu+1,
+                  gmag + ib*sgmag[0], sgmag+1,
+                  dx[3*ib], dx[3*ib+1], dx[3*ib+2]);
+    }
+}
+
+void gmag_os2d_batch(int b, int m, int n,
+                     double * A, ptrdiff_t * sA,
+                     bool * mask, ptrdiff_t * smask,
+                     double * nu, ptrdiff_t * snu,
+                     double * gmag, ptrdiff_t * sgmag,
+                     double * dx) {
+    for(int ib=0; ib < b; ib++) {
+        gmag_os2d(m, n,
+                  A + ib*sA[0], sA+1,
+                  mask + ib*smask[0], smask+1,
+                  nu + ib*snu[0], snu+1,
+                  gmag + ib*sgmag[0], sgmag+1,
+                  dx[2*ib], dx[2*ib+1]);
+    }
+}
+
+void gmag_os1d_batch(int b, int m,
+                     double * A, ptrdiff_t * sA,
+                     bool * mask, ptrdiff_t * smask,
+                     double * nu, ptrdiff_t * snu,
+                     double * gmag, ptrdiff_t * sgmag,
+                     double * dx) {
+    for(int ib=0; ib < b; ib++) {
+        gmag_os1d(m,
+                  A + ib*sA[0], sA+1,
+                  mask + ib*smask[0], smask+1,
+                  nu + ib*snu[0], snu+1,
+                  gmag + ib*sgmag[0], sgmag+1,
+                  dx[ib]);
+    }
+}
+
+
+/*
+ * Curvature
+ * ---------
+ * The curvature of the level sets of `A`, computed as
+ *
+ *     kappa = -div( DA / |DA| ),
+ *
+ * so that, for `A` positive inside a circle (sphere) of radius r, kappa is
+ * 1/r (2/r). Only points inside of `mask` are read from or written to:
+ * derivative stencils that would reach outside of the mask (or the array)
+ * fall back to one-sided differences, or are set to zero for the second
+ * derivative terms, so the cost is proportional to the number of points
+ * in the mask (e.g., a narrow band).
+ */
+
+bool inline in_mask3d(int i, int j, int k, int m, int n, int p,
+                      bool * mask, ptrdiff_t * smask) {
+    if (!check_bounds(i, j, k, m, n, p)) return false;
+    return mask[si3d(i,j,k,smask)];
+}
+
+// First and second derivatives of A at (i,j,k) along the axis given
+// by the index offsets (a,b,c) and delta term h.
+void inline derivs3d(int i, int j, int k, int a, int b, int c,
+                     int m, int n, int p, double * A, ptrdiff_t * sA,
+                     bool * mask, ptrdiff_t * smask, double h,
+                     double * d1, double * d2) {
+    bool fwd = in_mask3d(i+a, j+b, k+c, m, n, p, mask, smask);
+    bool bck = in_mask3d(i-a, j-b, k-c, m, n, p, mask, smask);
+    double a0 = A[si3d(i,j,k,sA)];
+
+    if (fwd && bck) {
+        double af = A[si3d(i+a,j+b,k+c,sA)];
+        double ab = A[si3d(i-a,j-b,k-c,sA)];
+        *d1 = 0.5*(af - ab) / h;
+        *d2 = (af - 2*a0 + ab) / (h*h);
+    }
+    else if (fwd) {
+        *d1 = (A[si3d(i+a,j+b,k+c,sA)] - a0) / h;
+        *d2 = 0;
+    }
+    else if (bck) {
+        *d1 = (a0 - A[si3d(i-a,j-b,k-c,sA)]) / h;
+        *d2 = 0;
+    }
+    else {
+        *d1 = 0;
+        *d2 = 0;
+    }
+}
+
+// Mixed second derivative of A at (i,j,k) along the two axes given by
+// index offsets (a1,b1,c1) and (a2,b2,c2) with delta terms h1 and h2.
+double inline mixed3d(int i, int j, int k,
+                      int a1, int b1, int c1, int a2, int b2, int c2,
+                      int m, int n, int p, double * A, ptrdiff_t * sA,
+                      bool * mask, ptrdiff_t * smask, double h1, double h2) {
+    int ipp = i+a1+a2, jpp = j+b1+b2, kpp = k+c1+c2;
+    int ipm = i+a1-a2, jpm = j+b1-b2, kpm = k+c1-c2;
+    int imp = i-a1+a2, jmp = j-b1+b2, kmp = k-c1+c2;
+    int imm = i-a1-a2, jmm = j-b1-b2, kmm = k-c1-c2;
+
+    if (!in_mask3d(ipp, jpp, kpp, m, n, p, mask, smask) ||
+        !in_mask3d(ipm, jpm, kpm, m, n, p, mask, smask) ||
+        !in_mask3d(imp, jmp, kmp, m, n, p, mask, smask) ||
+        !in_mask3d(imm, jmm, kmm, m, n, p, mask, smask)) {
+        return 0;
+    }
+
+    return (A[si3d(ipp,jpp,kpp,sA)] - A[si3d(ipm,jpm,kpm,sA)] -
+            A[si3d(imp,jmp,kmp,sA)] + A[si3d(imm,jmm,kmm,sA)]) / (4*h1*h2);
+}
+
+void curvature3d(int m, int n, int p,
+                 double * A, ptrdiff_t * sA,
+                 bool * mask, ptrdiff_t * smask,
+                 double * kappa, ptrdiff_t * skappa,
+                 double deli, double delj, double delk) {
+    double ai, aj, ak, aii, ajj, akk, aij, aik, ajk, g2;
+
+    for(int i=0; i < m; i++) {
+        for(int j=0; j < n; j++) {
+            for(int k=0; k < p; k++) {
+                if (!mask[si3d(i,j,k,smask)]) continue;
+
+                derivs3d(i, j, k, 1, 0, 0, m, n, p, A, sA, mask, smask,
+                         deli, &ai, &aii);
+                derivs3d(i, j, k, 0, 1, 0, m, n, p, A, sA, mask, smask,
+                         delj, &aj, &ajj);
+                derivs3d(i, j, k, 0, 0, 1, m, n, p, A, sA, mask, smask,
+                         delk, &ak, &akk);
+
+                aij = mixed3d(i, j, k, 1, 0, 0, 0, 1, 0, m, n, p,
+                              A, sA, mask, smask, deli, delj);
+                aik = mixed3d(i, j, k, 1, 0, 0, 0, 0, 1, m, n, p,
+                              A, sA, mask, smask, deli, delk);
+                ajk = mixed3d(i, j, k, 0, 1, 0, 0, 0, 1, m, n, p,
+                              A, sA, mask, smask, delj, delk);
+
+                g2 = sqr(ai) + sqr(aj) + sqr(ak);
+
+                if (g2 == 0) {
+                    kappa[si3d(i,j,k,skappa)] = 0;
+                    continue;
+                }
+
+                kappa[si3d(i,j,k,skappa)] = -(
+                    (ajj + akk)*sqr(ai) +
+                    (aii + akk)*sqr(aj) +
+                    (aii + ajj)*sqr(ak) -
+                    2*ai*aj*aij - 2*ai*ak*aik - 2*aj*ak*ajk
+                ) / (g2*sqrt(g2));
+            } // End k loop.
+        } // End j loop.
+    } // End i loop.
+}
+
+void curvature2d(int m, int n,
+                 double * A, ptrdiff_t * sA,
+                 bool * mask, ptrdiff_t * smask,
+                 double * kappa, ptrdiff_t * skappa,
+                 double deli, double delj) {
+    // A 2D array is a 3D array with a singleton third axis, for which all
+    // of the third axis derivative terms vanish.
+    ptrdiff_t sA3[3] = {sA[0], sA[1], 0};
+    ptrdiff_t smask3[3] = {smask[0], smask[1], 0};
+    ptrdiff_t skappa3[3] = {skappa[0], skappa[1], 0};
+
+    curvature3d(m, n, 1, A, sA3, mask, smask3, kappa, skappa3,
+                deli, delj, 1.0);
+}
@@ -0,0 +1,105 @@
+""" Bounding boxes ("crops") of the narrow band, over which the
+per-iteration computations (features, level set updates and
+reinitialization) run in place of the full arrays
+
+A box is a tuple of slices with explicit bounds. The crop box of a level
+set holds the narrow band, padded by the number of points that the
+computations reach beyond the band points, and every point where the
+level set is positive (for the global shape features). Since the level set
+only changes at the band points, the box only grows (with a margin, so
+that it is not grown at every iteration) as the front moves.
+"""
+import numpy
+
+
+def bounding_box(mask, margins=0):
+    """ Returns the bounding box of the True values of `mask`, padded by
+    `margins` (a scalar or one value per axis) and clipped to the array
+    bounds, or None if `mask` is all False
+    """
+    margins = numpy.broadcast_to(margins, (mask.ndim,))
+    box = []
+
+    for axis in range(mask.ndim):
+        other_axes = tuple(a for a in range(mask.ndim) if a != axis)
+        indices = numpy.flatnonzero(mask.any(axis=other_axes))
+
+        if indices.size == 0:
+            return None
+
+        start = max(indices[0] - margins[axis], 0)
+        stop = min(indices[-1] + margins[axis] + 1, mask.shape[axis])
+        box.append(slice(int(start), int(stop)))
+
+    return tuple(box)
+
+
+def union(box, other):
+    """ Returns the bounding box of the boxes `box` and `other`, either of
+    which may be None (i.e., empty)
+    """
+    if box is None:
+        return other
+    if other is None:
+        return box
+
+    return tuple(slice(min(a.start, b.start), max(a.stop, b.stop))
+                 for a, b in zip(box, other))
+
+
+def contains(box, other):
+    """ Returns True if the box `other` lies within `box`
+    """
+    return all(a.start <= b.start and b.stop <= a.stop
+               for a, b in zip(box, other))
+
+
+def origin(box, dx):
+    """ Returns the position of the first point of `box` (in the units of
+    the delta terms `dx`)
+    """
+    return numpy.array([s.start for s in box]) * numpy.asarray(dx)
+
+
+def grow_crop_box(box, narrow_band, padding, margins, arr=None):
+    """ Returns the crop box for the `narrow_band`, given the current crop
+    box `box` (None if there is none yet)
+
+    Parameters
+    ----------
+    box: tuple of slices
+        The current crop box, or None to create one, in which case the
+        level set values `arr` must be provided
+
+    narrow_band: NarrowBand
+        The (non-empty) narrow band
+
+    padding: numpy.ndarray, dtype=int
+        The number of points along each axis that the box must extend
+        beyond the band points
+
+    margins: numpy.ndarray, dtype=int
+        The number of points along each axis by which the box is grown
+        beyond the padding when the band no longer fits in it
+
+    arr: numpy.ndarray, default=None
+        The level set values, only used to create the box
+
+    Returns
+    -------
+    box: tuple of slices
+        `box` itself if the padded band lies within it; otherwise, a box
+        holding `box` and the band padded by `padding + margins`
+    """
+    if box is not None and contains(
+            box, narrow_band.bounding_box(padding)):
+        return box
+
+    grown = narrow_band.bounding_box(numpy.add(padding, margins))
+
+    if box is None:
+        # The level set only changes (and becomes positive) at band points
+        # thereafter, which stay within the box
+        box = bounding_box(arr > 0)
+
+    return union(box, grown)
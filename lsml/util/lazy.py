@@ -0,0 +1,38 @@
+""" Lazy imports of a package's public names (see PEP 562), so that
+importing the package does not load the dependencies of the modules
+defining them until they are used
+"""
+import importlib
+import sys
+
+
+def lazy_names(package, names):
+    """ Returns the module level `__getattr__` and `__dir__` functions for
+    `package` that import the public `names` on first access. Usage::
+
+        __getattr__, __dir__ = lazy_names(__name__, {
+            'InferenceModel': 'lsml.core.inference',
+        })
+
+    Parameters
+    ----------
+    package: str
+        The name of the package, i.e., its `__name__`
+
+    names: dict
+        Maps the public names to the modules defining them
+    """
+    def __getattr__(name):
+        if name in names:
+            value = getattr(importlib.import_module(names[name]), name)
+            # Cache the value so that __getattr__ is not called again
+            setattr(sys.modules[package], name, value)
+            return value
+
+        msg = "module {!r} has no attribute {!r}"
+        raise AttributeError(msg.format(package, name))
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package])) | set(names))
+
+    return __getattr__, __dir__
@@ -0,0 +1,201 @@
+import numpy
+
+
+class NarrowBand:
+    """ A sparse representation of the narrow band of a level set function:
+    the flat (C-order) indices of the points in the band, the signed
+    distances at those points, and the shape of the full array.
+
+    The dense signed distance and boolean mask arrays are only built when
+    requested (and are then cached), so that the band points never have to
+    be rediscovered by scanning a full-size mask.
+    """
+    def __init__(self, indices, distances, shape, outside=0.0):
+        """
+        Parameters
+        ----------
+        indices: numpy.ndarray, dtype=int
+            The sorted flat indices of the points in the narrow band
+
+        distances: numpy.ndarray, dtype=float, same shape as `indices`
+            The signed distances at the points in the narrow band
+
+        shape: tuple
+            The shape of the full array
+
+        outside: float, default=0.0
+            The value of the dense signed distance array outside of the
+            band (e.g., +/- inf when the zero level set has vanished)
+        """
+        self.indices = numpy.asarray(indices, dtype=numpy.intp)
+        self.distances = numpy.asarray(distances, dtype=numpy.float)
+        self.shape = tuple(shape)
+        self.outside = float(outside)
+
+        if self.indices.shape != self.distances.shape:
+            msg = "`indices` shape {} does not match `distances` shape {}"
+            raise ValueError(msg.format(
+                self.indices.shape, self.distances.shape))
+
+        self._dist = None
+        self._mask = None
+
+    @classmethod
+    def from_dense(cls, dist, mask):
+        """ Create the narrow band from dense signed distance and boolean
+        mask arrays (e.g., as returned by
+        :func:`lsml.util.distance_transform.distance_transform`)
+        """
+        indices = numpy.flatnonzero(mask)
+
+        outside = 0.0
+        if indices.size < mask.size:
+            # Any point outside of the band holds the outside value
+            outside = dist.flat[numpy.argmin(mask.ravel())]
+
+        narrow_band = cls(indices=indices, distances=dist.ravel()[indices],
+                          shape=mask.shape, outside=outside)
+
+        narrow_band._dist = dist
+        narrow_band._mask = mask
+
+        return narrow_band
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        """ The number of points in the narrow band
+        """
+        return self.indices.size
+
+    def __len__(self):
+        return self.size
+
+    def any(self):
+        """ Returns True if the narrow band is not empty
+        """
+        return self.size > 0
+
+    @property
+    def mask(self):
+        """ The (cached) dense boolean mask of the narrow band
+        """
+        if self._mask is None:
+            mask = numpy.zeros(self.shape, dtype=numpy.bool)
+            mask.ravel()[self.indices] = True
+            self._mask = mask
+        return self._mask
+
+    @property
+    def dist(self):
+        """ The (cached) dense signed distance array, holding the value
+        `outside` at points outside of the band
+        """
+        if self._dist is None:
+            self._dist = self.to_dense(self.distances, fill=self.outside)
+        return self._dist
+
+    def to_dense(self, values, fill=0.0):
+        """ Returns a dense array of `shape` (plus any trailing axes of
+        `values`), holding `values[i]` at the i'th band point and `fill`
+        elsewhere
+        """
+        values = numpy.asarray(values)
+        dense = numpy.full(self.shape + values.shape[1:], fill,
+                           dtype=numpy.result_type(values, fill))
+        self.scatter(dense, values)
+        return dense
+
+    def gather(self, arr, out=None):
+        """ Returns the values of the dense array `arr` (of `shape`, plus
+        any trailing axes) at the band points, i.e., `arr[mask]`. If `out`
+        is provided, the values are written into it instead.
+        """
+        flat = arr.reshape((-1,) + arr.shape[self.ndim:])
+        if out is None:
+            return flat[self.indices]
+        return numpy.take(flat, self.indices, axis=0, out=out)
+
+    def scatter(self, arr, values):
+        """ Writes `values` at the band points of the (C-contiguous) dense
+        array `arr` in place, i.e., `arr[mask] = values`
+        """
+        if not arr.flags.c_contiguous:
+            raise ValueError("`arr` must be C-contiguous")
+        arr.reshape((-1,) + arr.shape[self.ndim:])[self.indices] = values
+
+    def coordinates(self):
+        """ Returns the tuple of index arrays of the band points along each
+        axis (as from `numpy.nonzero(mask)`)
+        """
+        return numpy.unravel_index(self.indices, self.shape)
+
+    def bounding_box(self, margins=0):
+        """ Returns the tuple of slices for the bounding box of the band
+        points, padded by `margins` (a scalar or one value per axis) and
+        clipped to the array bounds, or None if the band is empty
+        """
+        if not self.any():
+            return None
+
+        margins = numpy.broadcast_to(margins, (self.ndim,))
+        box = []
+
+        for axis, coordinates in enumerate(self.coordinates()):
+            start = max(coordinates.min() - margins[axis], 0)
+            stop = min(coordinates.max() + margins[axis] + 1,
+                       self.shape[axis])
+            box.append(slice(int(start), int(stop)))
+
+        return tuple(box)
+
+    def subset(self, selection):
+        """ Returns the narrow band restricted to the band points selected
+        by `selection` (a boolean array or integer indices into the band
+        points)
+        """
+        return NarrowBand(indices=self.indices[selection],
+                          distances=self.distances[selection],
+                          shape=self.shape, outside=self.outside)
+
+    def crop(self, box):
+        """ Returns the narrow band of the sub-array `box` (a tuple of
+        slices with explicit bounds, e.g., from :meth:`bounding_box`) of
+        the full array, which must hold all of the band points. The band
+        points keep their order.
+        """
+        shape = tuple(s.stop - s.start for s in box)
+        coordinates = tuple(c - s.start
+                            for c, s in zip(self.coordinates(), box))
+
+        return NarrowBand(indices=numpy.ravel_multi_index(coordinates, shape),
+                          distances=self.distances, shape=shape,
+                          outside=self.outside)
+
+    def uncrop(self, box, shape):
+        """ Returns the narrow band of an array of `shape` from this narrow
+        band of its sub-array `box`, i.e., the inverse of :meth:`crop`
+        """
+        coordinates = tuple(c + s.start
+                            for c, s in zip(self.coordinates(), box))
+
+        return NarrowBand(indices=numpy.ravel_multi_index(coordinates, shape),
+                          distances=self.distances, shape=shape,
+                          outside=self.outside)
+
+    @classmethod
+    def from_box(cls, dist_box, mask_box, box, shape, outside=0.0):
+        """ Create the narrow band of an array of `shape` from the dense
+        signed distance and mask arrays computed over the sub-array `box`
+        (a tuple of slices) of it
+        """
+        local = numpy.flatnonzero(mask_box)
+        coordinates = numpy.unravel_index(local, mask_box.shape)
+        coordinates = tuple(c + s.start for c, s in zip(coordinates, box))
+
+        return cls(indices=numpy.ravel_multi_index(coordinates, shape),
+                   distances=dist_box.ravel()[local], shape=shape,
+                   outside=outside)
@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+
+from lsml.util.crop import bounding_box, contains, grow_crop_box, union
+from lsml.util.distance_transform import distance_transform
+
+
+class TestBoxes(unittest.TestCase):
+
+    def test_bounding_box(self):
+        mask = np.zeros((10, 12), dtype=np.bool)
+        mask[3:5, 2:9] = True
+
+        self.assertEqual(bounding_box(mask), (slice(3, 5), slice(2, 9)))
+        self.assertEqual(bounding_box(mask, margins=[1, 3]),
+                         (slice(2, 6), slice(0, 12)))
+        self.assertIsNone(bounding_box(np.zeros((4, 4), dtype=np.bool)))
+
+    def test_union_contains(self):
+        box = (slice(2, 6), slice(0, 4))
+        other = (slice(4, 8), slice(1, 3))
+
+        self.assertEqual(union(box, other), (slice(2, 8), slice(0, 4)))
+        self.assertEqual(union(None, other), other)
+        self.assertTrue(contains(union(box, other), other))
+        self.assertFalse(contains(box, other))
+
+
+class TestGrowCropBox(unittest.TestCase):
+
+    def setUp(self):
+        ii, jj = np.indices((64, 64), dtype=np.float)
+        self.u = 5 - np.sqrt((ii - 20.3)**2 + (jj - 30.6)**2)
+        self.narrow_band = distance_transform(
+            self.u, band=3, dx=np.ones(2), return_band=True)
+        self.padding = np.array([4, 4])
+        self.margins = np.array([3, 3])
+
+    def test_new_box(self):
+        # A second (band-less) positive region is held by the box as well
+        self.u[50:52, 5:7] = 1
+
+        box = grow_crop_box(None, self.narrow_band, self.padding,
+                            self.margins, arr=self.u)
+
+        self.assertTrue(contains(
+            box, self.narrow_band.bounding_box(self.padding + self.margins)))
+        self.assertEqual(box[0].stop, 52)
+        self.assertEqual(box[1].start, 5)
+
+    def test_box_kept_until_band_leaves_it(self):
+        box = grow_crop_box(None, self.narrow_band, self.padding,
+                            self.margins, arr=self.u)
+
+        # The front moves by less than the margin
+        moved = distance_transform(
+            np.roll(self.u, 2, axis=1), band=3, dx=np.ones(2),
+            return_band=True)
+        self.assertIs(grow_crop_box(box, moved, self.padding, self.margins),
+                      box)
+
+        # ... and then by more than it
+        moved = distance_transform(
+            np.roll(self.u, 5, axis=1), band=3, dx=np.ones(2),
+            return_band=True)
+        grown = grow_crop_box(box, moved, self.padding, self.margins)
+
+        self.assertTrue(contains(grown, box))
+        self.assertTrue(contains(
+            grown, moved.bounding_box(self.padding + self.margins)))
@@ -1,9 +1,12 @@
 import unittest
 
 import numpy as np
+import skfmm
 
 from lsml.util.distance_transform import (
-    distance_transform)
+    Reinitializer, _get_sweep_executor, distance_transform,
+    distance_transform_incremental, fast_sweeping_distance)
+from lsml.util.narrow_band import NarrowBand
 
 
 class TestDistanceTransform(unittest.TestCase):
@@ -51,3 +54,211 @@ class TestDistanceTransform(unittest.TestCase):
 
         self.assertEqual(arr.size, mask.sum())
         self.assertTrue((dist == 0).all())
+
+
+class TestFastSweeping(unittest.TestCase):
+
+    def _ball(self, shape, dx, radius):
+        """ The level set (+1/-1 inside/outside) and exact signed distance
+        of a ball centered in the array
+        """
+        indices = np.indices(shape, dtype=np.float)
+        center = (np.array(shape) - 1) / 2.
+        dist = radius - np.sqrt(sum(
+            ((indices[i] - center[i]) * dx[i])**2
+            for i in range(len(shape))))
+        return np.where(dist > 0, 1.0, -1.0), dist
+
+    def test_1d(self):
+
+        arr = np.r_[-1, -1, 1, -1, -1.]
+        dist, mask = distance_transform(
+            arr, band=1, dx=[1.], engine='fast_sweeping')
+
+        true_dist = np.r_[0., -0.5, 0.5, -0.5, 0.]
+        true_mask = np.r_[False, True, True, True, False]
+
+        self.assertTrue((dist == true_dist).all())
+        self.assertTrue((mask == true_mask).all())
+
+    def test_accuracy(self):
+
+        for shape, dx in [((90, 100), np.r_[1.0, 1.0]),
+                          ((90, 100), np.r_[0.7, 1.3]),
+                          ((40, 45, 30), np.r_[1.0, 1.0, 2.0])]:
+            arr, true_dist = self._ball(shape, dx, radius=15)
+
+            skfmm_dist, skfmm_mask = distance_transform(
+                arr, band=3, dx=dx, engine='skfmm')
+            dist, mask = distance_transform(
+                arr, band=3, dx=dx, engine='fast_sweeping')
+
+            # The fast sweeping engine is first order and skfmm second
+            # order, and their narrow bands may differ at the band edge
+            both = mask & skfmm_mask
+            self.assertLessEqual((mask != skfmm_mask).sum(), 0.05 * both.sum())
+            self.assertLessEqual(
+                np.abs(dist - skfmm_dist)[both].mean(), 0.1 * dx.max())
+            self.assertLessEqual(
+                np.abs(dist - true_dist)[mask].mean(), 0.25 * dx.max())
+
+    def test_matches_first_order_skfmm(self):
+
+        for shape, dx in [((90, 100), np.r_[0.7, 1.3]),
+                          ((40, 45, 30), np.r_[1.0, 1.0, 2.0])]:
+            arr, _ = self._ball(shape, dx, radius=15)
+
+            dist, _ = fast_sweeping_distance(arr, band=0, dx=dx)
+            expected = skfmm.distance(arr, dx=dx, order=1)
+
+            np.testing.assert_allclose(dist, expected, atol=1e-8)
+
+    def test_narrow_band_matches_full(self):
+
+        dx = np.r_[1.0, 1.5]
+        arr, _ = self._ball((80, 60), dx, radius=20)
+
+        full_dist, full_mask = fast_sweeping_distance(arr, band=0, dx=dx)
+        dist, mask = fast_sweeping_distance(arr, band=3, dx=dx)
+
+        self.assertTrue(full_mask.all())
+        self.assertTrue((mask == (np.abs(full_dist) <= 3)).all())
+        np.testing.assert_allclose(dist[mask], full_dist[mask])
+
+    def test_threads_agree(self):
+
+        arr, _ = self._ball((30, 35, 40), np.ones(3), radius=10)
+
+        dist1, mask1 = fast_sweeping_distance(
+            arr, band=4, dx=np.ones(3), n_threads=1)
+        dist4, mask4 = fast_sweeping_distance(
+            arr, band=4, dx=np.ones(3), n_threads=4)
+
+        self.assertTrue((mask1 == mask4).all())
+        np.testing.assert_allclose(dist1, dist4, atol=1e-6)
+
+        # The thread pool is reused across calls
+        self.assertIs(_get_sweep_executor(4), _get_sweep_executor(4))
+
+    def test_all_positive(self):
+
+        dist, mask = distance_transform(
+            np.ones((4, 5, 6)), band=1, dx=np.ones(3),
+            engine='fast_sweeping')
+
+        self.assertEqual(0, mask.sum())
+        self.assertTrue((dist == np.inf).all())
+
+    def test_unknown_engine(self):
+
+        with self.assertRaises(ValueError):
+            distance_transform(np.ones(5), band=1, dx=[1.], engine='fmm')
+
+        with self.assertRaises(ValueError):
+            Reinitializer(engine='fmm')
+
+
+class TestReinitialization(unittest.TestCase):
+
+    def setUp(self):
+        self.random_state = np.random.RandomState(1234)
+        self.dx = np.r_[1.0, 1.5]
+        self.band = 3
+
+        # The level set is +1/-1 inside/outside of a disc of radius 12 in
+        # a large domain, as in the level sets evolved during fitting
+        ii, jj = np.indices((120, 80), dtype=np.float)
+        radius = np.sqrt(((ii - 40) * self.dx[0])**2 +
+                         ((jj - 30) * self.dx[1])**2)
+        self.u = np.where(radius < 12, 1.0, -1.0)
+        self.dist, self.mask = distance_transform(
+            self.u, band=self.band, dx=self.dx)
+
+    def _updated(self):
+        """ A level set update, which only changes values in the band
+        """
+        u = self.u.copy()
+        u[self.mask] += 0.9 * self.random_state.randn(self.mask.sum())
+        return u
+
+    def test_incremental_matches_full(self):
+
+        u = self._updated()
+
+        dist, mask = distance_transform(u, band=self.band, dx=self.dx)
+        dist_inc, mask_inc = distance_transform_incremental(
+            u, band=self.band, dx=self.dx, mask=self.mask)
+
+        self.assertTrue((mask == mask_inc).all())
+        np.testing.assert_allclose(dist_inc, dist)
+
+    def test_incremental_narrow_band(self):
+
+        u = self._updated()
+
+        dist, mask = distance_transform(u, band=self.band, dx=self.dx)
+        narrow_band = distance_transform_incremental(
+            u, band=self.band, dx=self.dx,
+            mask=NarrowBand.from_dense(self.dist, self.mask),
+            return_band=True)
+
+        self.assertIsInstance(narrow_band, NarrowBand)
+        self.assertTrue((narrow_band.mask == mask).all())
+        np.testing.assert_allclose(narrow_band.dist, dist)
+
+    def test_incremental_vanished(self):
+
+        # A small disc lies entirely within the narrow band
+        u = -np.ones((50, 50))
+        u[24:27, 24:27] = 1
+        _, mask = distance_transform(u, band=self.band, dx=self.dx)
+
+        u[mask] = -1
+
+        dist, mask = distance_transform_incremental(
+            u, band=self.band, dx=self.dx, mask=mask)
+
+        self.assertEqual(0, mask.sum())
+        self.assertTrue((dist == -np.inf).all())
+
+    def test_every(self):
+
+        reinitializer = Reinitializer(every=2)
+        u = self._updated()
+
+        # Skipped iteration returns the previous distance and mask
+        dist, mask = reinitializer(u, band=self.band, dx=self.dx,
+                                   dist=self.dist, mask=self.mask,
+                                   iteration=1)
+        self.assertIs(dist, self.dist)
+        self.assertIs(mask, self.mask)
+
+        dist, mask = reinitializer(u, band=self.band, dx=self.dx,
+                                   dist=self.dist, mask=self.mask,
+                                   iteration=2)
+        true_dist, _ = distance_transform(u, band=self.band, dx=self.dx)
+        np.testing.assert_allclose(dist, true_dist)
+
+    def test_travel_fraction(self):
+
+        reinitializer = Reinitializer(every=100, travel_fraction=0.5)
+        narrow_band = NarrowBand.from_dense(self.dist, self.mask)
+
+        # The front moves inward by less than half of the band
+        u = self.u.copy()
+        u[self.mask & (self.dist > 0) & (self.dist < 1)] = -1
+        self.assertFalse(reinitializer.should_reinitialize(
+            u, band=self.band, narrow_band=narrow_band, iteration=1))
+
+        # The front moves inward by more than half of the band
+        u[self.mask & (self.dist > 0) & (self.dist < 2)] = -1
+        self.assertTrue(reinitializer.should_reinitialize(
+            u, band=self.band, narrow_band=narrow_band, iteration=1))
+
+    def test_bad_parameters(self):
+
+        with self.assertRaises(ValueError):
+            Reinitializer(every=0)
+
+        with self.assertRaises(ValueError):
+            Reinitializer(travel_fraction=1.5)
@@ -0,0 +1,96 @@
+import unittest
+
+import numpy as np
+
+from lsml.util.distance_transform import distance_transform
+from lsml.util.narrow_band import NarrowBand
+
+
+class TestNarrowBand(unittest.TestCase):
+
+    def setUp(self):
+        ii, jj = np.indices((40, 30), dtype=np.float)
+        self.u = 8 - np.sqrt((ii - 20)**2 + (jj - 12)**2)
+        self.dist, self.mask = distance_transform(
+            self.u, band=3, dx=np.ones(2))
+
+    def test_from_dense(self):
+
+        narrow_band = NarrowBand.from_dense(self.dist, self.mask)
+
+        self.assertEqual(self.mask.sum(), narrow_band.size)
+        self.assertEqual(self.mask.shape, narrow_band.shape)
+        np.testing.assert_array_equal(self.dist[self.mask],
+                                      narrow_band.distances)
+
+    def test_dense_round_trip(self):
+
+        narrow_band = NarrowBand.from_dense(self.dist, self.mask)
+        sparse = NarrowBand(indices=narrow_band.indices,
+                            distances=narrow_band.distances,
+                            shape=narrow_band.shape)
+
+        np.testing.assert_array_equal(self.mask, sparse.mask)
+        np.testing.assert_array_equal(self.dist, sparse.dist)
+
+    def test_gather_scatter(self):
+
+        narrow_band = NarrowBand.from_dense(self.dist, self.mask)
+        random_state = np.random.RandomState(1234)
+
+        # Trailing axes are carried along
+        arr = random_state.randn(40, 30, 2)
+        np.testing.assert_array_equal(arr[self.mask], narrow_band.gather(arr))
+
+        out = np.zeros((40, 30))
+        narrow_band.scatter(out, narrow_band.distances)
+        np.testing.assert_array_equal(self.dist, out)
+
+        with self.assertRaises(ValueError):
+            narrow_band.scatter(out.T, narrow_band.distances)
+
+    def test_bounding_box(self):
+
+        narrow_band = NarrowBand.from_dense(self.dist, self.mask)
+        ii, jj = np.nonzero(self.mask)
+
+        box = narrow_band.bounding_box(margins=2)
+
+        self.assertEqual(box[0], slice(ii.min() - 2, ii.max() + 3))
+        self.assertEqual(box[1], slice(max(jj.min() - 2, 0), jj.max() + 3))
+
+        empty = NarrowBand(indices=[], distances=[], shape=(4, 4))
+        self.assertFalse(empty.any())
+        self.assertIsNone(empty.bounding_box())
+
+    def test_from_box(self):
+
+        box = (slice(5, 35), slice(0, 28))
+        dist_box, mask_box = distance_transform(
+            self.u[box], band=3, dx=np.ones(2))
+
+        narrow_band = NarrowBand.from_box(dist_box, mask_box, box,
+                                          shape=self.u.shape)
+
+        np.testing.assert_array_equal(self.mask, narrow_band.mask)
+        np.testing.assert_allclose(self.dist, narrow_band.dist)
+
+    def test_crop_uncrop(self):
+
+        narrow_band = NarrowBand.from_dense(self.dist, self.mask)
+        box = narrow_band.bounding_box(margins=1)
+
+        cropped = narrow_band.crop(box)
+
+        np.testing.assert_array_equal(self.mask[box], cropped.mask)
+        np.testing.assert_array_equal(self.dist[box], cropped.dist)
+
+        uncropped = cropped.uncrop(box, self.mask.shape)
+
+        np.testing.assert_array_equal(narrow_band.indices, uncropped.indices)
+        np.testing.assert_array_equal(narrow_band.distances,
+                                      uncropped.distances)
+
+    def test_mismatched_shapes(self):
+        with self.assertRaises(ValueError):
+            NarrowBand(indices=[0, 1], distances=[0.], shape=(2,))
@@ -0,0 +1,137 @@
+import unittest
+
+import numpy as np
+
+from lsml.gradient import masked_gradient as mg
+from lsml.util.distance_transform import distance_transform
+from lsml.util.semi_implicit import (
+    aos_update, reset_stale_values, solve_tridiagonal)
+
+
+class TestSolveTridiagonal(unittest.TestCase):
+
+    def test_matches_dense_solve(self):
+        random_state = np.random.RandomState(1234)
+        n, n_systems = 7, 5
+
+        lower = -random_state.rand(n, n_systems)
+        upper = -random_state.rand(n, n_systems)
+        diagonal = 1 - lower - upper
+        rhs = random_state.randn(n, n_systems)
+
+        solution = solve_tridiagonal(lower, diagonal, upper, rhs.copy())
+
+        for k in range(n_systems):
+            matrix = (np.diag(diagonal[:, k]) +
+                      np.diag(lower[1:, k], -1) +
+                      np.diag(upper[:-1, k], 1))
+            np.testing.assert_allclose(
+                solution[:, k], np.linalg.solve(matrix, rhs[:, k]))
+
+
+class TestAOSUpdate(unittest.TestCase):
+
+    def setUp(self):
+        ii, jj = np.indices((48, 48), dtype=np.float)
+        self.u = 12 - np.sqrt((ii - 24.2)**2 + (jj - 23.7)**2)
+        self.dx = np.ones(2)
+        self.narrow_band = distance_transform(
+            self.u, band=3, dx=self.dx, return_band=True)
+        self.velocity = self.narrow_band.to_dense(
+            np.ones(self.narrow_band.size))
+
+    def test_planar_front(self):
+        # The update of a planar distance function is exact, even for a
+        # step well beyond the CFL limit
+        _, jj = np.indices((16, 32), dtype=np.float)
+        u = 10.3 - jj
+        mask = np.abs(u) <= 3
+
+        u_next = aos_update(u, np.ones(u.shape), mask, step=2.0, dx=self.dx)
+
+        np.testing.assert_allclose(u_next[mask] - u[mask], 2.0)
+        np.testing.assert_array_equal(u_next[~mask], u[~mask])
+
+    def test_small_step_matches_explicit(self):
+        mask = self.narrow_band.mask
+        step = 0.1
+
+        u_next = aos_update(self.u, self.velocity, mask, step, self.dx)
+
+        gmag = mg.gradient_magnitude_osher_sethian(
+            arr=self.u, nu=self.velocity, mask=mask, dx=self.dx)
+        expected = step * gmag[mask]
+
+        np.testing.assert_allclose(u_next[mask] - self.u[mask], expected,
+                                   atol=0.02)
+
+    def test_large_step_bounded(self):
+        random_state = np.random.RandomState(1234)
+        u = self.u.copy()
+        step = 20.0
+
+        for _ in range(10):
+            narrow_band = distance_transform(u, band=3, dx=self.dx,
+                                             return_band=True)
+            reset_stale_values(u, narrow_band, self.dx)
+            mask = narrow_band.mask
+            velocity = np.where(mask, random_state.randn(*u.shape), 0)
+
+            u_next = aos_update(u, velocity, mask, step, self.dx)
+
+            # Each (M-matrix) system is bounded by its right hand side,
+            # whereas the explicit update with this step grows without
+            # bound over the iterations
+            differences = max(np.abs(np.diff(u, axis=axis)).max()
+                              for axis in range(u.ndim))
+            bound = u.ndim * step * np.abs(velocity).max() * differences
+            self.assertTrue(np.isfinite(u_next).all())
+            self.assertLessEqual(np.abs(u_next - u).max(), bound)
+
+            u = u_next
+
+    def test_out(self):
+        u = self.u.copy()
+        result = aos_update(u, self.velocity, self.narrow_band.mask,
+                            step=0.5, dx=self.dx, out=u)
+
+        self.assertIs(result, u)
+        np.testing.assert_array_equal(
+            u, aos_update(self.u, self.velocity, self.narrow_band.mask,
+                          step=0.5, dx=self.dx))
+
+    def test_curvature_shrinks_circle(self):
+        zero = np.zeros(self.u.shape)
+        u = self.u.copy()
+        step, n_steps = 2.0, 5
+
+        for _ in range(n_steps):
+            narrow_band = distance_transform(u, band=3, dx=self.dx,
+                                             return_band=True)
+            reset_stale_values(u, narrow_band, self.dx)
+            u = aos_update(u, zero, narrow_band.mask, step, self.dx,
+                           curvature=1.0)
+
+        # Under mean curvature flow, r^2 = r0^2 - 2 t
+        expected_area = np.pi * (12**2 - 2 * step * n_steps)
+        self.assertLess(abs((u > 0).sum() - expected_area),
+                        0.03 * expected_area)
+
+    def test_empty_mask(self):
+        mask = np.zeros(self.u.shape, dtype=np.bool)
+        np.testing.assert_array_equal(
+            aos_update(self.u, self.velocity, mask, 1.0, self.dx), self.u)
+
+    def test_reset_stale_values(self):
+        u = self.u.copy()
+        indices = self.narrow_band.indices
+
+        # Only the values far from the signed distance are reset
+        u.flat[indices[:5]] += 2.0
+        u.flat[indices[5:10]] += 0.1
+        expected = u.copy()
+        expected.flat[indices[:5]] = self.narrow_band.distances[:5]
+
+        reset_stale_values(u, self.narrow_band, self.dx)
+
+        np.testing.assert_allclose(u, expected)
@@ -0,0 +1,151 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from lsml.util.distance_transform import distance_transform
+from lsml.util.sparse_field import (
+    SparseFieldReinitializer, SparseFieldWorkspace, sparse_field_update)
+
+
+def ball(shape, dx, radius):
+    indices = np.indices(shape, dtype=np.float)
+    center = np.array(shape, dtype=np.float) / 2 + 0.3
+    slices = (slice(None),) + (None,) * len(shape)
+    coords = (indices - center[slices]) * np.asarray(dx)[slices]
+    return radius - np.sqrt((coords**2).sum(axis=0))
+
+
+class TestSparseFieldUpdate(unittest.TestCase):
+
+    def check_against_skfmm(self, shape, dx, max_error):
+        dx = np.asarray(dx, dtype=np.float)
+        band = 3 * dx.min()
+
+        u = ball(shape, dx, radius=8)
+        narrow_band = distance_transform(u, band=band, dx=dx,
+                                         return_band=True)
+
+        # Move the front outward, updating only the band points
+        narrow_band.scatter(u, narrow_band.gather(u) + 0.7)
+
+        updated = sparse_field_update(u, band, dx, narrow_band)
+        dist, mask = distance_transform(u, band=band, dx=dx)
+
+        both = updated.mask & mask
+        self.assertGreater(both.sum(), 0.95 * mask.sum())
+        self.assertGreater(both.sum(), 0.95 * updated.mask.sum())
+
+        np.testing.assert_array_equal(
+            np.sign(updated.dist[both]), np.sign(dist[both]))
+        self.assertLess(np.abs(updated.dist - dist)[both].max(), max_error)
+
+        # The band values are those of the level set signs
+        np.testing.assert_array_equal(
+            updated.distances > 0, updated.gather(u) > 0)
+
+    def test_2d(self):
+        self.check_against_skfmm((40, 36), [1, 1], max_error=0.25)
+
+    def test_3d(self):
+        self.check_against_skfmm((24, 24, 24), [1, 1, 1], max_error=0.25)
+
+    def test_3d_anisotropic(self):
+        self.check_against_skfmm((24, 24, 12), [1, 1, 2.5], max_error=0.6)
+
+    def test_vanished_front(self):
+        # The region is entirely within the band
+        u = ball((30, 30), [1, 1], radius=2.5)
+        narrow_band = distance_transform(u, band=3, dx=np.ones(2),
+                                         return_band=True)
+
+        # Shrink the region to nothing
+        narrow_band.scatter(u, narrow_band.gather(u) - 10)
+
+        updated = sparse_field_update(u, 3, np.ones(2), narrow_band)
+
+        self.assertFalse(updated.any())
+        self.assertTrue((updated.dist < 0).all())
+
+    def test_empty_band_falls_back(self):
+        u = ball((30, 30), [1, 1], radius=4)
+        empty = distance_transform(-np.ones((30, 30)), band=3, dx=np.ones(2),
+                                   return_band=True)
+
+        updated = sparse_field_update(u, 3, np.ones(2), empty)
+        dist, mask = distance_transform(u, band=3, dx=np.ones(2))
+
+        np.testing.assert_array_equal(updated.mask, mask)
+        np.testing.assert_allclose(updated.dist[mask], dist[mask])
+
+    def test_workspace_reuse(self):
+        workspace = SparseFieldWorkspace()
+        dx = np.ones(2)
+
+        # Arrays of different sizes share the workspace
+        for shape, radius in [((40, 36), 8), ((30, 30), 6), ((40, 36), 10)]:
+            u = ball(shape, dx, radius=radius)
+            narrow_band = distance_transform(u, band=3, dx=dx,
+                                             return_band=True)
+            narrow_band.scatter(u, narrow_band.gather(u) + 0.7)
+
+            updated = sparse_field_update(u, 3, dx, narrow_band,
+                                          workspace=workspace)
+            expected = sparse_field_update(u, 3, dx, narrow_band)
+
+            np.testing.assert_array_equal(updated.indices, expected.indices)
+            np.testing.assert_array_equal(
+                updated.distances, expected.distances)
+
+            # The written entries are reset
+            known, _ = workspace.arrays(u.size)
+            self.assertTrue(np.isinf(known).all())
+
+        # The arrays were allocated for the largest size only
+        self.assertEqual(40 * 36, workspace._known.size)
+
+
+class TestSparseFieldReinitializer(unittest.TestCase):
+
+    def test_dense_interface(self):
+        u = ball((30, 30), [1, 1], radius=6)
+        dist, mask = distance_transform(u, band=3, dx=np.ones(2))
+        u[mask] += 0.5
+
+        reinitializer = SparseFieldReinitializer()
+        dist_next, mask_next = reinitializer(
+            u, band=3, dx=np.ones(2), dist=dist, mask=mask)
+
+        expected_dist, expected_mask = distance_transform(
+            u, band=3, dx=np.ones(2))
+
+        both = mask_next & expected_mask
+        self.assertGreater(both.sum(), 0.95 * expected_mask.sum())
+        np.testing.assert_array_equal(
+            np.sign(dist_next[both]), np.sign(expected_dist[both]))
+
+    def test_no_previous_band(self):
+        u = ball((30, 30), [1, 1], radius=6)
+
+        dist, mask = SparseFieldReinitializer()(u, band=3, dx=np.ones(2))
+        expected_dist, expected_mask = distance_transform(
+            u, band=3, dx=np.ones(2))
+
+        np.testing.assert_array_equal(mask, expected_mask)
+        np.testing.assert_allclose(dist[mask], expected_dist[mask])
+
+    def test_pickle(self):
+        u = ball((30, 30), [1, 1], radius=6)
+        dist, mask = distance_transform(u, band=3, dx=np.ones(2))
+        u[mask] += 0.5
+
+        reinitializer = SparseFieldReinitializer()
+        expected = reinitializer(u, band=3, dx=np.ones(2), dist=dist,
+                                 mask=mask)
+
+        # The scratch arrays are not pickled
+        loaded = pickle.loads(pickle.dumps(reinitializer))
+        result = loaded(u, band=3, dx=np.ones(2), dist=dist, mask=mask)
+
+        for array, expected_array in zip(result, expected):
+            np.testing.assert_array_equal(array, expected_array)
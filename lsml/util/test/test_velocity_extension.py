@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from lsml.util.distance_transform import distance_transform
+from lsml.util.narrow_band import NarrowBand
+from lsml.util.velocity_extension import extend_velocity, interface_shell
+
+
+class TestVelocityExtension(unittest.TestCase):
+
+    def setUp(self):
+        ii, jj = np.indices((40, 30), dtype=np.float)
+        self.u = 8 - np.sqrt((ii - 20)**2 + (jj - 12.3)**2)
+        self.dx = np.ones(2)
+        dist, mask = distance_transform(self.u, band=3, dx=self.dx)
+        self.narrow_band = NarrowBand.from_dense(dist, mask)
+
+    def test_interface_shell(self):
+        selection = interface_shell(self.narrow_band, width=1)
+
+        self.assertTrue(selection.any())
+        self.assertFalse(selection.all())
+        np.testing.assert_array_equal(
+            selection, np.abs(self.narrow_band.distances) <= 1)
+
+    def test_interface_shell_too_thin(self):
+        # No band point is within the shell, so all are selected
+        width = np.abs(self.narrow_band.distances).min() / 2
+        selection = interface_shell(self.narrow_band, width=width)
+        self.assertTrue(selection.all())
+
+    def test_extend_velocity(self):
+        selection = interface_shell(self.narrow_band, width=1)
+
+        # The velocity of each shell point is its (flat) index
+        velocity = self.narrow_band.indices[selection].astype(np.float)
+
+        extended = extend_velocity(
+            self.narrow_band, selection, velocity, self.dx)
+
+        self.assertEqual(extended.shape, (self.narrow_band.size,))
+        np.testing.assert_array_equal(extended[selection], velocity)
+
+        # Each unselected point takes the index of its nearest shell point
+        coordinates = np.transpose(self.narrow_band.coordinates())
+        shell_coordinates = coordinates[selection]
+
+        for point, value in zip(coordinates[~selection],
+                                extended[~selection]):
+            distances = np.linalg.norm(shell_coordinates - point, axis=1)
+            nearest = np.unravel_index(int(value), self.narrow_band.shape)
+            self.assertAlmostEqual(
+                np.linalg.norm(np.array(nearest) - point), distances.min())
+
+    def test_extend_velocity_all_selected(self):
+        selection = np.ones(self.narrow_band.size, dtype=np.bool)
+        velocity = np.random.RandomState(1234).randn(self.narrow_band.size)
+
+        extended = extend_velocity(
+            self.narrow_band, selection, velocity, self.dx)
+
+        np.testing.assert_array_equal(extended, velocity)
@@ -0,0 +1,61 @@
+""" Restricting the velocity prediction to a thin shell about the zero level
+set, and extending the shell velocities to the rest of the narrow band
+"""
+import numpy
+
+
+def interface_shell(narrow_band, width):
+    """ Returns the boolean selection of the band points of `narrow_band`
+    within distance `width` of the zero level set. If no band point is that
+    close (e.g., `width` is less than the grid spacing), then all band
+    points are selected.
+    """
+    selection = numpy.abs(narrow_band.distances) <= width
+
+    if not selection.any():
+        selection[:] = True
+
+    return selection
+
+
+def extend_velocity(narrow_band, selection, velocity, dx):
+    """ Extends the velocities at the selected band points to all band points
+    of `narrow_band`, where each unselected point takes the velocity of the
+    nearest selected point
+
+    Parameters
+    ----------
+    narrow_band: NarrowBand
+        The narrow band
+
+    selection: numpy.ndarray, dtype=bool, shape=(narrow_band.size,)
+        The selected band points (e.g., as from :func:`interface_shell`)
+
+    velocity: numpy.ndarray, shape=(selection.sum(),)
+        The velocities at the selected band points, in band order
+
+    dx: numpy.ndarray
+        The delta terms, used to measure distances between band points
+
+    Returns
+    -------
+    extended: numpy.ndarray, shape=(narrow_band.size,)
+        The velocities at all band points, in band order
+    """
+    extended = numpy.empty(narrow_band.size, dtype=velocity.dtype)
+    extended[selection] = velocity
+
+    unselected = ~selection
+    if not unselected.any():
+        return extended
+
+    from scipy.spatial import cKDTree
+
+    coordinates = numpy.transpose(narrow_band.coordinates()) * dx
+
+    tree = cKDTree(coordinates[selection])
+    _, nearest = tree.query(coordinates[unselected])
+
+    extended[unselected] = velocity[nearest]
+
+    return extended
@@ -51,9 +51,19 @@ if __name__ == '__main__':
                 ],
                 extra_compile_args=['-std=c99', '-DMI_CHECK_INDEX=0']
             ),
+            Extension(
+                name=f'{PKG_NAME}.util.fast_sweeping',
+                sources=[
+                    os.path.join(
+                        PKG_NAME, 'util', '_cutil', 'fast_sweeping.c'
+                    )
+                ],
+                extra_compile_args=['-std=c99']
+            ),
         ],
         install_requires=[
             'h5py',
+            'joblib',
             'matplotlib',
             'numpy',
             'scikit_fmm',
@@ -61,10 +71,13 @@ if __name__ == '__main__':
             'scikit_learn',
             'scipy',
         ],
+        extras_require={
+            'numba': ['numba'],
+        },
         license='MIT',
         name=PKG_NAME,
         packages=find_packages(),
-        python_requires='>=3.6',
+        python_requires='>=3.7',
         url='https://github.com/notmatthancock/level-set-machine-learning/',
         version=VERSION,
     )